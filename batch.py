@@ -0,0 +1,232 @@
+"""
+Batch analysis of FEN / EPD positions
+
+Usage:
+    python batch.py positions.epd                    JSON lines on stdout
+    python batch.py positions.epd --format csv --output result.csv
+    cat positions.fen | python batch.py - --workers 4 --perft 2 --search-depth 3
+
+Every line holds one position as FEN or EPD, EPD operations like id are kept.
+Positions are analysed in chunks by a pool of worker processes.
+The results are written in input order, and only a bounded number of chunks is in flight,
+so memory stays flat no matter how many positions are streamed through
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import csv
+import functools
+import json
+import os
+import sys
+import time
+import typing
+
+import bitboard
+import board
+import move_encoding
+import search
+
+# Positions handed to a worker at once, larger chunks mean less overhead per position
+CHUNK_SIZE = 256
+
+# Chunks in flight per worker, bounds the memory of pending results
+CHUNKS_PER_WORKER = 4
+
+CSV_FIELDS = ["line", "fen", "id", "legal_moves", "status", "perft", "best_move", "score", "error"]
+
+Result = dict[str, typing.Any]
+
+# One board per process, reused for every position
+_board = board.Board()
+
+
+@functools.cache
+def _worker_search() -> search.Search:
+    """
+    Returns the search of this process, created on first use
+    """
+
+    return search.Search()
+
+
+def _epd_id(fields: list[str]) -> str | None:
+    """
+    Returns the value of the id operation of an EPD line split into fields, None if there is none
+    """
+
+    text = " ".join(fields[4:])
+    start = text.find('id "')
+
+    if start == -1:
+        return None
+
+    return text[start + 4:text.find('"', start + 4)]
+
+
+def analyze_position(number: int,
+                     text: str,
+                     perft_depth: int = 0,
+                     search_depth: int = 0) -> Result:
+    """
+    Analyses the position in one line of FEN or EPD
+    Returns the line number, legal move count and status (normal, check, checkmate or stalemate),
+    the perft node count and the best move if their depth is not 0, or an error
+    """
+
+    fields = text.split()
+    result: Result = {"line": number, "fen": " ".join(fields[:4])}
+
+    if len(fields) > 4 and not fields[4].isdigit():
+        result["id"] = _epd_id(fields)
+
+    try:
+        _board.load_fen(text)
+    except ValueError as error:
+        result["error"] = f"invalid position: {error}"
+        return result
+
+    # A position the engine cannot handle becomes an error row instead of ending the whole run
+    try:
+        _analyze(result, perft_depth, search_depth)
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        for key in ("legal_moves", "status", "perft", "best_move", "score"):
+            result.pop(key, None)
+        result["error"] = f"analysis failed: {type(error).__name__}: {error}"
+
+    return result
+
+
+def _analyze(result: Result, perft_depth: int, search_depth: int) -> None:
+    """
+    Subroutine of analyze_position, adds the analysis of the position on _board to result
+    """
+
+    color = _board.active_color.value
+    legal_moves = len(_board.legal_moves(_board.active_color))
+    in_check = bitboard.in_check(_board, color)
+
+    result["legal_moves"] = legal_moves
+
+    if legal_moves:
+        result["status"] = "check" if in_check else "normal"
+    else:
+        result["status"] = "checkmate" if in_check else "stalemate"
+
+    if perft_depth:
+        result["perft"] = _board.perft(perft_depth)
+
+    if search_depth:
+        move, score = _worker_search().search(_board, search_depth)
+        result["best_move"] = move_encoding.name(move) if move is not None else None
+        result["score"] = score
+
+
+def analyze_chunk(chunk: list[tuple[int, str]],
+                  perft_depth: int,
+                  search_depth: int) -> list[Result]:
+    """
+    Runs in a worker process, analyses numbered lines
+    """
+
+    return [analyze_position(number, text, perft_depth, search_depth) for number, text in chunk]
+
+
+def _chunks(lines: typing.Iterable[str], size: int) -> typing.Iterator[list[tuple[int, str]]]:
+    """
+    Yields the numbered non-empty lines in lists of size
+    """
+
+    chunk = []
+
+    for number, line in enumerate(lines, start=1):
+        if line.strip():
+            chunk.append((number, line))
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def analyze_stream(lines: typing.Iterable[str],
+                   workers: int = 1,
+                   perft_depth: int = 0,
+                   search_depth: int = 0) -> typing.Iterator[Result]:
+    """
+    Yields the analysis of every line in lines, in input order
+    With more than one worker, at most CHUNKS_PER_WORKER chunks per worker are pending at any time
+    """
+
+    if workers <= 1:
+        for chunk in _chunks(lines, CHUNK_SIZE):
+            yield from analyze_chunk(chunk, perft_depth, search_depth)
+        return
+
+    pending: collections.deque[concurrent.futures.Future[list[Result]]] = collections.deque()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in _chunks(lines, CHUNK_SIZE):
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                yield from pending.popleft().result()
+
+            pending.append(executor.submit(analyze_chunk, chunk, perft_depth, search_depth))
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main() -> int:
+    """
+    Entry point of the batch analysis
+    """
+
+    parser = argparse.ArgumentParser(description="Analyse FEN / EPD positions in bulk")
+    parser.add_argument("file", help="file with one FEN or EPD per line, - for stdin")
+    parser.add_argument("--output", default="-", help="file to write to (default stdout)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl",
+                        help="output format (default jsonl)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="number of worker processes (default 0, one per core)")
+    parser.add_argument("--perft", type=int, default=0, help="also count perft to this depth")
+    parser.add_argument("--search-depth", type=int, default=0,
+                        help="also search for the best move to this depth")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+
+    # pylint: disable-next=consider-using-with
+    source = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+    # pylint: disable-next=consider-using-with
+    target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8",
+                                                        newline="")
+
+    writer = csv.DictWriter(target, CSV_FIELDS) if args.format == "csv" else None
+    if writer is not None:
+        writer.writeheader()
+
+    start = time.perf_counter()
+    count = errors = 0
+
+    with source, target:
+        for result in analyze_stream(source, workers, args.perft, args.search_depth):
+            count += 1
+            errors += "error" in result
+
+            if writer is not None:
+                writer.writerow(result)
+            else:
+                target.write(json.dumps(result) + "\n")
+
+    seconds = time.perf_counter() - start
+    print(f"positions {count}  errors {errors}  workers {workers}  time {seconds:.3f}s  "
+          f"{count / seconds if seconds > 0 else 0.0:.0f} positions/s", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
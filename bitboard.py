@@ -0,0 +1,614 @@
+"""
+Bitboard based move generation
+
+Every square is one bit of a 64 bit int, the bit index being
+(row * 8) + file, the same index Board uses for its board and color arrays
+"""
+
+import array
+import typing
+
+import move_encoding
+import piece
+import position
+import instrumentation
+
+FULL = (1 << 64) - 1
+
+WHITE = piece.Color.WHITE.value
+BLACK = piece.Color.BLACK.value
+
+PAWN = piece.Type.PAWN.value
+KING = piece.Type.KING.value
+QUEEN = piece.Type.QUEEN.value
+ROOK = piece.Type.ROOK.value
+BISHOP = piece.Type.BISHOP.value
+KNIGHT = piece.Type.KNIGHT.value
+
+# Flags of the four promotions, queen first
+PROMOTION_FLAGS = [(move_encoding.PROMOTION | bits) << 12 for bits in (3, 2, 1, 0)]
+CAPTURE_FLAG = move_encoding.CAPTURE << 12
+DOUBLE_PUSH_FLAG = move_encoding.DOUBLE_PUSH << 12
+
+# The same directions get_line_move is called with
+DIAGONALS = [[1, 1], [1, -1], [-1, -1], [-1, 1]]
+STRAIGHTS = [[0, 1], [0, -1], [1, 0], [-1, 0]]
+
+KNIGHT_OFFSETS = [[2, 1], [2, -1], [-2, 1], [-2, -1], [1, 2], [-1, 2], [1, -2], [-1, -2]]
+KING_OFFSETS = [[1, 1], [1, 0], [1, -1], [0, 1], [0, -1], [-1, 1], [-1, 0], [-1, -1]]
+
+
+def _offset_table(offsets: list[list[int]]) -> list[int]:
+    """
+    Returns a bitboard per square with all squares reachable by a single offset
+    """
+
+    table = []
+
+    for square in range(64):
+        attacks = 0
+
+        for offset in offsets:
+            target = [(square >> 3) + offset[0], (square & 7) + offset[1]]
+
+            if position.is_in_bounds(target):
+                attacks |= 1 << ((target[0] * 8) + target[1])
+
+        table.append(attacks)
+
+    return table
+
+
+def _ray_table(direction: list[int]) -> tuple[list[int], bool]:
+    """
+    Returns a bitboard per square with all squares in direction up to the edge
+    Also returns true if the ray runs towards higher square indices
+    """
+
+    table = []
+
+    for square in range(64):
+        ray = 0
+
+        for i in range(1, 8):
+            target = [(square >> 3) + (direction[0] * i), (square & 7) + (direction[1] * i)]
+
+            if not position.is_in_bounds(target):
+                break
+
+            ray |= 1 << ((target[0] * 8) + target[1])
+
+        table.append(ray)
+
+    return table, (direction[0] * 8) + direction[1] > 0
+
+
+KNIGHT_ATTACKS = _offset_table(KNIGHT_OFFSETS)
+KING_ATTACKS = _offset_table(KING_OFFSETS)
+
+# Indexed by color value, squares attacked by a pawn of that color
+PAWN_ATTACKS = [
+    [0] * 64,
+    _offset_table([[1, 1], [1, -1]]),
+    _offset_table([[-1, 1], [-1, -1]]),
+]
+
+# Indexed by color value, the square in front of a pawn of that color,
+# empty on the last row so pawns put there by hand never push off the board
+PAWN_PUSHES = [
+    [0] * 64,
+    _offset_table([[1, 0]]),
+    _offset_table([[-1, 0]]),
+]
+
+DIAGONAL_RAYS = [_ray_table(direction) for direction in DIAGONALS]
+STRAIGHT_RAYS = [_ray_table(direction) for direction in STRAIGHTS]
+
+
+def _line_tables() -> tuple[list[list[int]], list[list[int]]]:
+    """
+    Returns two tables indexed by two squares on a common line:
+    the squares strictly between them and the whole line through both of them
+    Squares that do not share a line map to 0 in both tables
+    """
+
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+
+    for direction in DIAGONALS + STRAIGHTS:
+        forward, _ = _ray_table(direction)
+        backward, _ = _ray_table([-direction[0], -direction[1]])
+
+        for square in range(64):
+            passed = 0
+
+            for i in range(1, 8):
+                target = [(square >> 3) + (direction[0] * i), (square & 7) + (direction[1] * i)]
+
+                if not position.is_in_bounds(target):
+                    break
+
+                target_square = (target[0] * 8) + target[1]
+                between[square][target_square] = passed
+                line[square][target_square] = forward[square] | backward[square] | (1 << square)
+                passed |= 1 << target_square
+
+    return between, line
+
+
+BETWEEN, LINE = _line_tables()
+
+
+def _slide(square: int, rays: list[tuple[list[int], bool]], occupied: int) -> int:
+    """
+    Returns all squares attacked from square along rays,
+    each ray stopping at (and including) the first occupied square
+    """
+
+    attacks = 0
+
+    for table, forward in rays:
+        ray = table[square]
+        blockers = ray & occupied
+
+        if blockers:
+            if forward:
+                ray ^= table[(blockers & -blockers).bit_length() - 1]
+            else:
+                ray ^= table[blockers.bit_length() - 1]
+
+        attacks |= ray
+
+    return attacks
+
+
+def bishop_attacks(square: int, occupied: int) -> int:
+    """
+    Returns all squares a bishop on square attacks
+    """
+
+    return _slide(square, DIAGONAL_RAYS, occupied)
+
+
+def rook_attacks(square: int, occupied: int) -> int:
+    """
+    Returns all squares a rook on square attacks
+    """
+
+    return _slide(square, STRAIGHT_RAYS, occupied)
+
+
+def is_attacked(square: int,
+                by_color: int,
+                them: int,
+                type_bb: list[int],
+                occupied: int) -> bool:
+    """
+    Returns true if square is attacked by a piece of by_color in them
+
+    them is the bitboard of pieces of by_color that are still on the board,
+    which allows the caller to remove a piece that was just captured
+    """
+
+    if KNIGHT_ATTACKS[square] & type_bb[KNIGHT] & them:
+        return True
+    if KING_ATTACKS[square] & type_bb[KING] & them:
+        return True
+    if PAWN_ATTACKS[3 - by_color][square] & type_bb[PAWN] & them:
+        return True
+
+    diagonal = (type_bb[BISHOP] | type_bb[QUEEN]) & them
+    if diagonal and bishop_attacks(square, occupied) & diagonal:
+        return True
+
+    straight = (type_bb[ROOK] | type_bb[QUEEN]) & them
+    return bool(straight and rook_attacks(square, occupied) & straight)
+
+
+def attackers_to(square: int,
+                 by_color: int,
+                 them: int,
+                 type_bb: list[int],
+                 occupied: int) -> int:
+    """
+    Returns a bitboard of all pieces of by_color in them attacking square
+    Like is_attacked, this looks outward from square instead of generating enemy moves
+    """
+
+    return (
+        (KNIGHT_ATTACKS[square] & type_bb[KNIGHT])
+        | (KING_ATTACKS[square] & type_bb[KING])
+        | (PAWN_ATTACKS[3 - by_color][square] & type_bb[PAWN])
+        | (bishop_attacks(square, occupied) & (type_bb[BISHOP] | type_bb[QUEEN]))
+        | (rook_attacks(square, occupied) & (type_bb[ROOK] | type_bb[QUEEN]))
+    ) & them
+
+
+def pins_and_checkers(board: typing.Any, color: int) -> tuple[int, int]:
+    """
+    Returns a bitboard of all pieces of color pinned to their king
+    and a bitboard of all enemy pieces giving check
+    Both are 0 if color has no king
+
+    board has to be of type board.Board
+    """
+
+    king = board.king_square[color]
+
+    if king == -1:
+        return 0, 0
+
+    type_bb = board.type_bb
+    us = board.color_bb[color]
+    them = board.color_bb[3 - color]
+    checkers = attackers_to(king, 3 - color, them, type_bb, us | them)
+
+    # Enemy sliders that would see the king if none of our pieces were in the way
+    snipers = (
+        (bishop_attacks(king, them) & (type_bb[BISHOP] | type_bb[QUEEN]))
+        | (rook_attacks(king, them) & (type_bb[ROOK] | type_bb[QUEEN]))
+    ) & them
+
+    pinned = 0
+    while snipers:
+        sniper = (snipers & -snipers).bit_length() - 1
+        snipers &= snipers - 1
+
+        blockers = BETWEEN[king][sniper] & us
+        if blockers and not blockers & (blockers - 1):
+            pinned |= blockers
+
+    return pinned, checkers
+
+
+def _pawn_targets(square: int, color: int, them: int, occupied: int) -> int:
+    """
+    Returns pushes and captures of a pawn of color on square
+    (en passant is handled by generate_moves)
+    """
+
+    targets = PAWN_ATTACKS[color][square] & them
+    one = PAWN_PUSHES[color][square] & ~occupied
+
+    if one:
+        targets |= one
+
+        start_row = 1 if color == WHITE else 6
+        if square >> 3 == start_row:
+            targets |= PAWN_PUSHES[color][one.bit_length() - 1] & ~occupied
+
+    return targets
+
+
+def _en_passant_square(board: typing.Any, color: int) -> int:
+    """
+    Returns the en passant target square for color, -1 if there is none
+    """
+
+    row, file = board.en_passant_target
+    victim_row, victim_file = board.en_passant_victim
+
+    if row == -1 or victim_row == -1:
+        return -1
+
+    victim = (victim_row * 8) + victim_file
+    if board.board[victim] != PAWN or board.color[victim] != 3 - color:
+        return -1
+
+    target: int = (row * 8) + file
+    if board.board[target] != 0:
+        return -1
+
+    return target
+
+
+def _castle_moves(board: typing.Any, color: int, occupied: int) -> list[move_encoding.Move]:
+    """
+    Returns all castling moves for color
+    Castling is never possible out of, through or into check
+    """
+
+    castle_info = board.white_castle_info if color == WHITE else board.black_castle_info
+    home = 0 if color == WHITE else 56
+    king = home + 4
+    rooks = board.type_bb[ROOK] & board.color_bb[color]
+    them = board.color_bb[3 - color]
+    type_bb = board.type_bb
+    moves: list[move_encoding.Move] = []
+
+    if castle_info[0] or board.board[king] != KING or board.color[king] != color:
+        return moves
+
+    if is_attacked(king, 3 - color, them, type_bb, occupied):
+        return moves
+
+    if (not castle_info[1]
+            and (rooks >> home) & 1
+            and not occupied & (0b1110 << home)
+            and not is_attacked(king - 1, 3 - color, them, type_bb, occupied)
+            and not is_attacked(king - 2, 3 - color, them, type_bb, occupied)):
+        moves.append(move_encoding.encode(king, king - 2, move_encoding.QUEEN_CASTLE))
+
+    if (not castle_info[2]
+            and (rooks >> (home + 7)) & 1
+            and not occupied & (0b1100000 << home)
+            and not is_attacked(king + 1, 3 - color, them, type_bb, occupied)
+            and not is_attacked(king + 2, 3 - color, them, type_bb, occupied)):
+        moves.append(move_encoding.encode(king, king + 2, move_encoding.KING_CASTLE))
+
+    return moves
+
+
+def _is_legal_en_passant(board: typing.Any, color: int, start: int, target: int) -> bool:
+    """
+    Returns true if taking en passant from start does not leave the king of color in check
+
+    En passant removes two pieces from a row at once, which pin masks do not cover,
+    so the move is applied to local copies of the bitboards instead
+    """
+
+    king = board.king_square[color]
+
+    if king == -1:
+        return True
+
+    victim = target - 8 if color == WHITE else target + 8
+    them = board.color_bb[3 - color] & ~(1 << victim)
+    occupied = (((board.color_bb[color] | them) & ~(1 << start)) | (1 << target))
+
+    return not is_attacked(king, 3 - color, them, board.type_bb, occupied)
+
+
+def _legal_mask(board: typing.Any, color: int, square: int, masks: tuple[int, int, int]) -> int:
+    """
+    Returns the squares the piece of color on square may move to
+    without leaving its king in check
+
+    masks holds the pinned pieces, the checking pieces and the king square of color
+    """
+
+    pinned, checkers, king = masks
+
+    if square == king:
+        them = board.color_bb[3 - color]
+        occupied = (board.color_bb[color] | them) & ~(1 << king)
+        safe = 0
+        targets = KING_ATTACKS[square]
+
+        while targets:
+            target = (targets & -targets).bit_length() - 1
+            targets &= targets - 1
+
+            if not is_attacked(target, 3 - color, them, board.type_bb, occupied):
+                safe |= 1 << target
+
+        return safe
+
+    legal = FULL
+    if checkers:
+        # In double check only the king may move
+        if checkers & (checkers - 1):
+            return 0
+
+        # Otherwise the checker has to be taken or blocked
+        legal = BETWEEN[king][checkers.bit_length() - 1] | checkers
+
+    if (pinned >> square) & 1:
+        legal &= LINE[king][square]
+
+    return legal
+
+
+def _piece_targets(board: typing.Any, square: int, color: int, occupied: int) -> int:
+    """
+    Returns all squares the piece of color on square can move to,
+    ignoring en passant, castling and checks
+    """
+
+    kind: int = board.board[square]
+    us: int = board.color_bb[color]
+
+    if kind == PAWN:
+        return _pawn_targets(square, color, board.color_bb[3 - color], occupied)
+    if kind == KNIGHT:
+        return KNIGHT_ATTACKS[square] & ~us
+    if kind == KING:
+        return KING_ATTACKS[square] & ~us
+    if kind == BISHOP:
+        return bishop_attacks(square, occupied) & ~us
+    if kind == ROOK:
+        return rook_attacks(square, occupied) & ~us
+
+    return (bishop_attacks(square, occupied) | rook_attacks(square, occupied)) & ~us
+
+
+def _en_passant_moves(board: typing.Any,
+                      color: int,
+                      legal: bool,
+                      pawns: int) -> list[move_encoding.Move]:
+    """
+    Returns all en passant captures of the pawns of color in pawns
+    """
+
+    moves: list[move_encoding.Move] = []
+    en_passant = _en_passant_square(board, color)
+
+    if en_passant == -1:
+        return moves
+
+    capturers = PAWN_ATTACKS[3 - color][en_passant] & pawns
+    while capturers:
+        start = (capturers & -capturers).bit_length() - 1
+        capturers &= capturers - 1
+
+        if not legal or _is_legal_en_passant(board, color, start, en_passant):
+            moves.append(move_encoding.encode(start, en_passant, move_encoding.EN_PASSANT))
+
+    return moves
+
+
+def can_capture_en_passant(board: typing.Any) -> bool:
+    """
+    Returns true if the active color has a legal en passant capture,
+    only then the en passant file is part of the position (and its hash)
+
+    board has to be of type board.Board
+    """
+
+    color = board.active_color.value
+    en_passant = _en_passant_square(board, color)
+
+    if en_passant == -1:
+        return False
+
+    capturers = PAWN_ATTACKS[3 - color][en_passant] & board.type_bb[PAWN] & board.color_bb[color]
+    while capturers:
+        start = (capturers & -capturers).bit_length() - 1
+        capturers &= capturers - 1
+
+        if _is_legal_en_passant(board, color, start, en_passant):
+            return True
+
+    return False
+
+
+def _append_moves(moves: "array.array[int]",
+                  square: int,
+                  targets: int,
+                  captures: int,
+                  pawn: bool) -> None:
+    """
+    Subroutine of generate_moves
+    Appends the moves from square to every square in targets to moves,
+    captures holds the targets with an enemy piece on them
+    """
+
+    while targets:
+        target = (targets & -targets).bit_length() - 1
+        targets &= targets - 1
+
+        move = square | (target << 6)
+        if (captures >> target) & 1:
+            move |= CAPTURE_FLAG
+
+        if pawn:
+            if target < 8 or target >= 56:
+                moves.extend([move | promotion for promotion in PROMOTION_FLAGS])
+                continue
+            if abs(target - square) == 16:
+                move |= DOUBLE_PUSH_FLAG
+
+        moves.append(move)
+
+
+@instrumentation.hook
+def generate_moves(board: typing.Any,
+                   color: int,
+                   legal: bool,
+                   from_mask: int = FULL) -> "array.array[int]":
+    """
+    Returns all moves (see move_encoding) of pieces of color (a piece.Color value)
+    standing on from_mask
+    If legal is set, moves leaving the own king in check are left out
+    and castling moves are added
+
+    Legal moves are generated in a single pass using pin and check masks
+
+    board has to be of type board.Board
+    """
+
+    us = board.color_bb[color]
+    them = board.color_bb[3 - color]
+    pawns = board.type_bb[PAWN] & us
+    moves = array.array("H")
+
+    king = board.king_square[color]
+    masks = (*pins_and_checkers(board, color), king) if legal and king != -1 else None
+
+    own = us & from_mask
+    while own:
+        square = (own & -own).bit_length() - 1
+        own &= own - 1
+        targets = _piece_targets(board, square, color, us | them)
+
+        if masks:
+            targets &= _legal_mask(board, color, square, masks)
+
+        _append_moves(moves, square, targets, them, bool((pawns >> square) & 1))
+
+    moves.extend(_en_passant_moves(board, color, legal, pawns & from_mask))
+
+    if legal and board.type_bb[KING] & us & from_mask:
+        moves.extend(_castle_moves(board, color, us | them))
+
+    return moves
+
+
+def in_check(board: typing.Any, color: int) -> bool:
+    """
+    Returns true if the king of color (a piece.Color value) is attacked
+
+    board has to be of type board.Board
+    """
+
+    king = board.king_square[color]
+
+    if king == -1:
+        return False
+
+    return is_attacked(
+        king,
+        3 - color,
+        board.color_bb[3 - color],
+        board.type_bb,
+        board.color_bb[WHITE] | board.color_bb[BLACK]
+    )
+
+
+@instrumentation.hook
+def get_valid_moves(row: int, file: int, simulate: bool, board: typing.Any) -> list[list[int]]:
+    """
+    Drop-in replacement for piece.get_valid_moves
+    Returns 2d array of rows and files: [ [row,file], ... ]
+
+    board has to be of type board.Board
+    """
+
+    if not position.is_in_bounds([row, file]):
+        return []
+
+    square = (row * 8) + file
+    color = board.color[square]
+
+    if color == 0:
+        return []
+
+    return move_encoding.to_positions(generate_moves(board, color, simulate, 1 << square))
+
+
+@instrumentation.hook
+def get_all_moves(color: piece.Color,
+                  board: typing.Any,
+                  simulate: bool) -> tuple[list[list[int]], bool]:
+    """
+    Drop-in replacement for piece.get_all_moves
+    Returns 2d array of rows and files: [ [row,file], ... ]
+    Also returns true if the enemy king is in check, false if otherwise
+
+    color has to be of type piece.Color
+    board has to be of type board.Board
+    """
+
+    moves = move_encoding.to_positions(generate_moves(board, color.value, simulate))
+
+    king = board.king_square[3 - color.value]
+    occupied = board.color_bb[WHITE] | board.color_bb[BLACK]
+    enemy_in_check = king != -1 and is_attacked(
+        king,
+        color.value,
+        board.color_bb[color.value],
+        board.type_bb,
+        occupied
+    )
+
+    return moves, enemy_in_check
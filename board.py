@@ -2,30 +2,151 @@
 Hold the class Board
 """
 
+import array
+import random
+import threading
+from enum import Enum
+
+import bitboard
+import book
+import move_encoding
 import piece
 import position
 import board_config
+import evaluation
+import fen
+import instrumentation
+import tablebase
+import zobrist
+from exceptions import InconsistentState
 
+# Corner squares of both rooks, moving from or onto them ends castling on that side
+CASTLE_SQUARES = (1 << 0) | (1 << 7) | (1 << 56) | (1 << 63)
 
-class Board():
+# Indexed by piece.Color value, the color
+COLORS = (piece.Color.NONE, piece.Color.WHITE, piece.Color.BLACK)
+
+# Squares where file + row is odd, a1 is a dark square
+LIGHT_SQUARES = sum(1 << square for square in range(64) if ((square >> 3) + square) & 1)
+
+# Plies without a capture or pawn move after which a game is drawn
+FIFTY_MOVES = 100
+
+# Target square of the king when castling: rook square, rook target square
+CASTLE_ROOKS = {6: (7, 5), 2: (0, 3), 62: (63, 61), 58: (56, 59)}
+
+# move, moved piece, captured piece, captured color, captured square,
+# en passant target, en passant victim, en passant valid,
+# white castle info, black castle info, active color, active turn, halfmove clock, hash
+UndoRecord = tuple[
+    move_encoding.Move, int, int, int, int,
+    list[int], list[int], bool,
+    list[int], list[int], piece.Color, int, int, int
+]
+
+
+class Draw(Enum):
+    """
+    Reasons a game ended in a draw
+    """
+
+    NONE = 0
+    STALEMATE = 1
+    REPETITION = 2
+    FIFTY_MOVES = 3
+    INSUFFICIENT_MATERIAL = 4
+
+
+class Board():  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     """
     Handles piece positioning and moving on a board
     """
 
-    board = [0] * 64
-    color = [0] * 64
+    board: list[int]
+    color: list[int]
+
+    # Bitboards indexed by piece.Type and piece.Color values,
+    # index 0 holds the empty squares
+    type_bb: list[int]
+    color_bb: list[int]
+
+    # Square of the king indexed by piece.Color value, -1 if there is none
+    king_square: list[int]
+
+    # Zobrist hash of the position, kept up to date with every change
+    hash: int
+
+    # Packed material and piece-square score of all pieces (see evaluation),
+    # kept up to date with every change
+    score: int
 
-    en_passant_target = [-1, -1]
-    en_passant_victim = [-1, -1]
-    en_passant_valid = False
+    # Hashes of the positions before every move made, taken back by unmake_move,
+    # and how often every hash occurs in history, for repetitions
+    history: list[int]
+    repetitions: dict[int, int]
+
+    # Legal moves and their target squares per start square (as bitboards),
+    # indexed by piece.Color value, valid while hash equals move_cache_hash
+    move_cache: dict[int, tuple["array.array[int]", list[int]]]
+    move_cache_hash: int
+
+    en_passant_target: list[int]
+    en_passant_victim: list[int]
+    en_passant_valid: bool
 
     # 0: king moved, 1 if yes
     # 1: a rook moved, 1 if yes
     # 2: h rook moved, 1 if yes
-    white_castle_info = [0, 0, 0]
-    black_castle_info = [0, 0, 0]
+    white_castle_info: list[int]
+    black_castle_info: list[int]
+
+    promotion_target: piece.Type
+
+    # Game state: the color that has to move, the number of moves played,
+    # the plies since the last capture or pawn move and the result once the game is over
+    active_color: piece.Color
+    active_turn: int
+    halfmove_clock: int
+    game_over: bool
+    color_checkmated: piece.Color
+    draw: Draw
+
+    def __init__(self) -> None:
+        # Every board owns its state, so games on different boards never share anything
+        self.en_passant_target = [-1, -1]
+        self.en_passant_victim = [-1, -1]
+        self.en_passant_valid = False
+
+        self.white_castle_info = [0, 0, 0]
+        self.black_castle_info = [0, 0, 0]
+
+        self.promotion_target = piece.Type.QUEEN
+
+        self.active_color = piece.Color.WHITE
+        self.active_turn = 0
+        self.halfmove_clock = 0
+        self.game_over = False
+        self.color_checkmated = piece.Color.NONE
+        self.draw = Draw.NONE
 
-    promotion_target = piece.Type.QUEEN
+        self.clear()
+
+    def clear(self) -> None:
+        """
+        Removes all pieces from the board
+        """
+
+        self.board = [0] * 64
+        self.color = [0] * 64
+        self.type_bb = [bitboard.FULL, 0, 0, 0, 0, 0, 0]
+        self.color_bb = [bitboard.FULL, 0, 0]
+        self.king_square = [-1, -1, -1]
+        self.hash = self._state_key()
+        self.score = 0
+        self.history = []
+        self.repetitions = {}
+        self.move_cache = {}
+        self.move_cache_hash = -1
 
     def setup(self) -> None:
         """
@@ -68,65 +189,84 @@ class Board():
 
     def board_to_fen(self) -> str:
         """
-        Returns the FEN notation for the currrent board position
+        Returns the FEN notation of the current position with all six fields:
+        placement, side to move, castling rights, en passant target,
+        halfmove clock and fullmove number
         """
 
-        result = ""
-        empty = 0
-
-        for row in range(7, -1, -1):
-            for file in range(0, 8):
-                piece_type = self.get_piece(row, file)
-                piece_color = self.get_color(row, file)
+        en_passant = "-"
+        if self.en_passant_target[0] != -1:
+            row, file = self.en_passant_target
+            en_passant = fen.SQUARE_NAMES[(row * 8) + file]
 
-                if piece_type != piece.Type.NONE and empty != 0:
-                    result += str(empty)
-                    empty = 0
-                elif piece_type == piece.Type.NONE:
-                    empty += 1
-
-                piece_char = piece.piece_to_char(piece_type, piece_color)
-
-                if piece_char != "?":
-                    result += piece_char
+        castling = fen.CASTLING_NAMES[
+            zobrist.castle_rights(self.white_castle_info, self.black_castle_info)
+        ]
 
-            if row != 0 and empty != 0:
-                result += f"{empty}/"
-                empty = 0
-            elif row != 0:
-                result += "/"
-
-        return result
+        return (
+            f"{fen.encode_placement(bytes(self.board), bytes(self.color))} "
+            f"{fen.SIDE_NAMES[self.active_color.value]} {castling} {en_passant} "
+            f"{self.halfmove_clock} {(self.active_turn // 2) + 1}"
+        )
 
-    def load_fen(self, fen: str) -> None:
+    def load_fen(self, text: str) -> None:
         """
-        Loads a given FEN notation into the board position
+        Loads a position in FEN or EPD notation
+        Fields missing after the placement default to "w - - 0 1",
+        EPD operations after the en passant field are ignored
+        Raises ValueError if text is malformed, the position is left unchanged then
         """
 
-        row = 7
-        file = 0
+        fields = text.split()
 
-        # Clear the board
-        self.board = [0] * 64
-        self.color = [0] * 64
+        if not fields:
+            raise ValueError("Empty FEN")
 
-        for char in fen:
-            if char == "/":
-                continue
+        fields += ["w", "-", "-"][len(fields) - 1:]
 
-            piece_type, piece_color = piece.char_to_piece(char)
-            self.set_piece(row, file, piece_type, piece_color)
+        side, white_castle_info, black_castle_info, en_passant, state_key = fen.decode_state(
+            fields[1], fields[2], fields[3]
+        )
+        # Nothing raises after the placement is decoded, so the score can be taken over right away
+        kinds, colors, type_bb, color_bb, piece_hash, self.score = fen.decode_placement(fields[0])
+        self.halfmove_clock, fullmove = fen.decode_clocks(fields[4:6])
+
+        self.board = list(kinds)
+        self.color = list(colors)
+        self.type_bb = type_bb
+        self.color_bb = color_bb
+        self.king_square = [
+            -1,
+            (type_bb[bitboard.KING] & color_bb[bitboard.WHITE]).bit_length() - 1,
+            (type_bb[bitboard.KING] & color_bb[bitboard.BLACK]).bit_length() - 1,
+        ]
+
+        self.active_color = COLORS[side]
+        self.active_turn = ((fullmove - 1) * 2) + (side == bitboard.BLACK)
+        self.game_over = False
+        self.color_checkmated = piece.Color.NONE
+        self.draw = Draw.NONE
+
+        self.white_castle_info = white_castle_info
+        self.black_castle_info = black_castle_info
+
+        self.en_passant_valid = en_passant != -1
+        if self.en_passant_valid:
+            victim = en_passant + 8 if en_passant < 32 else en_passant - 8
+            self.en_passant_target = [en_passant >> 3, en_passant & 7]
+            self.en_passant_victim = [victim >> 3, victim & 7]
+        else:
+            self.en_passant_target = [-1, -1]
+            self.en_passant_victim = [-1, -1]
 
-            if self.get_piece(row, file) == piece.Type.NONE:
-                try:
-                    file += int(char) - 1
-                except ValueError:
-                    pass
+        self.hash = piece_hash ^ state_key
+        if self.en_passant_valid and not bitboard.can_capture_en_passant(self):
+            self.hash ^= zobrist.en_passant_key(self.en_passant_target)
 
-            file += 1
-            if file > 7:
-                file = 0
-                row -= 1
+        self.history = []
+        self.repetitions = {}
+        self.move_cache = {}
+        self.move_cache_hash = -1
 
     def display(self) -> None:
         """
@@ -173,8 +313,40 @@ class Board():
         if row > 7 or row < 0 or file > 7 or file < 0:
             return
 
-        self.board[(row * 8) + file] = piece_type.value
-        self.set_color(row, file, piece_color)
+        # A pawn next to the en passant target decides whether its file is hashed
+        self.hash ^= self._state_key()
+        self._place((row * 8) + file, piece_type.value, piece_color.value)
+        self.hash ^= self._state_key()
+
+    def _place(self, square: int, piece_type: int, piece_color: int) -> None:
+        """
+        Puts a piece given by its type and color values on square
+        and keeps the bitboards in sync
+        """
+
+        bit = 1 << square
+
+        if self.board[square] == bitboard.KING and self.king_square[self.color[square]] == square:
+            self.king_square[self.color[square]] = -1
+        if piece_type == bitboard.KING:
+            self.king_square[piece_color] = square
+
+        self.type_bb[self.board[square]] &= ~bit
+        self.type_bb[piece_type] |= bit
+        self.color_bb[self.color[square]] &= ~bit
+        self.color_bb[piece_color] |= bit
+
+        self.hash ^= (
+            zobrist.PIECE_KEYS[self.color[square]][self.board[square]][square]
+            ^ zobrist.PIECE_KEYS[piece_color][piece_type][square]
+        )
+        self.score += (
+            evaluation.PIECE_SCORES[piece_color][piece_type][square]
+            - evaluation.PIECE_SCORES[self.color[square]][self.board[square]][square]
+        )
+
+        self.board[square] = piece_type
+        self.color[square] = piece_color
 
     def get_color(self, row: int, file: int) -> piece.Color:
         """
@@ -194,7 +366,24 @@ class Board():
         if not position.is_in_bounds([row, file]):
             return
 
-        self.color[(row * 8) + file] = new_color.value
+        square = (row * 8) + file
+        bit = 1 << square
+
+        self.hash ^= self._state_key()
+        self.color_bb[self.color[square]] &= ~bit
+        self.color_bb[new_color.value] |= bit
+
+        self.hash ^= (
+            zobrist.PIECE_KEYS[self.color[square]][self.board[square]][square]
+            ^ zobrist.PIECE_KEYS[new_color.value][self.board[square]][square]
+        )
+        self.score += (
+            evaluation.PIECE_SCORES[new_color.value][self.board[square]][square]
+            - evaluation.PIECE_SCORES[self.color[square]][self.board[square]][square]
+        )
+
+        self.color[square] = new_color.value
+        self.hash ^= self._state_key()
 
     def teleport_piece(self, row: int, file: int, new_row: int, new_file: int) -> None:
         """
@@ -210,6 +399,7 @@ class Board():
         )
         self.set_piece(row, file, piece.Type.NONE, piece.Color.NONE)
 
+    @instrumentation.hook
     def move_piece(self, row: int, file: int, new_row: int, new_file: int) -> bool:
         """
         Moves piece from row and file to new_row and new_file
@@ -217,126 +407,550 @@ class Board():
         Returns 1 if move was legal, 0 otherwise
         """
 
-        result = False
-        found_en_passant = False
-
-        current_piece = self.get_piece(row, file)
         current_color = self.get_color(row, file)
 
-        if current_color != board_config.active_color:
+        if current_color != self.active_color:
             return False
 
-        for valid_move in piece.get_valid_moves(row, file, True, self):
-            if position.equals(valid_move, [new_row, new_file]):
-
-                self.teleport_piece(row, file, new_row, new_file)
-
-                found_en_passant = self.handle_en_passant(
-                    row,
-                    new_row,
-                    new_file,
-                    current_piece
-                )
-
-                # Check for promotion
-                if (current_piece == piece.Type.PAWN and new_row in [0, 7]):
-                    self.set_piece(
-                        new_row,
-                        new_file,
-                        self.promotion_target,
-                        self.get_color(new_row, new_file)
-                    )
-
-                # Castle
-                if current_piece == piece.Type.KING and abs(file - new_file) > 1:
-                    if new_file > file:
-                        self.teleport_piece(row, 7, row, 5)
-                    else:
-                        self.teleport_piece(row, 0, row, 3)
-
-                # Update castling information
-                castle_info = self.black_castle_info
-                if current_color == piece.Color.WHITE:
-                    castle_info = self.white_castle_info
-
-                if current_piece == piece.Type.KING:
-                    castle_info[0] = 1
-                elif current_piece == piece.Type.ROOK and file == 0:
-                    castle_info[1] = 1
-                elif current_piece == piece.Type.ROOK and file == 7:
-                    castle_info[2] = 1
-
-                # Update game information
-                result = True
-                enemy_color = board_config.active_color
-                board_config.active_color = (
-                    piece.Color.WHITE
-                    if board_config.active_color == piece.Color.BLACK
-                    else piece.Color.BLACK
-                )
-                board_config.active_turn += 1
-
-                # Check for mate
-                self.check_for_mate(enemy_color)
+        if not position.is_in_bounds([new_row, new_file]):
+            return False
 
-                break
+        targets = self.legal_targets(current_color)[(row * 8) + file]
+        if not (targets >> ((new_row * 8) + new_file)) & 1:
+            return False
+
+        self.make_move(move_encoding.from_positions(
+            self,
+            [row, file],
+            [new_row, new_file],
+            self.promotion_target.value
+        ))
+
+        # Check for mate and draws
+        self.check_for_mate(current_color)
+        self.check_for_draw()
+
+        return True
+
+    def play_move(self, move: move_encoding.Move) -> bool:
+        """
+        Plays move (see move_encoding) if it is legal for the active color,
+        the packed counterpart of move_piece
+        Returns true if move was legal, false otherwise
+        """
+
+        current_color = self.active_color
+
+        if move not in self.legal_moves(current_color):
+            return False
+
+        self.make_move(move)
+
+        # Check for mate and draws
+        self.check_for_mate(current_color)
+        self.check_for_draw()
+
+        return True
+
+    def book_move(self,
+                  opening_book: book.Book,
+                  rng: random.Random | None = None) -> move_encoding.Move | None:
+        """
+        Returns a legal move for the active color from opening_book, picked at random by weight,
+        None if the book does not know the position
+        """
+
+        return opening_book.choose(self.hash, self.legal_moves(self.active_color), rng)
+
+    def probe_tablebase(self, endgame_tablebase: tablebase.Tablebase) -> tablebase.Probe | None:
+        """
+        Returns the exact result of the position for the active color from endgame_tablebase,
+        None if it has no table for the material on the board
+        """
+
+        return endgame_tablebase.probe(self)
+
+    def tablebase_move(self,
+                       endgame_tablebase: tablebase.Tablebase) -> move_encoding.Move | None:
+        """
+        Returns the move for the active color that wins fastest, keeps the draw or loses slowest
+        according to endgame_tablebase, None if it has no table for the material on the board
+        """
+
+        return endgame_tablebase.best_move(self)
+
+    def _cached_moves(self, color: piece.Color) -> tuple["array.array[int]", list[int]]:
+        """
+        Returns the legal moves of color and a bitboard of target squares per start square,
+        generated once per position
+        """
+
+        if self.move_cache_hash != self.hash:
+            self.move_cache = {}
+            self.move_cache_hash = self.hash
+
+        cached = self.move_cache.get(color.value)
+
+        if cached is None:
+            moves = bitboard.generate_moves(self, color.value, True)
+            targets = [0] * 64
+
+            for move in moves:
+                targets[move & 63] |= 1 << ((move >> 6) & 63)
+
+            cached = (moves, targets)
+            self.move_cache[color.value] = cached
+
+        return cached
+
+    @instrumentation.hook
+    def legal_moves(self, color: piece.Color) -> "array.array[int]":
+        """
+        Returns all legal moves (see move_encoding) of color in the current position
+
+        The moves are generated once per position and shared by every caller
+        until the position changes, so the returned array must not be changed
+        """
+
+        return self._cached_moves(color)[0]
+
+    def legal_targets(self, color: piece.Color) -> list[int]:
+        """
+        Returns a bitboard of legal target squares for every square,
+        bit (new_row * 8) + new_file of entry (row * 8) + file is set
+        if the piece of color at row and file may move to new_row and new_file
+
+        Shares the cache of legal_moves, the returned list must not be changed
+        """
+
+        return self._cached_moves(color)[1]
+
+    def get_valid_moves(self, row: int, file: int) -> list[list[int]]:
+        """
+        Returns all legal target squares of the piece at row and file
+        Returns 2d array of rows and files: [ [row,file], ... ]
+        """
+
+        current_color = self.get_color(row, file)
+
+        if current_color == piece.Color.NONE:
+            return []
+
+        targets = self.legal_targets(current_color)[(row * 8) + file]
+        result = []
+
+        while targets:
+            target = (targets & -targets).bit_length() - 1
+            targets &= targets - 1
+            result.append([target >> 3, target & 7])
+
+        return result
+
+    @instrumentation.hook
+    def make_move(self, move: move_encoding.Move) -> UndoRecord:
+        """
+        Plays move (see move_encoding) without checking if it is legal
+        Handles captures, en passant, promotion, castling and the side to move
+        Returns an undo record that unmake_move uses to take the move back
+
+        The flags of move have to match the position,
+        move_encoding.from_positions creates moves with the right flags
+        """
+
+        start = move & 63
+        target = (move >> 6) & 63
+        move_flags = move >> 12
+        moved = self.board[start]
+        color = self.color[start]
+
+        # En passant takes a pawn that is not on the target square
+        captured_square = target
+        if move_flags == move_encoding.EN_PASSANT:
+            captured_square = target - 8 if color == bitboard.WHITE else target + 8
+
+        undo = (
+            move,
+            moved,
+            self.board[captured_square],
+            self.color[captured_square],
+            captured_square,
+            self.en_passant_target,
+            self.en_passant_victim,
+            self.en_passant_valid,
+            self.white_castle_info,
+            self.black_castle_info,
+            self.active_color,
+            self.active_turn,
+            self.halfmove_clock,
+            self.hash,
+        )
+
+        self.history.append(self.hash)
+        self.repetitions[self.hash] = self.repetitions.get(self.hash, 0) + 1
+
+        self.hash ^= self._state_key()
+
+        if move_flags & move_encoding.CAPTURE:
+            self._place(captured_square, 0, 0)
+        self._place(start, 0, 0)
+
+        # Check for promotion
+        if move_flags & move_encoding.PROMOTION:
+            self._place(target, move_encoding.promotion(move), color)
+        else:
+            self._place(target, moved, color)
+
+        # Castle
+        if move_flags in (move_encoding.KING_CASTLE, move_encoding.QUEEN_CASTLE):
+            rook_start, rook_target = CASTLE_ROOKS[target]
+            self._place(rook_start, 0, 0)
+            self._place(rook_target, bitboard.ROOK, color)
 
-        self.en_passant_valid = (result == 1 and found_en_passant)
-        if not self.en_passant_valid:
+        self._update_castle_info(start, target, moved, color)
+
+        # Check if en passant can be done in the next move
+        if move_flags == move_encoding.DOUBLE_PUSH:
+            self.en_passant_target = [(start + target) >> 4, start & 7]
+            self.en_passant_victim = [target >> 3, target & 7]
+            self.en_passant_valid = True
+        else:
             self.en_passant_target = [-1, -1]
+            self.en_passant_victim = [-1, -1]
+            self.en_passant_valid = False
+
+        self.active_color = piece.Color(3 - color)
+        self.active_turn += 1
+
+        if moved == bitboard.PAWN or move_flags & move_encoding.CAPTURE:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        self.hash ^= self._state_key()
+
+        if board_config.debug_hash:
+            self.check_hash()
+        if board_config.debug_score:
+            self.check_score()
+
+        return undo
+
+    @instrumentation.hook
+    def unmake_move(self, undo: UndoRecord) -> None:
+        """
+        Takes back a move played with make_move using its undo record
+        Moves have to be taken back in the reverse order they were made
+        """
+
+        (
+            move,
+            moved,
+            captured,
+            captured_color,
+            captured_square,
+            self.en_passant_target,
+            self.en_passant_victim,
+            self.en_passant_valid,
+            self.white_castle_info,
+            self.black_castle_info,
+            self.active_color,
+            self.active_turn,
+            self.halfmove_clock,
+            previous_hash,
+        ) = undo
+
+        start = move & 63
+        target = (move >> 6) & 63
+        color = self.color[target]
+
+        # Castle
+        if move >> 12 in (move_encoding.KING_CASTLE, move_encoding.QUEEN_CASTLE):
+            rook_start, rook_target = CASTLE_ROOKS[target]
+            self._place(rook_target, 0, 0)
+            self._place(rook_start, bitboard.ROOK, color)
+
+        self._place(target, 0, 0)
+        self._place(start, moved, color)
+        if captured:
+            self._place(captured_square, captured, captured_color)
+
+        self.hash = previous_hash
+
+        self.history.pop()
+        if self.repetitions[previous_hash] == 1:
+            del self.repetitions[previous_hash]
+        else:
+            self.repetitions[previous_hash] -= 1
+
+        if board_config.debug_hash:
+            self.check_hash()
+        if board_config.debug_score:
+            self.check_score()
+
+    def _state_key(self) -> int:
+        """
+        Returns the part of the hash that does not depend on the pieces:
+        side to move, castling rights and en passant file
+        The en passant file only counts if the capture can be played, positions that differ
+        in an en passant target nobody can take are the same position for repetitions
+        """
+
+        key: int = (
+            zobrist.SIDE_KEYS[self.active_color.value]
+            ^ zobrist.castle_key(self.white_castle_info, self.black_castle_info)
+        )
+
+        if self.en_passant_valid and bitboard.can_capture_en_passant(self):
+            key ^= zobrist.en_passant_key(self.en_passant_target)
+
+        return key
+
+    def compute_hash(self) -> int:
+        """
+        Returns the hash of the position computed from scratch
+
+        Code that changes castle_info, the en passant target or
+        active_color directly has to assign this to hash afterwards
+        """
+
+        result = self._state_key()
+
+        for square in range(64):
+            result ^= zobrist.PIECE_KEYS[self.color[square]][self.board[square]][square]
 
         return result
 
+    def check_hash(self) -> None:
+        """
+        Raises InconsistentState if the incrementally updated hash
+        differs from the hash computed from scratch
+        """
+
+        if self.hash != self.compute_hash():
+            raise InconsistentState("Incremental hash does not match the position")
+
+    def compute_score(self) -> int:
+        """
+        Returns the packed material and piece-square score of the position computed from scratch
+        """
+
+        return evaluation.compute_score(self)
+
+    def check_score(self) -> None:
+        """
+        Raises InconsistentState if the incrementally updated score
+        differs from the score computed from scratch
+        """
+
+        if self.score != self.compute_score():
+            raise InconsistentState("Incremental score does not match the position")
+
+    def _update_castle_info(self, start: int, target: int, moved: int, color: int) -> None:
+        """
+        Subroutine of make_move
+        Marks kings and rooks that moved, or rooks that were taken, in the castle_info lists
+
+        The lists are replaced instead of changed in place,
+        so undo records keep the previous state
+        """
+
+        touched = (1 << start) | (1 << target)
+
+        if moved != bitboard.KING and not touched & CASTLE_SQUARES:
+            return
+
+        self.white_castle_info = [
+            self.white_castle_info[0] | int(moved == bitboard.KING and color == bitboard.WHITE),
+            self.white_castle_info[1] | (touched & 1),
+            self.white_castle_info[2] | ((touched >> 7) & 1),
+        ]
+        self.black_castle_info = [
+            self.black_castle_info[0] | int(moved == bitboard.KING and color == bitboard.BLACK),
+            self.black_castle_info[1] | ((touched >> 56) & 1),
+            self.black_castle_info[2] | ((touched >> 63) & 1),
+        ]
+
     def check_for_mate(self, enemy_color: piece.Color) -> None:
         """
         Checks for a mate on the current board and
-        updates board_config accordingly
-        """
-
-        num_turns, _ = piece.get_all_moves(board_config.active_color, self, True)
-        _, in_check = piece.get_all_moves(enemy_color, self, True)
-
-        if len(num_turns) == 0 and in_check:
-            board_config.game_over = True
-            board_config.color_checkmated = board_config.active_color
-        elif len(num_turns) == 0 and not in_check:
-            board_config.game_over = True
-
-    def handle_en_passant(self,
-                          row: int,
-                          new_row: int,
-                          new_file: int,
-                          current_piece: piece.Type) -> bool:
-        """
-        Subroutine of move_piece
-        Checks all piece related things considering en passant
-        Return True if en passant can be played the next move
-        """
-
-        # Check if en passant was done
-        if (
-            current_piece == piece.Type.PAWN
-            and position.equals(self.en_passant_target, [new_row, new_file])
-            and self.en_passant_valid
-        ):
-            self.set_piece(
-                self.en_passant_victim[0],
-                self.en_passant_victim[1],
-                piece.Type.NONE,
-                piece.Color.NONE
-            )
+        updates game_over and color_checkmated accordingly
+        """
 
-        # Check if en passant can be done in the next move
-        if current_piece == piece.Type.PAWN and abs(row - new_row) > 1:
-            self.en_passant_target = (
-                [new_row - 1, new_file]
-                if self.get_color(new_row, new_file) == piece.Color.WHITE else
-                [new_row + 1, new_file]
-            )
-            self.en_passant_victim = ([new_row, new_file])
+        if self.legal_moves(self.active_color):
+            return
+
+        self.game_over = True
+
+        king = self.king_square[self.active_color.value]
+        if king != -1 and self.is_square_attacked(king >> 3, king & 7, enemy_color):
+            self.color_checkmated = self.active_color
+        else:
+            self.draw = Draw.STALEMATE
+
+    def check_for_draw(self) -> None:
+        """
+        Checks for a draw by threefold repetition, the fifty-move rule or insufficient material
+        and updates game_over and draw accordingly, a game that is already over stays as it is
+        """
+
+        if self.game_over:
+            return
+
+        if self.repetition_count() >= 3:
+            self.draw = Draw.REPETITION
+        elif self.halfmove_clock >= FIFTY_MOVES:
+            self.draw = Draw.FIFTY_MOVES
+        elif self.is_insufficient_material():
+            self.draw = Draw.INSUFFICIENT_MATERIAL
+        else:
+            return
+
+        self.game_over = True
+
+    def repetition_count(self) -> int:
+        """
+        Returns how often the current position occurred in the game, counting the current one
+
+        Positions only repeat after reversible moves,
+        so all occurrences lie within the last halfmove_clock plies
+        """
+
+        return self.repetitions.get(self.hash, 0) + 1
+
+    def is_insufficient_material(self) -> bool:
+        """
+        Returns true if neither side can checkmate with the pieces left:
+        bare kings, a single minor piece, or bishops that all stand on squares of one color
+        """
+
+        if self.type_bb[bitboard.PAWN] | self.type_bb[bitboard.ROOK] | self.type_bb[bitboard.QUEEN]:
+            return False
+
+        minors = self.type_bb[bitboard.KNIGHT] | self.type_bb[bitboard.BISHOP]
+        if minors.bit_count() <= 1:
             return True
+        if self.type_bb[bitboard.KNIGHT]:
+            return False
+
+        bishops = self.type_bb[bitboard.BISHOP]
+
+        return not bishops & LIGHT_SQUARES or not bishops & ~LIGHT_SQUARES
+
+    def perft(self, depth: int, stop: threading.Event | None = None) -> int:
+        """
+        Returns the number of leaf nodes of the legal move tree
+        depth plies deep from the current position
+        Once stop is set the count ends early and only covers the nodes visited until then
+        """
+
+        moves = bitboard.generate_moves(self, self.active_color.value, True)
+
+        if depth <= 1:
+            return len(moves) if depth == 1 else 1
+
+        nodes = 0
+        for move in moves:
+            if stop is not None and stop.is_set():
+                break
+
+            undo = self.make_move(move)
+            nodes += self.perft(depth - 1, stop)
+            self.unmake_move(undo)
+
+        return nodes
+
+    def divide(self,
+               depth: int,
+               stop: threading.Event | None = None) -> list[tuple[move_encoding.Move, int]]:
+        """
+        Returns perft(depth - 1) after each legal move of the current position
+        Comparing this with another move generator narrows down where they disagree
+        Once stop is set no more moves are counted, the last count may be partial
+        """
 
-        return False
+        result = []
+
+        for move in bitboard.generate_moves(self, self.active_color.value, True):
+            if stop is not None and stop.is_set():
+                break
+
+            undo = self.make_move(move)
+            result.append((move, self.perft(depth - 1, stop)))
+            self.unmake_move(undo)
+
+        return result
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns a compact binary copy of the position for sending it to other processes:
+        one byte per square (type | color << 3), the castle_info flags,
+        the en passant target square (255 if none), the side to move, the turn
+        and the halfmove clock
+        """
+
+        castle_flags = 0
+        for i, flag in enumerate(self.white_castle_info + self.black_castle_info):
+            castle_flags |= flag << i
+
+        en_passant = 255
+        if self.en_passant_target[0] != -1:
+            en_passant = (self.en_passant_target[0] * 8) + self.en_passant_target[1]
+
+        return (
+            bytes([kind | (color << 3) for kind, color in zip(self.board, self.color)])
+            + bytes([castle_flags, en_passant, self.active_color.value])
+            + self.active_turn.to_bytes(4, "little")
+            + self.halfmove_clock.to_bytes(2, "little")
+        )
+
+    def load_bytes(self, data: bytes) -> None:
+        """
+        Loads a position created by to_bytes
+        """
+
+        self.clear()
+
+        for square in range(64):
+            if data[square]:
+                self._place(square, data[square] & 7, data[square] >> 3)
+
+        castle_flags = data[64]
+        self.white_castle_info = [(castle_flags >> i) & 1 for i in range(3)]
+        self.black_castle_info = [(castle_flags >> i) & 1 for i in range(3, 6)]
+
+        self.en_passant_target = [-1, -1]
+        self.en_passant_victim = [-1, -1]
+        self.en_passant_valid = data[65] != 255
+
+        if self.en_passant_valid:
+            row, file = data[65] >> 3, data[65] & 7
+            self.en_passant_target = [row, file]
+            self.en_passant_victim = [3 if row == 2 else 4, file]
+
+        self.active_color = piece.Color(data[66])
+        self.active_turn = int.from_bytes(data[67:71], "little")
+        self.halfmove_clock = int.from_bytes(data[71:73], "little")
+        self.game_over = False
+        self.color_checkmated = piece.Color.NONE
+        self.draw = Draw.NONE
+
+        self.hash = self.compute_hash()
+
+    def is_square_attacked(self, row: int, file: int, by_color: piece.Color) -> bool:
+        """
+        Returns true if a piece of by_color attacks the square at row and file
+        """
+
+        if not position.is_in_bounds([row, file]):
+            return False
+
+        return bitboard.is_attacked(
+            (row * 8) + file,
+            by_color.value,
+            self.color_bb[by_color.value],
+            self.type_bb,
+            self.color_bb[bitboard.WHITE] | self.color_bb[bitboard.BLACK]
+        )
 
     def copy(self) -> tuple[list[int], list[int]]:
         """
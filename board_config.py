@@ -1,11 +1,12 @@
 """
-Stores settings and references for the UI
+Stores settings shared by all boards
 (to make my linter the happiest little linter)
+
+The state of a game (active color, turn, result) is kept on board.Board
 """
 
-import piece
+# Check the incremental hash against one computed from scratch after every move (slow)
+debug_hash: bool = False
 
-active_color: piece.Color = piece.Color.WHITE
-active_turn: int = 0
-color_checkmated: piece.Color = piece.Color.NONE
-game_over: bool = False
+# Check the incremental evaluation score against one computed from scratch after every move (slow)
+debug_score: bool = False
@@ -0,0 +1,179 @@
+"""
+Opening books: files of (position hash, move, weight) records sorted by hash,
+memory mapped and binary searched, so opening a book reads nothing and costs the same for any size
+
+File layout, little endian:
+    MAGIC
+    INDEX entries, entry i is the number of records whose hash is below i << HASH_SHIFT
+    RECORD records, sorted by hash and move
+
+A lookup reads the two index entries around the top bits of the hash
+and binary searches the records between them, a few dozen bytes even for books of gigabytes.
+Hashes are Board.hash, moves are packed moves (move_encoding), weights say how often to play them
+"""
+
+import mmap
+import os
+import random
+import struct
+import tempfile
+import typing
+
+import move_encoding
+
+MAGIC = b"ICBOOK01"
+
+# The index splits the records by the top 16 bits of their hash
+INDEX_BITS = 16
+HASH_SHIFT = 64 - INDEX_BITS
+INDEX = struct.Struct(f"<{(1 << INDEX_BITS) + 1}I")
+INDEX_ENTRY = struct.Struct("<I")
+
+RECORD = struct.Struct("<QHH")
+HEADER_SIZE = len(MAGIC) + INDEX.size
+
+# Records packed per write
+WRITE_CHUNK = 1 << 16
+
+# Largest weight a record can hold, larger weights are capped
+MAX_WEIGHT = (1 << 16) - 1
+
+
+class Book():
+    """
+    An opening book file, memory mapped until close is called
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Maps the book at path
+        Raises OSError if it cannot be read and ValueError if it is not a book
+        """
+
+        with open(path, "rb") as stream:
+            size = os.fstat(stream.fileno()).st_size
+
+            if size < HEADER_SIZE or (size - HEADER_SIZE) % RECORD.size:
+                raise ValueError(f"{path} is not an opening book")
+
+            # The mapping stays valid after the file is closed
+            self.data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.data.close()
+            raise ValueError(f"{path} is not an opening book")
+
+        self.size = (size - HEADER_SIZE) // RECORD.size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __enter__(self) -> "Book":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Unmaps the book, it cannot be used afterwards
+        """
+
+        self.data.close()
+
+    def lookup(self, key: int) -> list[tuple[move_encoding.Move, int]]:
+        """
+        Returns the moves and weights of the position with hash key,
+        empty if the book does not know it
+        """
+
+        offset = len(MAGIC) + ((key >> HASH_SHIFT) * INDEX_ENTRY.size)
+        low = INDEX_ENTRY.unpack_from(self.data, offset)[0]
+        high = INDEX_ENTRY.unpack_from(self.data, offset + INDEX_ENTRY.size)[0]
+
+        # First record with a hash of at least key
+        while low < high:
+            middle = (low + high) // 2
+
+            if RECORD.unpack_from(self.data, HEADER_SIZE + (middle * RECORD.size))[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+
+        for index in range(low, self.size):
+            record_hash, move, weight = RECORD.unpack_from(
+                self.data, HEADER_SIZE + (index * RECORD.size)
+            )
+
+            if record_hash != key:
+                break
+
+            entries.append((move, weight))
+
+        return entries
+
+    def choose(self,
+               key: int,
+               legal: typing.Container[move_encoding.Move],
+               rng: random.Random | None = None) -> move_encoding.Move | None:
+        """
+        Returns a move of the position with hash key picked at random by weight,
+        only moves in legal count, so a hash collision never returns an illegal move
+        Returns None if the book has no such move
+        """
+
+        entries = [(move, weight) for move, weight in self.lookup(key) if weight and move in legal]
+
+        if not entries:
+            return None
+
+        moves = [move for move, _ in entries]
+        chosen: move_encoding.Move = (rng or random).choices(
+            moves, [weight for _, weight in entries]
+        )[0]
+
+        return chosen
+
+
+def write(path: str, weights: dict[tuple[int, move_encoding.Move], int]) -> int:
+    """
+    Writes the book of weights, indexed by position hash and move, to path
+    Records with weight 0 are left out, weights above MAX_WEIGHT are capped
+    The file is replaced at once, a reader never sees half a book
+    Returns the number of records written
+    """
+
+    records = sorted(
+        (key, move, min(weight, MAX_WEIGHT))
+        for (key, move), weight in weights.items()
+        if weight > 0
+    )
+    index = [0] * ((1 << INDEX_BITS) + 1)
+
+    for key, _, _ in records:
+        index[(key >> HASH_SHIFT) + 1] += 1
+
+    for bucket in range(1, len(index)):
+        index[bucket] += index[bucket - 1]
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+    try:
+        with os.fdopen(descriptor, "wb") as stream:
+            stream.write(MAGIC)
+            stream.write(INDEX.pack(*index))
+
+            for start in range(0, len(records), WRITE_CHUNK):
+                stream.write(b"".join(
+                    RECORD.pack(*record) for record in records[start:start + WRITE_CHUNK]
+                ))
+
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+    return len(records)
@@ -0,0 +1,145 @@
+"""
+Builds an opening book (see book) from PGN and EPD files
+
+Usage:
+    python build_book.py book.bin games.pgn                 the first 20 plies of every game
+    python build_book.py book.bin games.pgn --plies 30 --min-weight 4
+    python build_book.py book.bin openings.epd more.pgn     EPD lines with bm operations
+
+Every move played in the first plies of a PGN game adds to its weight in the position
+it was played in: 2 for the side that won, 1 for a draw or an unknown result,
+nothing for the side that lost.
+Every best move (bm) of an EPD line adds 1. Files ending in .pgn are read as PGN,
+all other files as EPD, - reads PGN from stdin
+"""
+
+import argparse
+import sys
+import time
+
+import board
+import book
+import fen
+import move_encoding
+import pgn
+
+# Plies of every game that go into the book
+DEFAULT_PLIES = 20
+
+# Indexed by game result, the weight a move of white and of black earns
+RESULT_WEIGHTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1), "*": (1, 1)}
+
+Weights = dict[tuple[int, move_encoding.Move], int]
+
+
+def add_game(weights: Weights,
+             my_board: board.Board,
+             tags: dict[str, str],
+             movetext: str,
+             plies: int) -> None:
+    """
+    Adds the first plies moves of a PGN game to weights,
+    up to the first malformed or illegal move
+    """
+
+    try:
+        my_board.load_fen(tags.get("FEN", fen.START_FEN))
+    except ValueError:
+        return
+
+    result = tags.get("Result", "*")
+    tokens = list(pgn.tokens(movetext))
+    if tokens and tokens[-1] in pgn.RESULTS:
+        result = tokens.pop()
+
+    earned = RESULT_WEIGHTS.get(result, RESULT_WEIGHTS["*"])
+
+    for token in tokens[:plies]:
+        try:
+            move = pgn.san_to_move(my_board, token)
+        except (ValueError, IndexError, KeyError):
+            return
+
+        key = (my_board.hash, move)
+        weights[key] = weights.get(key, 0) + earned[my_board.active_color.value - 1]
+        my_board.make_move(move)
+
+
+def add_epd(weights: Weights, my_board: board.Board, line: str) -> None:
+    """
+    Adds the best moves (bm operation, in SAN) of an EPD line to weights
+    Lines without a valid position or best move are skipped
+    """
+
+    fields = line.split(None, 4)
+
+    try:
+        my_board.load_fen(" ".join(fields[:4]))
+    except ValueError:
+        return
+
+    for operation in (fields[4] if len(fields) > 4 else "").split(";"):
+        names = operation.split()
+
+        if names[:1] != ["bm"]:
+            continue
+
+        for name in names[1:]:
+            try:
+                move = pgn.san_to_move(my_board, name)
+            except (ValueError, IndexError, KeyError):
+                continue
+
+            key = (my_board.hash, move)
+            weights[key] = weights.get(key, 0) + 1
+
+
+def main() -> int:
+    """
+    Entry point of the opening book builder
+    """
+
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN and EPD files")
+    parser.add_argument("output", help="book file to write")
+    parser.add_argument("inputs", nargs="+", help="PGN or EPD files, - for PGN from stdin")
+    parser.add_argument("--plies", type=int, default=DEFAULT_PLIES,
+                        help=f"plies of every game that go into the book (default {DEFAULT_PLIES})")
+    parser.add_argument("--min-weight", type=int, default=1,
+                        help="leave out moves with a lower weight (default 1)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    my_board = board.Board()
+    weights: Weights = {}
+    games = 0
+
+    try:
+        for path in args.inputs:
+            # pylint: disable-next=consider-using-with
+            stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+
+            with stream:
+                if path == "-" or path.lower().endswith(".pgn"):
+                    for tags, movetext in pgn.read_games(pgn.read_lines(stream)):
+                        add_game(weights, my_board, tags, movetext, args.plies)
+                        games += 1
+                else:
+                    for line in stream:
+                        add_epd(weights, my_board, line.decode("utf-8", "replace"))
+                        games += 1
+
+        weights = {key: weight for key, weight in weights.items() if weight >= args.min_weight}
+        records = book.write(args.output, weights)
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    print(f"games and lines {games}  records {records}  "
+          f"positions {len({key for key, _ in weights})}  "
+          f"time {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,647 @@
+"""
+Builds endgame tablebases (see tablebase) by retrograde analysis
+
+Usage:
+    python build_tablebase.py                          KQK, KRK, KPK and KBNK into tablebase.bin
+    python build_tablebase.py KBBK KQK --output tb.bin
+
+Tables for a king and up to two more pieces against a lone king. Mates are found first,
+then the positions one ply further away are found by taking back moves, ply by ply:
+a position with white to move is won as soon as one move leads to a lost position,
+a position with black to move is lost once all of its moves lead to won positions.
+Captures and promotions leave a table, the tables they lead to are built first and
+written to the same file. Needs NumPy (pip install numpy), like features
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import bitboard
+import tablebase
+
+DEFAULT_TABLES = ["KQK", "KRK", "KPK", "KBNK"]
+DEFAULT_OUTPUT = "tablebase.bin"
+
+# Positions worked on at once, bounds the memory of the temporary arrays
+CHUNK = 1 << 18
+
+Indices = npt.NDArray[np.int64]
+Values = npt.NDArray[np.uint8]
+
+# Square tables of bitboard as arrays
+SYMMETRIES = np.array(tablebase.SYMMETRIES, dtype=np.int64)
+BETWEEN = np.array(bitboard.BETWEEN, dtype=np.uint64)
+
+
+def _targets(bitboards: list[int], width: int) -> Indices:
+    """
+    Returns the squares of a bitboard per square as a (64, width) array padded with -1
+    """
+
+    table = np.full((64, width), -1, dtype=np.int64)
+
+    for square, targets in enumerate(bitboards):
+        squares = [target for target in range(64) if (targets >> target) & 1]
+        table[square, :len(squares)] = squares
+
+    return table
+
+
+def _adjacent(bitboards: list[int]) -> npt.NDArray[np.bool_]:
+    """
+    Returns a bitboard per square as a (64, 64) array of booleans
+    """
+
+    return np.array([[bool((targets >> target) & 1) for target in range(64)]
+                     for targets in bitboards])
+
+
+# -1 pads the target lists
+KING_TARGETS = _targets(bitboard.KING_ATTACKS, 8)
+KNIGHT_TARGETS = _targets(bitboard.KNIGHT_ATTACKS, 8)
+KING_ADJACENT = _adjacent(bitboard.KING_ATTACKS)
+KNIGHT_ADJACENT = _adjacent(bitboard.KNIGHT_ATTACKS)
+PAWN_ADJACENT = _adjacent(bitboard.PAWN_ATTACKS[bitboard.WHITE])
+DIAGONAL = _adjacent([bitboard.bishop_attacks(square, 0) for square in range(64)])
+STRAIGHT = _adjacent([bitboard.rook_attacks(square, 0) for square in range(64)])
+ALIGNED = DIAGONAL | STRAIGHT
+
+# Indexed by piece.Type value, the lines a slider moves along, None for other pieces
+LINES: list[npt.NDArray[np.bool_] | None] = [None] * 7
+LINES[bitboard.QUEEN] = ALIGNED
+LINES[bitboard.ROOK] = STRAIGHT
+LINES[bitboard.BISHOP] = DIAGONAL
+
+# Indexed by piece.Type value, the squares a piece reaches from a square on an empty board
+REACH: list[Indices | None] = [None] * 7
+REACH[bitboard.KING] = KING_TARGETS
+REACH[bitboard.KNIGHT] = KNIGHT_TARGETS
+REACH[bitboard.QUEEN] = _targets(
+    [bitboard.bishop_attacks(square, 0) | bitboard.rook_attacks(square, 0) for square in range(64)],
+    27
+)
+REACH[bitboard.ROOK] = _targets([bitboard.rook_attacks(square, 0) for square in range(64)], 14)
+REACH[bitboard.BISHOP] = _targets([bitboard.bishop_attacks(square, 0) for square in range(64)], 13)
+
+# Indexed by square of the white king, the two transforms to try (the same one twice
+# if only one moves the king into place), see tablebase.PAWNLESS_TRANSFORMS
+PAWNLESS_TRANSFORMS = np.array([(both * 2)[:2] for both in tablebase.PAWNLESS_TRANSFORMS])
+PAWN_TRANSFORMS = np.array([(both * 2)[:2] for both in tablebase.PAWN_TRANSFORMS])
+PAWNLESS_SLOTS = np.array(tablebase.PAWNLESS_SLOTS, dtype=np.int64)
+PAWN_SLOTS = np.array(tablebase.PAWN_SLOTS, dtype=np.int64)
+
+# Indexed by slot, the square of the white king
+PAWNLESS_KINGS = np.array(tablebase.TRIANGLE, dtype=np.int64)
+PAWN_KINGS = np.array([square for square in range(64) if tablebase.PAWN_SLOTS[square] >= 0])
+
+PROMOTIONS = (bitboard.QUEEN, bitboard.ROOK, bitboard.BISHOP, bitboard.KNIGHT)
+
+
+class Table():
+    """
+    A table being built: the material, the results so far and the conversion
+    between the squares of positions and their indices
+    """
+
+    def __init__(self, kinds: list[int]) -> None:
+        self.kinds = kinds
+        self.name = tablebase.material_name(kinds)
+        self.size = tablebase.table_size(kinds)
+        self.pawns = bitboard.PAWN in kinds
+
+        # Indexed by position, 0 for a draw or not known yet, 1 + plies to mate otherwise
+        self.white = np.zeros(self.size, dtype=np.uint8)
+        self.black = np.zeros(self.size, dtype=np.uint8)
+
+    def index(self, squares: Indices) -> Indices:
+        """
+        Returns the indices of positions, the vectorized tablebase.index
+        squares is an (n, m) array with rows for the white king, the black king
+        and the pieces next to the white king
+        """
+
+        transforms = (PAWN_TRANSFORMS if self.pawns else PAWNLESS_TRANSFORMS)[squares[0]]
+        slots = PAWN_SLOTS if self.pawns else PAWNLESS_SLOTS
+        best: Indices = np.zeros(0, dtype=np.int64)
+
+        for column in range(2):
+            image = SYMMETRIES[transforms[:, column], squares]
+
+            if len(self.kinds) == 2 and self.kinds[0] == self.kinds[1]:
+                image[2], image[3] = np.minimum(image[2], image[3]), np.maximum(image[2], image[3])
+
+            value = slots[image[0]]
+            for row in image[1:]:
+                value = (value * 64) + row
+
+            best = value if column == 0 else np.minimum(best, value)
+
+        return best
+
+    def squares(self, indices: Indices) -> Indices:
+        """
+        Returns the squares of the positions at indices as an (n, m) array, see index
+        """
+
+        rows = []
+
+        for _ in range(len(self.kinds) + 1):
+            rows.append(indices % 64)
+            indices = indices // 64
+
+        kings = PAWN_KINGS if self.pawns else PAWNLESS_KINGS
+
+        return np.stack([kings[indices]] + rows[::-1])
+
+
+def bits(squares: Indices) -> npt.NDArray[np.uint64]:
+    """
+    Returns the bitboards of squares
+    """
+
+    return np.left_shift(np.uint64(1), squares.astype(np.uint64))
+
+
+def occupancy(squares: Indices) -> npt.NDArray[np.uint64]:
+    """
+    Returns the bitboard of the occupied squares of every position
+    """
+
+    result = np.zeros(squares.shape[1], dtype=np.uint64)
+
+    for row in squares:
+        result |= bits(row)
+
+    return result
+
+
+def attacked(kinds: list[int],
+             squares: Indices,
+             targets: Indices,
+             occupied: npt.NDArray[np.uint64],
+             alive: npt.NDArray[np.bool_] | None = None) -> npt.NDArray[np.bool_]:
+    """
+    Returns per position whether a white piece attacks its square in targets
+    Pieces whose row in alive is false (captured) do not attack
+    """
+
+    result: npt.NDArray[np.bool_] = KING_ADJACENT[squares[0], targets]
+
+    for number, kind in enumerate(kinds):
+        start = squares[number + 2]
+        lines = LINES[kind]
+
+        if kind == bitboard.KNIGHT:
+            attacks = KNIGHT_ADJACENT[start, targets]
+        elif kind == bitboard.PAWN:
+            attacks = PAWN_ADJACENT[start, targets]
+        else:
+            assert lines is not None
+            attacks = lines[start, targets] & ((BETWEEN[start, targets] & occupied) == 0)
+
+        if alive is not None:
+            attacks &= alive[number]
+
+        result = result | attacks
+
+    return result
+
+
+def legal(kinds: list[int], squares: Indices, white_to_move: bool) -> npt.NDArray[np.bool_]:
+    """
+    Returns per position whether it can occur with the given side to move:
+    no two pieces on one square, no pawn on the first or last rank
+    and the side not to move not in check
+    """
+
+    result = np.ones(squares.shape[1], dtype=bool)
+
+    for first, row in enumerate(squares):
+        for other in squares[first + 1:]:
+            result &= row != other
+
+    for number, kind in enumerate(kinds):
+        if kind == bitboard.PAWN:
+            ranks = squares[number + 2] >> 3
+            result &= (ranks > 0) & (ranks < 7)
+
+    if white_to_move:
+        result &= ~attacked(kinds, squares, squares[1], occupancy(squares))
+    else:
+        result &= ~KING_ADJACENT[squares[0], squares[1]]
+
+    return result
+
+
+class Builder():
+    """
+    Builds tables together with the tables captures and promotions lead to
+    """
+
+    def __init__(self) -> None:
+        # Indexed by material name, the finished tables
+        self.tables: dict[str, Table] = {}
+
+    def build(self, kinds: list[int]) -> Table:
+        """
+        Returns the finished table for kinds, built first with the tables it depends on
+        """
+
+        name = tablebase.material_name(kinds)
+        if name in self.tables:
+            return self.tables[name]
+
+        for number in range(len(kinds)):
+            self.build(kinds[:number] + kinds[number + 1:])
+
+        if bitboard.PAWN in kinds:
+            for promotion in PROMOTIONS:
+                self.build([promotion if kind == bitboard.PAWN else kind for kind in kinds])
+
+        start = time.perf_counter()
+        table = Table(kinds)
+        Solver(self, table).solve()
+        self.tables[name] = table
+
+        longest = int(max(table.white.max(), table.black.max()))
+        mates = f"longest mate {longest - 1} plies" if longest else "no mates"
+        print(f"{name}: {table.size} positions per side, "
+              f"{np.count_nonzero(table.white)} won with white to move, "
+              f"{mates}, {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        return table
+
+    def lookup(self, kinds: list[int], squares: Indices, white_to_move: bool) -> Values:
+        """
+        Returns the values of positions in the finished table for kinds,
+        the rows of the pieces in squares follow kinds in any order
+        """
+
+        table = self.tables[tablebase.material_name(kinds)]
+        order = sorted(range(len(kinds)), key=lambda number: tablebase.sort_key(kinds[number]))
+        squares = squares[[0, 1] + [number + 2 for number in order]]
+        values: Values = (table.white if white_to_move else table.black)[table.index(squares)]
+
+        return values
+
+
+class Solver():
+    """
+    Retrograde analysis of one table
+    """
+
+    def __init__(self, builder: Builder, table: Table) -> None:
+        self.builder = builder
+        self.table = table
+
+        # Indexed by side to move (0 for white) and position, whether the position can occur,
+        # only true at the one index that stands for all its mirror images
+        self.legal = np.zeros((2, table.size), dtype=bool)
+
+        # Indexed by position with black to move: the position after every king move
+        # (-1 if the move is illegal or a capture), the highest value of the won positions
+        # captures lead to and whether a capture leads to a draw
+        self.successors = np.full((table.size, 8), -1, dtype=np.int32)
+        self.exits = np.zeros(table.size, dtype=np.uint8)
+        self.escapes = np.zeros(table.size, dtype=bool)
+
+        # Indexed by plies, positions to look at in that ply because
+        # a capture or promotion leaving the table decides them then
+        self.scheduled: dict[int, list[Indices]] = {}
+
+    def solve(self) -> None:
+        """
+        Fills in the results of the table, ply by ply from the mates on
+        """
+
+        mates = [
+            self.prepare(np.arange(start, min(start + CHUNK, self.table.size), dtype=np.int64))
+            for start in range(0, self.table.size, CHUNK)
+        ]
+        lost = np.concatenate(mates)
+        self.table.black[lost] = 1
+        plies = 1
+
+        while len(lost) or any(key >= plies for key in self.scheduled):
+            won = self._unique(
+                [self._white_predecessors(lost)] + self.scheduled.pop(plies, []),
+                self.legal[0] & (self.table.white == 0)
+            )
+            self.table.white[won] = plies + 1
+
+            candidates = self._unique(
+                [self._black_predecessors(won)] + self.scheduled.pop(plies + 1, []),
+                self.legal[1] & (self.table.black == 0) & ~self.escapes
+            )
+            lost = self._lost(candidates, plies + 2)
+            plies += 2
+
+    def prepare(self, indices: Indices) -> Indices:
+        """
+        Fills in legality, successors, exits and escapes of the positions at indices
+        and schedules their promotions
+        Returns the positions where black is mated
+        """
+
+        table = self.table
+        squares = table.squares(indices)
+        canonical = table.index(squares) == indices
+        self.legal[0, indices] = canonical & legal(table.kinds, squares, True)
+        self.legal[1, indices] = canonical & legal(table.kinds, squares, False)
+
+        occupied = occupancy(squares)
+        moves = np.zeros(len(indices), dtype=bool)
+
+        for direction in range(8):
+            moves |= self._black_move(indices, squares, occupied, direction)
+
+        for number, kind in enumerate(table.kinds):
+            if kind == bitboard.PAWN:
+                self._promotions(indices, squares, occupied, number)
+
+        mated = (
+            self.legal[1, indices] & ~moves
+            & attacked(table.kinds, squares, squares[1], occupied)
+        )
+        result: Indices = indices[mated]
+
+        return result
+
+    def _schedule(self, plies: npt.NDArray[np.integer[typing.Any]], indices: Indices) -> None:
+        """
+        Looks at the positions at indices again in their plies (0 for never)
+        """
+
+        for value in np.unique(plies[plies > 0]):
+            self.scheduled.setdefault(int(value), []).append(indices[plies == value])
+
+    @staticmethod
+    def _unique(parts: list[Indices], mask: npt.NDArray[np.bool_]) -> Indices:
+        """
+        Returns the distinct indices in parts where mask is true
+        """
+
+        indices = np.unique(np.concatenate(parts))
+        result: Indices = indices[mask[indices]]
+
+        return result
+
+    def _black_move(self,
+                    indices: Indices,
+                    squares: Indices,
+                    occupied: npt.NDArray[np.uint64],
+                    direction: int) -> npt.NDArray[np.bool_]:
+        """
+        Subroutine of prepare, fills in the successor, exit and escape of the black king move
+        in direction for the positions at indices
+        Returns per position whether the move is legal
+        """
+
+        table = self.table
+        targets = KING_TARGETS[squares[1], direction]
+        on_board = targets >= 0
+        moved = squares.copy()
+        moved[1] = np.maximum(targets, 0)
+
+        # Sliders attack through the square the king leaves
+        vacated = occupied & ~bits(squares[1])
+
+        quiet = (
+            on_board & ((occupied & bits(moved[1])) == 0)
+            & ~attacked(table.kinds, squares, moved[1], vacated)
+            & self.legal[1, indices]
+        )
+        self.successors[indices[quiet], direction] = table.index(moved[:, quiet])
+        result: npt.NDArray[np.bool_] = quiet
+
+        for number in range(len(table.kinds)):
+            captures = on_board & (squares[number + 2] == moved[1]) & self.legal[1, indices]
+            result = result | self._capture(indices, moved, vacated, captures, number)
+
+        return result
+
+    def _capture(self,
+                 indices: Indices,
+                 moved: Indices,
+                 vacated: npt.NDArray[np.uint64],
+                 captures: npt.NDArray[np.bool_],
+                 number: int) -> npt.NDArray[np.bool_]:
+        """
+        Subroutine of _black_move, fills in exits and escapes of the positions at indices
+        where the black king moved onto the piece in row number + 2 of moved
+        Returns per position whether the capture is legal
+        """
+
+        kinds = self.table.kinds
+        alive = np.ones((len(kinds), len(indices)), dtype=bool)
+        alive[number] = False
+        captures = captures & ~attacked(kinds, moved, moved[1], vacated, alive)
+
+        values = self.builder.lookup(
+            kinds[:number] + kinds[number + 1:],
+            np.delete(moved[:, captures], number + 2, axis=0),
+            True
+        )
+        positions = indices[captures]
+
+        self.escapes[positions[values == 0]] = True
+        self.exits[positions] = np.maximum(self.exits[positions], values)
+
+        # Lost once the position the capture leads to is won, in the plies of that position + 1
+        self._schedule(values, positions)
+
+        return captures
+
+    def _promotions(self,
+                    indices: Indices,
+                    squares: Indices,
+                    occupied: npt.NDArray[np.uint64],
+                    number: int) -> None:
+        """
+        Subroutine of prepare, schedules the positions at indices where the pawn
+        in row number + 2 of squares promotes to a position lost for black
+        """
+
+        targets = squares[number + 2] + 8
+        pushes = (
+            self.legal[0, indices] & (targets >= 56)
+            & ((occupied & bits(np.minimum(targets, 63))) == 0)
+        )
+        moved = squares[:, pushes]
+        moved[number + 2] = targets[pushes]
+        best = np.zeros(len(moved[0]), dtype=np.int64)
+
+        for promotion in PROMOTIONS:
+            kinds = self.table.kinds.copy()
+            kinds[number] = promotion
+            values = self.builder.lookup(kinds, moved, False).astype(np.int64)
+            best = np.where((values > 0) & ((best == 0) | (values < best)), values, best)
+
+        # Won in the plies of the lost position + 1
+        self._schedule(best, indices[pushes])
+
+    def _white_predecessors(self, lost: Indices) -> Indices:
+        """
+        Returns the positions with white to move where a white move leads to a position in lost
+        """
+
+        parts = [np.zeros(0, dtype=np.int64)]
+
+        for start in range(0, len(lost), CHUNK):
+            squares = self.table.squares(lost[start:start + CHUNK])
+            occupied = occupancy(squares)
+
+            for row, kind in enumerate(self.table.kinds, 2):
+                parts += self._take_back(squares, occupied, row, kind)
+
+            parts += self._take_back(squares, occupied, 0, bitboard.KING)
+
+        return np.concatenate(parts)
+
+    def _black_predecessors(self, won: Indices) -> Indices:
+        """
+        Returns the positions with black to move where a king move leads to a position in won
+        """
+
+        parts = [np.zeros(0, dtype=np.int64)]
+
+        for start in range(0, len(won), CHUNK):
+            squares = self.table.squares(won[start:start + CHUNK])
+            parts += self._take_back(squares, occupancy(squares), 1, bitboard.KING)
+
+        return np.concatenate(parts)
+
+    def _take_back(self,
+                   squares: Indices,
+                   occupied: npt.NDArray[np.uint64],
+                   row: int,
+                   kind: int) -> list[Indices]:
+        """
+        Returns the positions before every quiet move of the piece of kind in row of squares
+        that may have led to the positions, legal or not
+        """
+
+        targets = squares[row]
+        parts = []
+
+        for origins, valid, passed in _origins(kind, targets):
+            valid &= (occupied & bits(np.maximum(origins, 0))) == 0
+
+            if LINES[kind] is not None:
+                valid &= (BETWEEN[targets, np.maximum(origins, 0)] & occupied) == 0
+            if passed is not None:
+                valid &= (occupied & bits(passed)) == 0
+
+            moved = squares[:, valid]
+            moved[row] = origins[valid]
+            parts.append(self.table.index(moved))
+
+        return parts
+
+    def _lost(self, candidates: Indices, value: int) -> Indices:
+        """
+        Marks the positions in candidates where every black move leads to a won position
+        as lost with value
+        Positions with a capture leading to a longer win are left for the ply
+        that capture is scheduled in
+        Returns them
+        """
+
+        successors = self.successors[candidates]
+        values = np.where(successors >= 0, self.table.white[np.maximum(successors, 0)], 0)
+        lost = np.all((successors < 0) | (values > 0), axis=1) & (self.exits[candidates] < value)
+
+        result: Indices = candidates[lost]
+        self.table.black[result] = value
+
+        return result
+
+
+def _origins(kind: int, targets: Indices) -> typing.Iterator[
+        tuple[Indices, npt.NDArray[np.bool_], Indices | None]]:
+    """
+    Yields the squares a white piece of kind on targets may have come from,
+    whether it may have without looking at the other pieces
+    and the square a pawn passed on the way (None if none)
+    """
+
+    if kind == bitboard.PAWN:
+        yield targets - 8, targets >= 16, None
+        yield targets - 16, (targets >> 3) == 3, np.maximum(targets - 8, 0)
+        return
+
+    reach = REACH[kind]
+    assert reach is not None
+
+    for column in range(reach.shape[1]):
+        origins = reach[targets, column]
+        yield origins, origins >= 0, None
+
+
+def write(path: str, tables: list[Table]) -> None:
+    """
+    Writes tables to a tablebase file at path
+    The file is replaced at once, a reader never sees half a tablebase
+    """
+
+    offset = tablebase.HEADER.size + (len(tables) * tablebase.ENTRY.size)
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+    try:
+        with os.fdopen(descriptor, "wb") as stream:
+            stream.write(tablebase.HEADER.pack(tablebase.MAGIC, len(tables)))
+
+            for table in tables:
+                stream.write(tablebase.ENTRY.pack(table.name.encode("ascii"), offset, table.size))
+                offset += 2 * table.size
+
+            for table in tables:
+                stream.write(table.white.tobytes())
+                stream.write(table.black.tobytes())
+
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def main() -> int:
+    """
+    Entry point of the tablebase builder
+    """
+
+    parser = argparse.ArgumentParser(description="Build endgame tablebases")
+    parser.add_argument("tables", nargs="*", default=DEFAULT_TABLES,
+                        help=f"material of the tables (default {' '.join(DEFAULT_TABLES)})")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                        help=f"tablebase file to write (default {DEFAULT_OUTPUT})")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    builder = Builder()
+
+    try:
+        for name in args.tables:
+            builder.build(tablebase.parse_material(name))
+
+        write(args.output, list(builder.tables.values()))
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    print(f"{len(builder.tables)} tables written to {args.output} "
+          f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3 @@
+"""
+Lets the tests in tests import the modules of the repository root
+"""
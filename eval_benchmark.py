@@ -0,0 +1,139 @@
+"""
+Measures how fast positions are evaluated
+
+Usage:
+    python eval_benchmark.py                     check the incremental score and the minimum rate
+    python eval_benchmark.py --positions 10000   use more distinct positions
+    python eval_benchmark.py --min-rate 500000   require another rate
+
+Random games are played and taken back move by move first, the check fails if the
+incremental score of any position differs from the score computed from scratch.
+The rates are the best of several rounds over all positions, evaluate with the incremental
+score against the same evaluation computed from scratch by scanning all 64 squares
+"""
+
+import argparse
+import random
+import sys
+import time
+import typing
+
+import board
+import evaluation
+import fen
+
+# Evaluations per second evaluate has to reach
+DEFAULT_MIN_RATE = 300_000
+
+# Seed of the random games, so every run uses the same positions
+SEED = 19
+
+
+def random_positions(count: int) -> tuple[list[board.Board], list[str]]:
+    """
+    Returns count boards with positions from random games
+    and a description of every position whose incremental score was wrong
+    while the games were played and taken back
+    """
+
+    rng = random.Random(SEED)
+    my_board = board.Board()
+    positions: list[board.Board] = []
+    failures: list[str] = []
+
+    while len(positions) < count:
+        my_board.load_fen(fen.START_FEN)
+        undos = []
+
+        for _ in range(rng.randrange(1, 120)):
+            moves = my_board.legal_moves(my_board.active_color)
+            if not moves:
+                break
+
+            undos.append(my_board.make_move(rng.choice(moves)))
+            positions.append(board.Board())
+            positions[-1].load_bytes(my_board.to_bytes())
+
+            if my_board.score != my_board.compute_score():
+                failures.append(f"{my_board.board_to_fen()} has a wrong score after the move")
+
+        while undos:
+            my_board.unmake_move(undos.pop())
+
+            if my_board.score != my_board.compute_score():
+                failures.append(f"{my_board.board_to_fen()} has a wrong score after unmake_move")
+
+    return positions[:count], failures
+
+
+def evaluate_from_scratch(position: board.Board) -> int:
+    """
+    Returns evaluation.evaluate of position with the score computed from scratch
+    """
+
+    saved = position.score
+    position.score = position.compute_score()
+    score = evaluation.evaluate(position)
+    position.score = saved
+
+    return score
+
+
+def rate(positions: list[board.Board],
+         function: typing.Callable[[board.Board], int],
+         rounds: int) -> float:
+    """
+    Returns the best rate of calling function on all positions in calls per second
+    """
+
+    seconds = float("inf")
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for position in positions:
+            function(position)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    return len(positions) / seconds
+
+
+def main() -> int:
+    """
+    Entry point of the evaluation benchmark
+    """
+
+    parser = argparse.ArgumentParser(description="Measure the static evaluation")
+    parser.add_argument("--positions", type=int, default=5000,
+                        help="number of distinct positions from random games (default 5000)")
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="rounds over all positions (default 5)")
+    parser.add_argument("--min-rate", type=float, default=DEFAULT_MIN_RATE,
+                        help=f"evaluations per second needed (default {DEFAULT_MIN_RATE})")
+    args = parser.parse_args()
+
+    positions, failures = random_positions(args.positions)
+    rounds = max(1, args.rounds)
+    incremental = rate(positions, evaluation.evaluate, rounds)
+    from_scratch = rate(positions, evaluate_from_scratch, rounds)
+
+    print(f"positions {len(positions)}  failed {len(failures)}")
+    print(f"incremental  {incremental:>10.0f} evals/s  minimum {args.min_rate:.0f} evals/s")
+    print(f"from scratch {from_scratch:>10.0f} evals/s  ({incremental / from_scratch:.1f}x slower)")
+
+    for failure in failures[:10]:
+        print(f"FAILED, {failure}")
+
+    passed = not failures
+
+    if incremental < args.min_rate:
+        print("FAILED, below the minimum rate")
+        passed = False
+
+    if passed:
+        print("ok")
+
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""
+Static evaluation of positions: material and piece-square tables,
+tapered between a middlegame and an endgame score by the material left on the board
+
+Every piece on a square is worth a packed score holding its middlegame score, its endgame score
+and its share of the game phase. Board keeps the sum over all its pieces in Board.score,
+updated by every piece it puts or removes, so evaluate only unpacks and blends that sum
+"""
+
+import typing
+
+# piece.Color values, written out because fen imports this module while piece imports fen,
+# so piece.Color may not exist yet while this module is loaded
+WHITE = 1
+BLACK = 2
+
+# The packed score of a piece is middlegame << LANE_BITS + endgame plus phase << 2 * LANE_BITS,
+# sums over all pieces stay far below LANE_HALF in both score lanes
+LANE_BITS = 20
+LANE_HALF = 1 << (LANE_BITS - 1)
+LANE_MASK = (1 << LANE_BITS) - 1
+
+# Indexed by piece.Type value, the king is never captured and has no value
+MIDDLEGAME_VALUES = [0, 100, 0, 900, 500, 330, 320]
+ENDGAME_VALUES = [0, 120, 0, 900, 520, 300, 290]
+
+# Indexed by piece.Type value, the share of the game phase
+# The pieces of the starting position add up to MAX_PHASE (pure middlegame), bare kings to 0
+PHASES = [0, 0, 0, 4, 2, 1, 1]
+MAX_PHASE = 24
+
+# Piece-square tables as seen by white, rank 8 first, black uses them mirrored
+# Indexed by piece.Type value, the middlegame and endgame table
+_TABLES = [
+    ([0] * 64, [0] * 64),
+    (
+        [
+            0, 0, 0, 0, 0, 0, 0, 0,
+            50, 50, 50, 50, 50, 50, 50, 50,
+            10, 10, 20, 30, 30, 20, 10, 10,
+            5, 5, 10, 25, 25, 10, 5, 5,
+            0, 0, 0, 20, 20, 0, 0, 0,
+            5, -5, -10, 0, 0, -10, -5, 5,
+            5, 10, 10, -20, -20, 10, 10, 5,
+            0, 0, 0, 0, 0, 0, 0, 0,
+        ],
+        [
+            0, 0, 0, 0, 0, 0, 0, 0,
+            80, 80, 80, 80, 80, 80, 80, 80,
+            50, 50, 50, 50, 50, 50, 50, 50,
+            30, 30, 30, 30, 30, 30, 30, 30,
+            15, 15, 15, 15, 15, 15, 15, 15,
+            5, 5, 5, 5, 5, 5, 5, 5,
+            0, 0, 0, 0, 0, 0, 0, 0,
+            0, 0, 0, 0, 0, 0, 0, 0,
+        ],
+    ),
+    (
+        [
+            -30, -40, -40, -50, -50, -40, -40, -30,
+            -30, -40, -40, -50, -50, -40, -40, -30,
+            -30, -40, -40, -50, -50, -40, -40, -30,
+            -30, -40, -40, -50, -50, -40, -40, -30,
+            -20, -30, -30, -40, -40, -30, -30, -20,
+            -10, -20, -20, -20, -20, -20, -20, -10,
+            20, 20, 0, 0, 0, 0, 20, 20,
+            20, 30, 10, 0, 0, 10, 30, 20,
+        ],
+        [
+            -50, -40, -30, -20, -20, -30, -40, -50,
+            -30, -20, -10, 0, 0, -10, -20, -30,
+            -30, -10, 20, 30, 30, 20, -10, -30,
+            -30, -10, 30, 40, 40, 30, -10, -30,
+            -30, -10, 30, 40, 40, 30, -10, -30,
+            -30, -10, 20, 30, 30, 20, -10, -30,
+            -30, -30, 0, 0, 0, 0, -30, -30,
+            -50, -30, -30, -30, -30, -30, -30, -50,
+        ],
+    ),
+    (
+        [
+            -20, -10, -10, -5, -5, -10, -10, -20,
+            -10, 0, 0, 0, 0, 0, 0, -10,
+            -10, 0, 5, 5, 5, 5, 0, -10,
+            -5, 0, 5, 5, 5, 5, 0, -5,
+            0, 0, 5, 5, 5, 5, 0, -5,
+            -10, 5, 5, 5, 5, 5, 0, -10,
+            -10, 0, 5, 0, 0, 0, 0, -10,
+            -20, -10, -10, -5, -5, -10, -10, -20,
+        ],
+        [
+            -20, -10, -10, -5, -5, -10, -10, -20,
+            -10, 0, 0, 0, 0, 0, 0, -10,
+            -10, 0, 5, 5, 5, 5, 0, -10,
+            -5, 0, 5, 10, 10, 5, 0, -5,
+            -5, 0, 5, 10, 10, 5, 0, -5,
+            -10, 0, 5, 5, 5, 5, 0, -10,
+            -10, 0, 0, 0, 0, 0, 0, -10,
+            -20, -10, -10, -5, -5, -10, -10, -20,
+        ],
+    ),
+    (
+        [
+            0, 0, 0, 0, 0, 0, 0, 0,
+            5, 10, 10, 10, 10, 10, 10, 5,
+            -5, 0, 0, 0, 0, 0, 0, -5,
+            -5, 0, 0, 0, 0, 0, 0, -5,
+            -5, 0, 0, 0, 0, 0, 0, -5,
+            -5, 0, 0, 0, 0, 0, 0, -5,
+            -5, 0, 0, 0, 0, 0, 0, -5,
+            0, 0, 0, 5, 5, 0, 0, 0,
+        ],
+        [
+            0, 0, 0, 0, 0, 0, 0, 0,
+            10, 10, 10, 10, 10, 10, 10, 10,
+            0, 0, 0, 0, 0, 0, 0, 0,
+            0, 0, 0, 0, 0, 0, 0, 0,
+            0, 0, 0, 0, 0, 0, 0, 0,
+            0, 0, 0, 0, 0, 0, 0, 0,
+            0, 0, 0, 0, 0, 0, 0, 0,
+            0, 0, 0, 0, 0, 0, 0, 0,
+        ],
+    ),
+    (
+        [
+            -20, -10, -10, -10, -10, -10, -10, -20,
+            -10, 0, 0, 0, 0, 0, 0, -10,
+            -10, 0, 5, 10, 10, 5, 0, -10,
+            -10, 5, 5, 10, 10, 5, 5, -10,
+            -10, 0, 10, 10, 10, 10, 0, -10,
+            -10, 10, 10, 10, 10, 10, 10, -10,
+            -10, 5, 0, 0, 0, 0, 5, -10,
+            -20, -10, -10, -10, -10, -10, -10, -20,
+        ],
+        [
+            -20, -10, -10, -10, -10, -10, -10, -20,
+            -10, 0, 0, 0, 0, 0, 0, -10,
+            -10, 0, 5, 10, 10, 5, 0, -10,
+            -10, 0, 10, 15, 15, 10, 0, -10,
+            -10, 0, 10, 15, 15, 10, 0, -10,
+            -10, 0, 5, 10, 10, 5, 0, -10,
+            -10, 0, 0, 0, 0, 0, 0, -10,
+            -20, -10, -10, -10, -10, -10, -10, -20,
+        ],
+    ),
+    (
+        [
+            -50, -40, -30, -30, -30, -30, -40, -50,
+            -40, -20, 0, 0, 0, 0, -20, -40,
+            -30, 0, 10, 15, 15, 10, 0, -30,
+            -30, 5, 15, 20, 20, 15, 5, -30,
+            -30, 0, 15, 20, 20, 15, 0, -30,
+            -30, 5, 10, 15, 15, 10, 5, -30,
+            -40, -20, 0, 5, 5, 0, -20, -40,
+            -50, -40, -30, -30, -30, -30, -40, -50,
+        ],
+        [
+            -50, -40, -30, -30, -30, -30, -40, -50,
+            -40, -20, 0, 0, 0, 0, -20, -40,
+            -30, 0, 10, 15, 15, 10, 0, -30,
+            -30, 0, 15, 20, 20, 15, 0, -30,
+            -30, 0, 15, 20, 20, 15, 0, -30,
+            -30, 0, 10, 15, 15, 10, 0, -30,
+            -40, -20, 0, 0, 0, 0, -20, -40,
+            -50, -40, -30, -30, -30, -30, -40, -50,
+        ],
+    ),
+]
+
+
+def pack(middlegame: int, endgame: int, phase: int) -> int:
+    """
+    Returns the packed score of a middlegame score, an endgame score and a game phase
+    """
+
+    return (phase << (2 * LANE_BITS)) + (middlegame << LANE_BITS) + endgame
+
+
+def unpack(packed: int) -> tuple[int, int, int]:
+    """
+    Returns the middlegame score, endgame score and game phase of a packed score
+    """
+
+    endgame = ((packed + LANE_HALF) & LANE_MASK) - LANE_HALF
+    packed = (packed - endgame) >> LANE_BITS
+    middlegame = ((packed + LANE_HALF) & LANE_MASK) - LANE_HALF
+
+    return middlegame, endgame, (packed - middlegame) >> LANE_BITS
+
+
+def _piece_score(color: int, kind: int, square: int) -> int:
+    """
+    Returns the packed score of a piece on square from white's point of view
+    """
+
+    if not color or not kind:
+        return 0
+
+    # The tables start at rank 8 as seen by white, mirrored for black so its back rank comes last
+    index = square if color == BLACK else ((7 - (square >> 3)) * 8) + (square & 7)
+    sign = 1 if color == WHITE else -1
+    middlegame_table, endgame_table = _TABLES[kind]
+
+    return pack(
+        sign * (MIDDLEGAME_VALUES[kind] + middlegame_table[index]),
+        sign * (ENDGAME_VALUES[kind] + endgame_table[index]),
+        PHASES[kind]
+    )
+
+
+# Indexed by color value, type value and square, the packed score of the piece
+# Scores of empty squares (color or type 0) are 0, so they do not change the sum
+PIECE_SCORES = [
+    [
+        [_piece_score(color, kind, square) for square in range(64)]
+        for kind in range(7)
+    ]
+    for color in range(3)
+]
+
+
+def compute_score(board: typing.Any) -> int:
+    """
+    Returns the packed score of all pieces on board computed from scratch
+
+    board has to be of type board.Board
+    """
+
+    return sum(
+        PIECE_SCORES[board.color[square]][board.board[square]][square]
+        for square in range(64)
+    )
+
+
+def evaluate(board: typing.Any) -> int:
+    """
+    Returns the score of the position in centipawns from the point of view of the side to move
+
+    board has to be of type board.Board
+    """
+
+    middlegame, endgame, phase = unpack(board.score)
+    phase = min(phase, MAX_PHASE)
+    score = ((middlegame * phase) + (endgame * (MAX_PHASE - phase))) // MAX_PHASE
+
+    return score if board.active_color.value == WHITE else -score
@@ -0,0 +1,225 @@
+"""
+Packs many boards into NumPy arrays and computes features for all of them at once,
+for building datasets out of large batches of positions
+
+The packed format is one uint8 per square, type | (color << 3), 64 per position,
+the same bytes Board.to_bytes starts with. Files of packed positions are raw bytes,
+so memory mapping them gives the array without copying and batches can be appended to them.
+
+Needs NumPy (pip install numpy), which the rest of Icarus does not use
+"""
+
+import os
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import bitboard
+import evaluation
+
+# Packed positions, shape (N, 64), and one-hot piece planes, shape (N, 12, 64)
+Packed = npt.NDArray[np.uint8]
+
+# Indexed by plane, the packed square of the piece it marks:
+# white pawn, king, queen, rook, bishop, knight, then the black pieces in the same order
+PLANE_CODES = np.array(
+    [kind | (color << 3) for color in (bitboard.WHITE, bitboard.BLACK) for kind in range(1, 7)],
+    dtype=np.uint8
+)
+
+# Indexed by packed square, the middlegame value of the piece from white's point of view
+MATERIAL = np.zeros(24, dtype=np.int32)
+
+# Indexed by packed square and square, the middlegame score, endgame score and phase share
+# of the piece (material and piece-square tables) from white's point of view, see evaluation
+MIDDLEGAME_SCORES = np.zeros((24, 64), dtype=np.int32)
+ENDGAME_SCORES = np.zeros((24, 64), dtype=np.int32)
+PHASES = np.zeros(24, dtype=np.int32)
+
+for _color in (bitboard.WHITE, bitboard.BLACK):
+    for _kind in range(1, 7):
+        _code = _kind | (_color << 3)
+        _sign = 1 if _color == bitboard.WHITE else -1
+
+        MATERIAL[_code] = _sign * evaluation.MIDDLEGAME_VALUES[_kind]
+        PHASES[_code] = evaluation.PHASES[_kind]
+
+        for _square in range(64):
+            _middlegame, _endgame, _ = evaluation.unpack(
+                evaluation.PIECE_SCORES[_color][_kind][_square]
+            )
+            MIDDLEGAME_SCORES[_code, _square] = _middlegame
+            ENDGAME_SCORES[_code, _square] = _endgame
+
+
+def _reach(kind: int, square: int) -> int:
+    """
+    Returns the bitboard of the squares a piece of kind (not a pawn) on square
+    attacks on an empty board
+    """
+
+    if kind == bitboard.KNIGHT:
+        return bitboard.KNIGHT_ATTACKS[square]
+    if kind == bitboard.KING:
+        return bitboard.KING_ATTACKS[square]
+
+    rays = []
+    if kind in (bitboard.BISHOP, bitboard.QUEEN):
+        rays += bitboard.DIAGONAL_RAYS
+    if kind in (bitboard.ROOK, bitboard.QUEEN):
+        rays += bitboard.STRAIGHT_RAYS
+
+    result = 0
+    for table, _ in rays:
+        result |= table[square]
+
+    return result
+
+
+# Indexed by piece.Type value - 2 (king, queen, rook, bishop, knight) and square, then by target
+# square: 1 if a piece of that type attacks the target square on an empty board
+# float32, so counting attacks is a single matrix product done by BLAS
+REACH = np.array(
+    [
+        [(_reach(_kind, _square) >> _target) & 1 for _target in range(64)]
+        for _kind in range(2, 7)
+        for _square in range(64)
+    ],
+    dtype=np.float32
+)
+
+
+def pack(boards: typing.Iterable[typing.Any]) -> Packed:
+    """
+    Returns the squares of boards as an (N, 64) array, type | (color << 3) per square
+
+    boards have to be of type board.Board
+    """
+
+    kinds = bytearray()
+    colors = bytearray()
+
+    for my_board in boards:
+        kinds += bytes(my_board.board)
+        colors += bytes(my_board.color)
+
+    packed = np.frombuffer(kinds, dtype=np.uint8).reshape(-1, 64)
+    packed |= np.frombuffer(colors, dtype=np.uint8).reshape(-1, 64) << 3
+
+    return packed
+
+
+def planes(packed: Packed) -> Packed:
+    """
+    Returns packed positions as an (N, 12, 64) array of one-hot piece planes in PLANE_CODES order
+    """
+
+    result: Packed = (
+        packed[:, np.newaxis, :] == PLANE_CODES[np.newaxis, :, np.newaxis]
+    ).astype(np.uint8)
+
+    return result
+
+
+def unplane(piece_planes: Packed) -> Packed:
+    """
+    Returns (N, 12, 64) piece planes as (N, 64) packed positions
+    """
+
+    return np.tensordot(piece_planes, PLANE_CODES, axes=([1], [0])).astype(np.uint8)
+
+
+def material(packed: Packed) -> npt.NDArray[np.int32]:
+    """
+    Returns the material balance of every position in centipawns from white's point of view
+    """
+
+    result: npt.NDArray[np.int32] = MATERIAL[packed].sum(axis=1, dtype=np.int32)
+
+    return result
+
+
+def piece_square(packed: Packed) -> npt.NDArray[np.int32]:
+    """
+    Returns an (N, 3) array of the middlegame score, endgame score (material and piece-square
+    tables from white's point of view) and game phase of every position
+    """
+
+    squares = np.arange(64)
+
+    return np.stack([
+        MIDDLEGAME_SCORES[packed, squares].sum(axis=1, dtype=np.int32),
+        ENDGAME_SCORES[packed, squares].sum(axis=1, dtype=np.int32),
+        PHASES[packed].sum(axis=1, dtype=np.int32),
+    ], axis=1)
+
+
+def evaluate(packed: Packed) -> npt.NDArray[np.int32]:
+    """
+    Returns the tapered score of every position from white's point of view,
+    evaluation.evaluate of the same board with the sign of white
+    """
+
+    middlegame, endgame, phase = piece_square(packed).T
+    phase = np.minimum(phase, evaluation.MAX_PHASE)
+
+    result: npt.NDArray[np.int32] = (
+        (middlegame * phase) + (endgame * (evaluation.MAX_PHASE - phase))
+    ) // evaluation.MAX_PHASE
+
+    return result
+
+
+def mobility(packed: Packed) -> npt.NDArray[np.int32]:
+    """
+    Returns an (N, 2) array with a mobility proxy of white and black in every position:
+    the number of (piece, square) pairs where a knight, bishop, rook, queen or king
+    attacks a square that is empty or holds an enemy piece, on an empty board,
+    so sliders are not stopped by pieces in between
+    """
+
+    colors = packed >> 3
+    result = np.zeros((len(packed), 2), dtype=np.int32)
+
+    for index, color in enumerate((bitboard.WHITE, bitboard.BLACK)):
+        codes = np.arange(2, 7, dtype=np.uint8) | np.uint8(color << 3)
+        pieces = packed[:, np.newaxis, :] == codes[np.newaxis, :, np.newaxis]
+
+        # Number of pieces attacking every square, then summed over the open squares
+        attacks = pieces.reshape(len(packed), -1).astype(np.float32) @ REACH
+        result[:, index] = np.einsum("ij,ij->i", attacks, colors != color, dtype=np.float32)
+
+    return result
+
+
+def append(path: str, packed: Packed) -> None:
+    """
+    Appends packed positions to a file of packed positions, creating it if needed
+    """
+
+    with open(path, "ab") as stream:
+        stream.write(np.ascontiguousarray(packed, dtype=np.uint8).data)
+
+
+def load(path: str) -> Packed:
+    """
+    Returns the packed positions of a file as a read-only (N, 64) array
+    memory mapped from the file, nothing is read before it is used
+    """
+
+    # Empty files cannot be memory mapped
+    if os.path.getsize(path) == 0:
+        return np.zeros((0, 64), dtype=np.uint8)
+
+    return np.memmap(path, dtype=np.uint8, mode="r").reshape(-1, 64)
+
+
+def batches(packed: Packed, size: int) -> typing.Iterator[Packed]:
+    """
+    Yields packed positions in batches of size positions,
+    views into packed, so batches of a memory mapped file are read as they are used
+    """
+
+    for start in range(0, len(packed), size):
+        yield packed[start:start + size]
@@ -0,0 +1,323 @@
+"""
+Lookup tables for reading and writing positions in Forsyth-Edwards Notation (FEN)
+
+Ranks are decoded once per distinct text and row and then served from a cache,
+so loading a position mostly glues eight cached ranks together.
+Board.load_fen and Board.board_to_fen build on this module
+"""
+
+import functools
+import operator
+import struct
+
+import evaluation
+import zobrist
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Indexed by FEN character, the piece.Type value and piece.Color value
+PIECES = {
+    "P": (1, 1), "K": (2, 1), "Q": (3, 1), "R": (4, 1), "B": (5, 1), "N": (6, 1),
+    "p": (1, 2), "k": (2, 2), "q": (3, 2), "r": (4, 2), "b": (5, 2), "n": (6, 2),
+}
+
+# piece.Type value of a pawn, pawns can never stand on the first or last row
+PAWN = 1
+
+# Indexed by piece.Type value | (piece.Color value << 3), the FEN character
+CHARS = [""] * 24
+for _char, (_kind, _color) in PIECES.items():
+    CHARS[_kind | (_color << 3)] = _char
+
+# Indexed by the side to move field, the piece.Color value
+SIDES = {"w": 1, "b": 2}
+
+# Indexed by piece.Color value, the side to move field
+SIDE_NAMES = ["-", "w", "b"]
+
+# Indexed by castling rights as 4 bits (white short, white long, black short, black long),
+# the castling field
+CASTLING_NAMES = [
+    "".join(char for bit, char in enumerate("KQkq") if rights >> bit & 1) or "-"
+    for rights in range(16)
+]
+
+# Indexed by castling field, the castling rights as 4 bits
+CASTLING = {name: rights for rights, name in enumerate(CASTLING_NAMES)}
+
+# Indexed by castling rights, the castle_info lists of white and black
+# (1 for every king or rook that lost the right to castle)
+# The lists are shared, boards replace their castle_info lists instead of changing them
+CASTLE_INFO = [
+    (
+        [int(not rights & 3), int(not rights & 2), int(not rights & 1)],
+        [int(not rights & 12), int(not rights & 8), int(not rights & 4)],
+    )
+    for rights in range(16)
+]
+
+# Indexed by the text of a halfmove clock or fullmove number, its value (at least 1 for
+# fullmove numbers), covers the clocks of nearly every game
+CLOCKS = {str(number): number for number in range(1000)}
+FULLMOVES = {**CLOCKS, "0": 1}
+
+SQUARE_NAMES = ["abcdefgh"[square & 7] + "12345678"[square >> 3] for square in range(64)]
+
+# Indexed by piece.Color value of the side to move, then by square name, the square
+# an opponent pawn skipped with a double push, the only squares that can be an en passant target:
+# the sixth row when white is to move and the third row when black is to move
+EN_PASSANT = [
+    {},
+    {SQUARE_NAMES[square]: square for square in range(40, 48)},
+    {SQUARE_NAMES[square]: square for square in range(16, 24)},
+]
+
+# The bitboards, the hash and the squares of a rank are packed into one int:
+# types first (Board.type_bb), then colors (Board.color_bb), 64 bits each, then the hash of
+# the pieces and then the piece types and the piece colors of the 64 squares, one byte each
+# The bitboards and squares of different ranks never share a bit, so the xor of all packed ranks
+# holds the bitboards, the hash and the squares of the whole position
+TYPE_SHIFTS = [64 * kind for kind in range(7)]
+COLOR_SHIFTS = [64 * (7 + color) for color in range(3)]
+HASH_SHIFT = 64 * 10
+KINDS_SHIFT = 64 * 11
+COLORS_SHIFT = KINDS_SHIFT + (8 * 64)
+
+PLACEMENT = struct.Struct("<11Q64s64s")
+
+# Splits the 64 squares into ranks
+RANKS = struct.Struct("8s" * 8)
+
+# Decoded or encoded ranks kept before a cache is emptied,
+# bounds the memory of long runs over many distinct positions
+CACHE_LIMIT = 1 << 16
+
+# A decoded rank: packed bitboards, hash and squares and the packed evaluation score of its pieces
+Rank = tuple[int, int]
+
+# A decoded side to move, castling and en passant field: side to move (piece.Color value),
+# castle_info lists of white and black, en passant target square (-1 if there is none)
+# and the hash key of all three
+State = tuple[int, list[int], list[int], int, int]
+
+# Indexed by type | (color << 3) of a square, its FEN character, "1" for an empty square
+_ENCODE = bytes(ord(CHARS[code] or "1") if code < len(CHARS) else ord("?") for code in range(256))
+
+# Runs of empty squares, longest first, and the digit replacing them
+_RUNS = [(b"1" * length, str(length).encode("ascii")) for length in range(8, 1, -1)]
+
+# Indexed by the FEN characters of the squares of a rank, the text of the rank
+_encoded: dict[bytes, str] = {}
+
+# Indexed by row, then by the text of the rank, the packed rank and its evaluation score
+# A rank is always in both caches or in neither
+_packed: list[dict[str, int]] = [{} for _ in range(8)]
+_scores: list[dict[str, int]] = [{} for _ in range(8)]
+
+# The same caches in the order of the ranks in a FEN
+_packed_in_fen_order = _packed[::-1]
+_scores_in_fen_order = _scores[::-1]
+
+
+def decode_rank(row: int, text: str) -> Rank:
+    """
+    Returns the packed bitboards, hash and squares and the evaluation score
+    of one rank of a FEN placement standing on row
+    Raises ValueError if text does not describe exactly 8 squares
+    or puts a pawn on the first or last row
+    """
+
+    cached = _packed[row].get(text)
+    if cached is not None:
+        return cached, _scores[row][text]
+
+    kinds = bytearray()
+    colors = bytearray()
+
+    for char in text:
+        if char in PIECES:
+            kinds.append(PIECES[char][0])
+            colors.append(PIECES[char][1])
+        elif "1" <= char <= "8":
+            kinds.extend(bytes(int(char)))
+            colors.extend(bytes(int(char)))
+        else:
+            raise ValueError(f"Invalid character {char!r} in FEN rank {text!r}")
+
+    if len(kinds) != 8:
+        raise ValueError(f"FEN rank {text!r} does not have 8 squares")
+
+    if row in (0, 7) and PAWN in kinds:
+        raise ValueError(f"FEN rank {text!r} has a pawn on row {row + 1}")
+
+    packed = int.from_bytes(kinds, "little") << (KINDS_SHIFT + (row * 64))
+    packed |= int.from_bytes(colors, "little") << (COLORS_SHIFT + (row * 64))
+    score = 0
+
+    for file in range(8):
+        square = (row * 8) + file
+        packed |= 1 << (TYPE_SHIFTS[kinds[file]] + square)
+        packed |= 1 << (COLOR_SHIFTS[colors[file]] + square)
+        packed ^= zobrist.PIECE_KEYS[colors[file]][kinds[file]][square] << HASH_SHIFT
+        score += evaluation.PIECE_SCORES[colors[file]][kinds[file]][square]
+
+    if len(_packed[row]) >= CACHE_LIMIT:
+        _packed[row].clear()
+        _scores[row].clear()
+
+    _packed[row][text] = packed
+    _scores[row][text] = score
+
+    return packed, score
+
+
+def decode_placement(text: str) -> tuple[bytes, bytes, list[int], list[int], int, int]:
+    """
+    Returns the piece types and piece colors (one byte per square), the type and color bitboards,
+    the hash and the packed evaluation score of the piece placement field of a FEN
+    Raises ValueError if text does not describe 8 ranks of 8 squares
+    or puts a pawn on the first or last row
+    """
+
+    ranks = text.split("/")
+
+    if len(ranks) != 8:
+        raise ValueError(f"FEN placement {text!r} does not have 8 ranks")
+
+    try:
+        packed = functools.reduce(operator.xor, map(dict.__getitem__, _packed_in_fen_order, ranks))
+        score = sum(map(dict.__getitem__, _scores_in_fen_order, ranks))
+    except KeyError:
+        decoded = [decode_rank(7 - index, rank) for index, rank in enumerate(ranks)]
+        packed = functools.reduce(operator.xor, [rank[0] for rank in decoded])
+        score = sum(rank[1] for rank in decoded)
+
+    *lanes, kinds, colors = PLACEMENT.unpack(packed.to_bytes(PLACEMENT.size, "little"))
+
+    return kinds, colors, lanes[:7], lanes[7:10], lanes[10], score
+
+
+def parse_castling(text: str) -> int:
+    """
+    Returns the castling rights of a castling field as 4 bits,
+    the letters may come in any order
+    Raises ValueError if text is not a castling field
+    """
+
+    rights = CASTLING.get(text)
+    if rights is not None:
+        return rights
+
+    rights = 0
+
+    for char in text:
+        bit = "KQkq".find(char)
+
+        if bit == -1 or rights >> bit & 1:
+            raise ValueError(f"Invalid castling rights {text!r}")
+
+        rights |= 1 << bit
+
+    return rights
+
+
+def _state(side: int, rights: int, en_passant: int) -> State:
+    """
+    Returns the decoded state of the given side to move, castling rights and en passant square
+    """
+
+    key = zobrist.SIDE_KEYS[side] ^ zobrist.CASTLE_KEYS[rights]
+    if en_passant != -1:
+        key ^= zobrist.EN_PASSANT_KEYS[en_passant & 7]
+
+    return side, *CASTLE_INFO[rights], en_passant, key
+
+
+# Indexed by side to move, castling and en passant field, the decoded state
+_STATES = {
+    side_name: {
+        castling: {
+            en_passant_name: _state(side, rights, en_passant)
+            for en_passant_name, en_passant in [("-", -1), *EN_PASSANT[side].items()]
+        }
+        for castling, rights in CASTLING.items()
+    }
+    for side_name, side in SIDES.items()
+}
+
+
+def decode_state(side: str, castling: str, en_passant: str) -> State:
+    """
+    Returns the side to move (piece.Color value), the castle_info lists of white and black,
+    the en passant target square (-1 if there is none) and the hash key of these fields of a FEN
+    Raises ValueError if a field is malformed or the en passant target is not behind
+    a pawn of the side that just moved
+    """
+
+    try:
+        return _STATES[side][castling][en_passant]
+    except KeyError:
+        pass
+
+    if side not in SIDES:
+        raise ValueError(f"Invalid side to move {side!r}")
+    if en_passant != "-" and en_passant not in EN_PASSANT[SIDES[side]]:
+        raise ValueError(f"Invalid en passant target {en_passant!r} with {side!r} to move")
+
+    # Castling rights in an unusual order
+    return _STATES[side][CASTLING_NAMES[parse_castling(castling)]][en_passant]
+
+
+def decode_clocks(fields: list[str]) -> tuple[int, int]:
+    """
+    Returns the halfmove clock and fullmove number of the fields after the en passant field,
+    0 and 1 if they are missing (EPD operations take their place in EPD)
+    """
+
+    try:
+        return CLOCKS[fields[0]], FULLMOVES[fields[1]]
+    except (KeyError, IndexError):
+        pass
+
+    halfmove = int(fields[0]) if fields and fields[0].isdigit() else 0
+    fullmove = int(fields[1]) if len(fields) > 1 and fields[1].isdigit() else 1
+
+    return halfmove, max(1, fullmove)
+
+
+def encode_rank(squares: bytes) -> str:
+    """
+    Returns the FEN text of one rank given by the FEN characters of its squares,
+    "1" for an empty square
+    """
+
+    cached = _encoded.get(squares)
+    if cached is not None:
+        return cached
+
+    text = squares
+    for run, digit in _RUNS:
+        text = text.replace(run, digit)
+
+    if len(_encoded) >= CACHE_LIMIT:
+        _encoded.clear()
+
+    _encoded[squares] = text.decode("ascii")
+
+    return _encoded[squares]
+
+
+def encode_placement(kinds: bytes, colors: bytes) -> str:
+    """
+    Returns the piece placement field of a FEN for the given piece types and colors
+    (64 bytes each, indexed by square)
+    """
+
+    # One byte per square holding type | (color << 3), colors never carry into the next square
+    codes = int.from_bytes(kinds, "little") | int.from_bytes(colors, "little") << 3
+    ranks = RANKS.unpack(codes.to_bytes(64, "little").translate(_ENCODE))[::-1]
+
+    try:
+        return "/".join(map(_encoded.__getitem__, ranks))
+    except KeyError:
+        return "/".join([encode_rank(rank) for rank in ranks])
@@ -0,0 +1,160 @@
+"""
+Measures how fast positions are loaded from and written to FEN
+
+Usage:
+    python fen_benchmark.py                     check both directions against the minimum rate
+    python fen_benchmark.py --positions 10000   use more distinct positions
+    python fen_benchmark.py --file pos.epd      use the positions of a FEN / EPD file
+    ICARUS_FEN_MIN_RATE=150000 python fen_benchmark.py   require another rate on a slower host
+
+Every position is loaded and written back once first, the check fails if that
+does not give the same FEN or the loaded hash differs from one computed from scratch.
+The rates are the best of several rounds over all positions
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import board
+import fen
+
+# FENs per second that loading and writing each have to reach
+DEFAULT_MIN_RATE = 200_000
+
+# Environment variable that replaces the default minimum rate, for slower hosts
+ENV_VARIABLE = "ICARUS_FEN_MIN_RATE"
+
+# Seed of the random games the positions are taken from, so every run uses the same positions
+SEED = 15
+
+
+def random_positions(count: int) -> list[str]:
+    """
+    Returns count FENs of positions from random games, with castling, en passant and clocks
+    """
+
+    rng = random.Random(SEED)
+    my_board = board.Board()
+    result: list[str] = []
+
+    while len(result) < count:
+        my_board.load_fen(fen.START_FEN)
+
+        for _ in range(rng.randrange(1, 120)):
+            moves = my_board.legal_moves(my_board.active_color)
+            if not moves:
+                break
+
+            my_board.make_move(rng.choice(moves))
+            result.append(my_board.board_to_fen())
+
+    return result[:count]
+
+
+def check(fens: list[str], exact: bool) -> tuple[list[str], list[str]]:
+    """
+    Returns the FENs that can be loaded and a description of every FEN
+    that cannot be loaded or loads with a wrong hash,
+    with exact also of every FEN that is not written back as it was read
+    """
+
+    my_board = board.Board()
+    valid = []
+    failures = []
+
+    for text in fens:
+        try:
+            my_board.load_fen(text)
+        except ValueError as error:
+            failures.append(f"{text} cannot be loaded: {error}")
+            continue
+
+        valid.append(text)
+
+        if exact and my_board.board_to_fen() != text:
+            failures.append(f"{text} written as {my_board.board_to_fen()}")
+        elif my_board.hash != my_board.compute_hash():
+            failures.append(f"{text} loaded with a wrong hash")
+
+    return valid, failures
+
+
+def rates(fens: list[str], rounds: int) -> tuple[float, float]:
+    """
+    Returns the best rates of loading and writing fens in FENs per second
+    """
+
+    my_board = board.Board()
+    boards = []
+
+    for text in fens:
+        boards.append(board.Board())
+        boards[-1].load_fen(text)
+
+    load_seconds = write_seconds = float("inf")
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for text in fens:
+            my_board.load_fen(text)
+        load_seconds = min(load_seconds, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for loaded in boards:
+            loaded.board_to_fen()
+        write_seconds = min(write_seconds, time.perf_counter() - start)
+
+    return len(fens) / load_seconds, len(fens) / write_seconds
+
+
+def main() -> int:
+    """
+    Entry point of the FEN benchmark
+    """
+
+    parser = argparse.ArgumentParser(description="Measure FEN loading and writing")
+    parser.add_argument("--positions", type=int, default=5000,
+                        help="number of distinct positions from random games (default 5000)")
+    parser.add_argument("--file", help="read the positions from this FEN / EPD file instead")
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="rounds over all positions (default 5)")
+    parser.add_argument("--min-rate", type=float,
+                        default=float(os.environ.get(ENV_VARIABLE, DEFAULT_MIN_RATE)),
+                        help=f"FENs per second each direction needs (default {ENV_VARIABLE} "
+                             f"or {DEFAULT_MIN_RATE})")
+    args = parser.parse_args()
+
+    if args.file is not None:
+        with open(args.file, encoding="utf-8") as stream:
+            fens = [line.strip() for line in stream if line.strip()]
+    else:
+        fens = random_positions(args.positions)
+
+    # Positions read from a file may be EPD or have unusual castling fields,
+    # so they are only checked for loading with the right hash
+    fens, failures = check(fens, args.file is None)
+    load_rate, write_rate = rates(fens, max(1, args.rounds))
+
+    print(f"positions {len(fens)}  failed {len(failures)}")
+    print(f"load  {load_rate:>10.0f} FENs/s")
+    print(f"write {write_rate:>10.0f} FENs/s  minimum {args.min_rate:.0f} FENs/s")
+
+    for failure in failures[:10]:
+        print(f"FAILED, {failure}")
+
+    if min(load_rate, write_rate) < args.min_rate:
+        print("FAILED, below the minimum rate")
+
+    if failures or min(load_rate, write_rate) < args.min_rate:
+        return 1
+
+    print("ok")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Measures the cold import time of the headless rules engine
+
+Usage:
+    python import_time.py                 check the engine modules against the budget
+    python import_time.py --budget 0.2    use another budget in seconds
+    python import_time.py --runs 10       import in 10 fresh interpreters
+
+Every run imports the modules in a new interpreter, so nothing is cached in sys.modules.
+The check fails if the median run takes longer than the budget
+or if a GUI module (tkinter, PIL, ui, ui_config, sprites) was imported along the way
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules a server or script uses to play and analyse games without a display
+ENGINE_MODULES = [
+    "board",
+    "piece",
+    "position",
+    "bitboard",
+    "move_encoding",
+    "zobrist",
+    "fen",
+    "evaluation",
+    "book",
+    "tablebase",
+    "instrumentation",
+    "board_config",
+    "search",
+]
+
+# Modules that need a display stack and must never be imported by the engine
+GUI_MODULES = ["tkinter", "PIL", "ui", "ui_config", "sprites"]
+
+# Median cold import time of ENGINE_MODULES in seconds
+DEFAULT_BUDGET = 0.1
+
+# Runs in the fresh interpreter, prints the import time and the GUI modules it loaded
+_MEASURE = f"""
+import sys
+import time
+start = time.perf_counter()
+import {", ".join(ENGINE_MODULES)}
+seconds = time.perf_counter() - start
+print(seconds)
+print(",".join(name for name in {GUI_MODULES!r} if name in sys.modules))
+"""
+
+
+def measure() -> tuple[float, list[str]]:
+    """
+    Imports ENGINE_MODULES in a new interpreter
+    Returns the time it took in seconds and the GUI modules that were imported
+    """
+
+    output = subprocess.run(
+        [sys.executable, "-c", _MEASURE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        check=True,
+        text=True
+    ).stdout.splitlines()
+
+    return float(output[0]), [name for name in output[1].split(",") if name]
+
+
+def main() -> int:
+    """
+    Entry point of the import time check
+    """
+
+    parser = argparse.ArgumentParser(description="Check the cold import time of the Icarus engine")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help=f"allowed median import time in seconds (default {DEFAULT_BUDGET})")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="number of fresh interpreters (default 5)")
+    args = parser.parse_args()
+
+    times = []
+    gui_modules: set[str] = set()
+
+    for _ in range(max(1, args.runs)):
+        seconds, imported = measure()
+        times.append(seconds)
+        gui_modules.update(imported)
+
+    median = statistics.median(times)
+    print(f"import {', '.join(ENGINE_MODULES)}")
+    print(f"median {median * 1000:.1f}ms  min {min(times) * 1000:.1f}ms  "
+          f"max {max(times) * 1000:.1f}ms  budget {args.budget * 1000:.1f}ms")
+
+    passed = True
+
+    if gui_modules:
+        print(f"FAILED, the engine imported {', '.join(sorted(gui_modules))}")
+        passed = False
+
+    if median > args.budget:
+        print("FAILED, over budget")
+        passed = False
+
+    if passed:
+        print("ok")
+
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""
+Opt-in profiling of the move generator: call counts, time and allocations per hooked function
+
+Functions are hooked with the hook decorator. While profiling is off it returns them unchanged,
+so hooked code runs exactly as fast as without the decorator.
+Profiling is switched on by the environment variable ICARUS_PROFILE before the engine is imported,
+its value is the file the profile is written to when the process exits:
+
+    ICARUS_PROFILE=run.json python perft.py               JSON, see snapshot
+    ICARUS_PROFILE=run.folded python perft.py             collapsed stacks for flamegraph tools
+    ICARUS_PROFILE=run.json ICARUS_PROFILE_ALLOCATIONS=1 python perft.py
+
+or from code with enable and disable, which swap the hooked functions for timed ones and back.
+profile_report.py prints a profile or compares two
+"""
+
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+import typing
+
+# json and tracemalloc are imported where they are used, so importing the engine stays fast
+
+ENV_VARIABLE = "ICARUS_PROFILE"
+ALLOCATIONS_VARIABLE = "ICARUS_PROFILE_ALLOCATIONS"
+
+# Indexed by counter name, the hooked function and the caller whose calls to it are counted
+# (the simulate path plays every candidate move on the board to see if it leaves the king in check)
+COUNTERS = {
+    "simulated_boards": ("board.Board.make_move", "piece.get_valid_moves"),
+}
+
+# Caller name of calls from code that is not hooked
+ROOT = "<root>"
+
+Function = typing.TypeVar("Function", bound=typing.Callable[..., typing.Any])
+
+
+class Profile():
+    """
+    Totals of all hooked functions since the last reset
+    """
+
+    def __init__(self) -> None:
+        # Indexed by function name: calls, seconds and net traced allocated_bytes including
+        # the hooked functions it calls, self_seconds without them and callers, the calls per caller
+        self.functions: dict[str, dict[str, typing.Any]] = {}
+
+        # Indexed by stack of hooked function names joined by ";", the time spent in its last one
+        self.stacks: dict[str, float] = {}
+
+        self.enabled = False
+        self.allocations = False
+        self.local = threading.local()
+
+    def reset(self) -> None:
+        """
+        Forgets all totals
+        """
+
+        self.functions.clear()
+        self.stacks.clear()
+
+    def call(self,
+             name: str,
+             function: typing.Callable[..., typing.Any],
+             args: tuple[typing.Any, ...],
+             kwargs: dict[str, typing.Any]) -> typing.Any:
+        """
+        Calls function and adds the call to the totals of name
+        """
+
+        # Per thread: stack of the hooked functions running and the time of their hooked callees
+        if not hasattr(self.local, "stack"):
+            self.local.stack = [ROOT]
+            self.local.children = [0.0]
+
+        stack: list[str] = self.local.stack
+        children: list[float] = self.local.children
+        caller = stack[-1].rsplit(";", 1)[-1]
+        path = name if caller == ROOT else f"{stack[-1]};{name}"
+
+        stack.append(path)
+        children.append(0.0)
+        memory = _traced_memory() if self.allocations else 0
+        start = time.perf_counter()
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            own = seconds - children.pop()
+            children[-1] += seconds
+
+            stats = self.functions.get(name)
+            if stats is None:
+                stats = self.functions[name] = {
+                    "calls": 0, "seconds": 0.0, "self_seconds": 0.0, "allocated_bytes": 0,
+                    "callers": {}
+                }
+
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["self_seconds"] += own
+            stats["callers"][caller] = stats["callers"].get(caller, 0) + 1
+            self.stacks[path] = self.stacks.get(path, 0.0) + own
+
+            if self.allocations:
+                stats["allocated_bytes"] += _traced_memory() - memory
+
+
+def _traced_memory() -> int:
+    """
+    Returns the bytes allocated while tracemalloc traces allocations
+    """
+
+    import tracemalloc  # pylint: disable=import-outside-toplevel
+
+    current: int = tracemalloc.get_traced_memory()[0]
+
+    return current
+
+
+PROFILE = Profile()
+
+# Indexed by name, the hooked functions as they were defined
+_HOOKED: dict[str, typing.Callable[..., typing.Any]] = {}
+
+
+def _name(function: typing.Callable[..., typing.Any]) -> str:
+    """
+    Returns the name of a function in the profile, e.g. "board.Board.make_move"
+    """
+
+    return f"{function.__module__}.{function.__qualname__}"
+
+
+def _timed(function: Function) -> Function:
+    """
+    Returns function wrapped to add its calls to PROFILE
+    """
+
+    name = _name(function)
+
+    @functools.wraps(function)
+    def timed(*args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        return PROFILE.call(name, function, args, kwargs)
+
+    return typing.cast(Function, timed)
+
+
+def hook(function: Function) -> Function:
+    """
+    Decorator registering function for profiling, returns function itself while profiling is off
+    """
+
+    _HOOKED[_name(function)] = function
+
+    return _timed(function) if PROFILE.enabled else function
+
+
+def _replace(name: str, function: typing.Callable[..., typing.Any]) -> None:
+    """
+    Puts function in the place of the hooked function name in its module or class
+    """
+
+    module = sys.modules.get(name.split(".", 1)[0])
+    if module is None:
+        return
+
+    owner: typing.Any = module
+    path = name.split(".")[1:]
+
+    for part in path[:-1]:
+        owner = getattr(owner, part, None)
+        if owner is None:
+            return
+
+    setattr(owner, path[-1], function)
+
+
+def enable(allocations: bool = False) -> None:
+    """
+    Starts profiling the hooked functions, the totals so far are kept
+    With allocations, the bytes still allocated when a call returns are added up too
+    (with tracemalloc, which makes calls a lot slower)
+    """
+
+    import tracemalloc  # pylint: disable=import-outside-toplevel
+
+    PROFILE.allocations = allocations
+    if allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    if not PROFILE.enabled:
+        PROFILE.enabled = True
+
+        for name, function in _HOOKED.items():
+            _replace(name, _timed(function))
+
+
+def disable() -> None:
+    """
+    Stops profiling, the hooked functions run unchanged again
+    """
+
+    if PROFILE.enabled:
+        PROFILE.enabled = False
+
+        for name, function in _HOOKED.items():
+            _replace(name, function)
+
+    import tracemalloc  # pylint: disable=import-outside-toplevel
+
+    if PROFILE.allocations and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    PROFILE.allocations = False
+
+
+def is_enabled() -> bool:
+    """
+    Returns true while the hooked functions are profiled
+    """
+
+    return PROFILE.enabled
+
+
+def reset() -> None:
+    """
+    Forgets all totals
+    """
+
+    PROFILE.reset()
+
+
+def snapshot() -> dict[str, typing.Any]:
+    """
+    Returns the totals as a JSON object:
+    functions by name with calls, seconds, self_seconds, allocated_bytes and calls per caller,
+    the COUNTERS and the time per stack of hooked functions
+    """
+
+    functions = {
+        name: {**stats, "callers": dict(stats["callers"])}
+        for name, stats in PROFILE.functions.items()
+    }
+    counters = {
+        counter: functions.get(name, {}).get("callers", {}).get(caller, 0)
+        for counter, (name, caller) in COUNTERS.items()
+    }
+
+    return {
+        "allocations": PROFILE.allocations,
+        "functions": functions,
+        "counters": counters,
+        "stacks": dict(PROFILE.stacks),
+    }
+
+
+def write_json(path: str) -> None:
+    """
+    Writes snapshot to path
+    """
+
+    import json  # pylint: disable=import-outside-toplevel
+
+    with open(path, "w", encoding="utf-8") as stream:
+        json.dump(snapshot(), stream, indent=1, sort_keys=True)
+
+
+def write_collapsed(path: str) -> None:
+    """
+    Writes the time per stack to path in microseconds, one "a;b;c 1234" line per stack,
+    the collapsed format flamegraph.pl, speedscope and inferno read
+    """
+
+    with open(path, "w", encoding="utf-8") as stream:
+        for stack, seconds in sorted(PROFILE.stacks.items()):
+            stream.write(f"{stack} {round(seconds * 1e6)}\n")
+
+
+def write(path: str) -> None:
+    """
+    Writes the profile to path, as JSON if it ends in .json and as collapsed stacks otherwise
+    """
+
+    if path.lower().endswith(".json"):
+        write_json(path)
+    else:
+        write_collapsed(path)
+
+
+def _write_at_exit(path: str) -> None:
+    """
+    Writes the profile to path when the process exits, reports errors on stderr
+    """
+
+    try:
+        write(path)
+    except OSError as error:
+        print(f"instrumentation: cannot write {path}: {error}", file=sys.stderr)
+
+
+if os.environ.get(ENV_VARIABLE):
+    enable(allocations=os.environ.get(ALLOCATIONS_VARIABLE, "") not in ("", "0"))
+    atexit.register(_write_at_exit, os.environ[ENV_VARIABLE])
@@ -0,0 +1,167 @@
+"""
+Load generator for the game session server
+
+Usage:
+    python load_test.py                          start a server and drive it
+    python load_test.py --port 8765              drive a server that is already running
+    python load_test.py --clients 50 --games 100 --moves 500
+
+Every client opens its own connection and games, then plays random legal moves
+round robin over its games, starting a new game whenever one ends.
+Reports the move throughput, the move round trip latency seen by the clients
+and the latency and memory per game reported by the server
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import typing
+
+import server
+
+# Games are restarted after this many plies, so a run never gets stuck in long endgames
+MAX_PLIES = 200
+
+
+async def request(reader: asyncio.StreamReader,
+                  writer: asyncio.StreamWriter,
+                  **fields: typing.Any) -> server.Response:
+    """
+    Sends a request and waits for its response
+    Raises RuntimeError if the server answered with an error
+    """
+
+    writer.write(json.dumps(fields).encode() + b"\n")
+    await writer.drain()
+    response: server.Response = json.loads(await reader.readline())
+
+    if "error" in response:
+        raise RuntimeError(f"{fields} failed: {response['error']}")
+
+    return response
+
+
+async def run_client(host: str, port: int, options: argparse.Namespace, seed: int) -> list[float]:
+    """
+    Plays options.moves moves spread over options.games games
+    Returns the round trip time of every move in seconds
+    """
+
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+    rng = random.Random(seed)
+    latencies = []
+
+    games = [(await request(reader, writer, cmd="new"))["game"] for _ in range(options.games)]
+    plies = [0] * len(games)
+
+    for index in range(options.moves):
+        slot = index % len(games)
+        moves = (await request(reader, writer, cmd="moves", game=games[slot]))["moves"]
+
+        start = time.perf_counter()
+        response = await request(reader, writer, cmd="move", game=games[slot],
+                                 move=rng.choice(moves))
+        latencies.append(time.perf_counter() - start)
+
+        plies[slot] += 1
+
+        if response["result"] != "*" or plies[slot] >= MAX_PLIES:
+            await request(reader, writer, cmd="close", game=games[slot])
+            games[slot] = (await request(reader, writer, cmd="new"))["game"]
+            plies[slot] = 0
+
+    writer.close()
+
+    return latencies
+
+
+async def start_server() -> tuple["asyncio.subprocess.Process", int]:
+    """
+    Starts server.py on a free port
+    Returns the process and the port it listens on
+    """
+
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py"),
+        "--port", "0",
+        stdout=asyncio.subprocess.PIPE
+    )
+
+    assert process.stdout is not None
+    line = (await process.stdout.readline()).decode().split()
+
+    if len(line) != 3 or line[0] != "listening":
+        process.kill()
+        raise RuntimeError("The server did not start")
+
+    return process, int(line[2])
+
+
+async def run(options: argparse.Namespace) -> None:
+    """
+    Drives the server with options.clients clients and prints the report
+    """
+
+    process = None
+    port = options.port
+
+    if port == 0:
+        process, port = await start_server()
+
+    try:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            run_client(options.host, port, options, options.seed + client)
+            for client in range(options.clients)
+        ))
+        seconds = time.perf_counter() - start
+
+        reader, writer = await asyncio.open_connection(options.host, port)
+        stats = await request(reader, writer, cmd="stats")
+        writer.close()
+    finally:
+        if process is not None:
+            process.terminate()
+            await process.wait()
+
+    latencies = [latency for result in results for latency in result]
+
+    print(f"clients {options.clients}  games {options.clients * options.games}  "
+          f"moves {len(latencies)}  time {seconds:.3f}s  {len(latencies) / seconds:.0f} moves/s")
+    print(f"round trip  p50 {server.percentile(latencies, 0.5) * 1000:.3f}ms  "
+          f"p99 {server.percentile(latencies, 0.99) * 1000:.3f}ms")
+    print(f"server      p50 {stats['move_p50_ms']:.3f}ms  p99 {stats['move_p99_ms']:.3f}ms  "
+          f"open games {stats['games']}  memory per game {stats['memory_per_game']} bytes")
+
+
+def main() -> int:
+    """
+    Entry point of the load generator
+    """
+
+    parser = argparse.ArgumentParser(description="Drive the Icarus session server")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address of the server (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=0,
+                        help="port of a running server, 0 starts one (default 0)")
+    parser.add_argument("--clients", type=int, default=20,
+                        help="concurrent connections (default 20)")
+    parser.add_argument("--games", type=int, default=50,
+                        help="open games per client (default 50)")
+    parser.add_argument("--moves", type=int, default=200, help="moves per client (default 200)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the random moves (default 0)")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
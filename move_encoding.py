@@ -0,0 +1,169 @@
+"""
+Moves packed into 16 bit integers
+
+bits 0-5:   the square the piece moves from, (row * 8) + file
+bits 6-11:  the square the piece moves to
+bits 12-15: flags, see below
+
+Lists of moves are kept in array("H") so a move costs two bytes
+"""
+
+import re
+import typing
+
+import piece
+import position
+
+# A packed move
+Move = int
+
+QUIET = 0
+DOUBLE_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EN_PASSANT = 5
+
+# Promotions use flags 8 to 11, or 12 to 15 if they also capture a piece,
+# the lowest two bits select the piece
+# (piece.Type values of knight, bishop, rook and queen, written out because piece imports
+# this module, so piece.Type may not exist yet while this module is loaded)
+PROMOTION = 8
+PROMOTION_TYPES = [6, 5, 4, 3]
+
+# Indexed by piece.Type value, the two bits selecting a promotion piece
+PROMOTION_BITS = [0, 0, 0, 3, 2, 1, 0]
+
+
+def encode(start: int, target: int, move_flags: int = QUIET) -> Move:
+    """
+    Returns the packed move from start to target with move_flags
+    """
+
+    return start | (target << 6) | (move_flags << 12)
+
+
+def start_square(move: Move) -> int:
+    """
+    Returns the square the piece moves from
+    """
+
+    return move & 63
+
+
+def target_square(move: Move) -> int:
+    """
+    Returns the square the piece moves to
+    """
+
+    return (move >> 6) & 63
+
+
+def flags(move: Move) -> int:
+    """
+    Returns the flags of move
+    """
+
+    return move >> 12
+
+
+def promotion(move: Move) -> int:
+    """
+    Returns the piece.Type value move promotes to, 0 if it is no promotion
+    """
+
+    if not move & 0x8000:
+        return 0
+
+    return PROMOTION_TYPES[(move >> 12) & 3]
+
+
+def is_capture(move: Move) -> bool:
+    """
+    Returns true if move takes a piece, en passant included
+    """
+
+    return bool(move & 0x4000)
+
+
+def from_positions(board: typing.Any,
+                   old_position: list[int],
+                   new_position: list[int],
+                   promotion_type: int = PROMOTION_TYPES[3]) -> Move:
+    """
+    Returns the packed move of the piece at old_position to new_position ([row, file] each)
+    The flags are taken from the position on board,
+    a pawn reaching the last row promotes to promotion_type
+
+    board has to be of type board.Board
+    """
+
+    start = (old_position[0] * 8) + old_position[1]
+    target = (new_position[0] * 8) + new_position[1]
+    kind = board.board[start]
+    move_flags = CAPTURE if board.board[target] else QUIET
+
+    if kind == piece.Type.PAWN.value:
+        if abs(start - target) == 16:
+            move_flags = DOUBLE_PUSH
+        elif (start - target) & 7 and not board.board[target]:
+            move_flags = EN_PASSANT
+        elif new_position[0] in [0, 7]:
+            move_flags |= PROMOTION | PROMOTION_BITS[promotion_type]
+
+    if kind == piece.Type.KING.value and abs(start - target) == 2:
+        move_flags = KING_CASTLE if target > start else QUEEN_CASTLE
+
+    return encode(start, target, move_flags)
+
+
+def from_name(board: typing.Any, text: str) -> Move:
+    """
+    Returns the packed move written in coordinate notation, e.g. "e2e4" or "e7e8q",
+    with the flags taken from the position on board
+    Raises ValueError if text is not written like a move, the move is not checked for legality
+
+    board has to be of type board.Board
+    """
+
+    if not re.fullmatch("[a-h][1-8][a-h][1-8][qrbn]?", text):
+        raise ValueError(f"Invalid move {text!r}")
+
+    promotion_type = piece.Type.QUEEN.value
+    if len(text) == 5:
+        promotion_type = piece.char_to_piece(text[4])[0].value
+
+    return from_positions(
+        board,
+        position.from_name(text[:2]),
+        position.from_name(text[2:4]),
+        promotion_type
+    )
+
+
+def to_positions(moves: typing.Iterable[Move]) -> list[list[int]]:
+    """
+    Converts moves to the [ [row,file], ... ] form used by piece.get_valid_moves
+    Promotions collapse into a single target square
+    """
+
+    return [
+        [(move >> 9) & 7, (move >> 6) & 7]
+        for move in moves
+        if not move & 0x8000 or promotion(move) == piece.Type.QUEEN.value
+    ]
+
+
+def name(move: Move) -> str:
+    """
+    Returns move in coordinate notation, e.g. "e2e4" or "e7e8q"
+    """
+
+    start = start_square(move)
+    target = target_square(move)
+    result = position.to_name([start >> 3, start & 7]) + position.to_name([target >> 3, target & 7])
+
+    if promotion(move):
+        result += piece.piece_to_char(piece.Type(promotion(move)), piece.Color.BLACK)
+
+    return result
@@ -0,0 +1,260 @@
+"""
+Headless perft runner to verify and time the move generator
+
+Usage:
+    python perft.py                       run the reference suite
+    python perft.py --position kiwipete   run a single reference position
+    python perft.py --fen FEN --depth 4   count nodes of any position
+    python perft.py --fen FEN --depth 4 --divide
+    python perft.py --workers 8 --compare run in 8 processes and compare with one
+"""
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+import bitboard
+import board
+import move_encoding
+
+# name, FEN, depth, known node count
+REFERENCE_POSITIONS = [
+    ("startpos", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", 4, 197281),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 3, 97862),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 5, 674624),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 4, 422333),
+    ("position4-mirrored",
+     "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1", 4, 422333),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 3, 62379),
+    ("position6",
+     "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", 3, 89890),
+    ("illegal-ep-move", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", 6, 1134888),
+    ("ep-capture-checks", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", 6, 1440467),
+    ("short-castle-checks", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", 6, 661072),
+    ("long-castle-checks", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", 6, 803711),
+    ("castle-rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", 4, 1274206),
+    ("castling-prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", 4, 1720476),
+    ("promote-out-of-check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", 6, 3821001),
+    ("discovered-check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", 5, 1004658),
+    ("promote-to-give-check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", 6, 217342),
+    ("underpromote-to-check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", 6, 92683),
+    ("self-stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", 6, 2217),
+    ("stalemate-checkmate", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1", 7, 567584),
+    ("double-check", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", 4, 23527),
+]
+
+
+def run_perft(my_board: board.Board, depth: int, options: argparse.Namespace) -> tuple[int, float]:
+    """
+    Runs perft on my_board, in options.workers processes if that is more than one
+    Prints the nodes of every worker and the speedup if options.compare is set
+    Returns the node count and the time it took in seconds
+    """
+
+    start = time.perf_counter()
+
+    if options.workers <= 1:
+        return my_board.perft(depth), time.perf_counter() - start
+
+    nodes, worker_counts = parallel_perft(my_board, depth, options.workers, options.split_depth)
+    seconds = time.perf_counter() - start
+
+    for worker, count in sorted(worker_counts.items()):
+        print(f"    worker {worker}: {count} nodes")
+
+    if options.compare:
+        serial_start = time.perf_counter()
+        my_board.perft(depth)
+        serial_seconds = time.perf_counter() - serial_start
+        print(f"    serial {serial_seconds:.3f}s, speedup {serial_seconds / seconds:.2f}x")
+
+    return nodes, seconds
+
+
+def _perft_task(data: bytes, depth: int) -> tuple[int, int]:
+    """
+    Runs in a worker process, counts the nodes below a position created by Board.to_bytes
+    Returns the process id of the worker and the node count
+    """
+
+    my_board = board.Board()
+    my_board.load_bytes(data)
+
+    return os.getpid(), my_board.perft(depth)
+
+
+def split_positions(my_board: board.Board,
+                    split_depth: int) -> list[tuple[move_encoding.Move, bytes]]:
+    """
+    Returns every position split_depth plies below my_board in serialized form,
+    together with the root move leading to it
+    """
+
+    result = []
+
+    for move in bitboard.generate_moves(my_board, my_board.active_color.value, True):
+        undo = my_board.make_move(move)
+
+        if split_depth <= 1:
+            result.append((move, my_board.to_bytes()))
+        else:
+            result.extend((move, data) for _, data in split_positions(my_board, split_depth - 1))
+
+        my_board.unmake_move(undo)
+
+    return result
+
+
+def parallel_divide(
+    my_board: board.Board,
+    depth: int,
+    workers: int,
+    split_depth: int = 1
+) -> tuple[list[tuple[move_encoding.Move, int]], dict[int, int]]:
+    """
+    Same as Board.divide, but the positions split_depth plies deep
+    are counted in a pool of worker processes
+    Also returns the node count of every worker, keyed by its process id
+    """
+
+    split_depth = max(1, min(split_depth, depth - 1))
+    root_counts: dict[move_encoding.Move, int] = {}
+    worker_counts: dict[int, int] = {}
+
+    if depth <= 1:
+        return my_board.divide(depth), {os.getpid(): my_board.perft(depth)}
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_perft_task, data, depth - split_depth): move
+            for move, data in split_positions(my_board, split_depth)
+        }
+
+        for future in concurrent.futures.as_completed(futures):
+            worker, nodes = future.result()
+            move = futures[future]
+            root_counts[move] = root_counts.get(move, 0) + nodes
+            worker_counts[worker] = worker_counts.get(worker, 0) + nodes
+
+    order = bitboard.generate_moves(my_board, my_board.active_color.value, True)
+
+    return [(move, root_counts.get(move, 0)) for move in order], worker_counts
+
+
+def parallel_perft(my_board: board.Board,
+                   depth: int,
+                   workers: int,
+                   split_depth: int = 1) -> tuple[int, dict[int, int]]:
+    """
+    Same as Board.perft, but counted in a pool of worker processes
+    Also returns the node count of every worker, keyed by its process id
+    """
+
+    counts, worker_counts = parallel_divide(my_board, depth, workers, split_depth)
+
+    return sum(count for _, count in counts), worker_counts
+
+
+def report(name: str, nodes: int, seconds: float) -> str:
+    """
+    Returns one line of the perft report
+    """
+
+    nps = nodes / seconds if seconds > 0 else 0.0
+
+    return f"{name:<32} {nodes:>10} nodes  {seconds:8.3f}s  {nps:>10.0f} nps"
+
+
+def run_suite(names: list[str], options: argparse.Namespace) -> bool:
+    """
+    Runs all reference positions in names (all of them if names is empty)
+    Returns true if every node count matched
+    """
+
+    passed = True
+    total_nodes = 0
+    total_seconds = 0.0
+
+    for name, fen, depth, expected in REFERENCE_POSITIONS:
+        if names and name not in names:
+            continue
+
+        my_board = board.Board()
+        my_board.load_fen(fen)
+        nodes, seconds = run_perft(my_board, depth, options)
+
+        total_nodes += nodes
+        total_seconds += seconds
+
+        status = "ok" if nodes == expected else f"FAILED, expected {expected}"
+        passed = passed and nodes == expected
+
+        print(f"{report(f'{name} (depth {depth})', nodes, seconds)}  {status}")
+
+    print(report("total", total_nodes, total_seconds))
+
+    return passed
+
+
+def run_divide(my_board: board.Board, depth: int, options: argparse.Namespace) -> None:
+    """
+    Prints the node count after each root move and the total
+    """
+
+    start = time.perf_counter()
+    nodes = 0
+
+    if options.workers > 1:
+        counts, _ = parallel_divide(my_board, depth, options.workers, options.split_depth)
+    else:
+        counts = my_board.divide(depth)
+
+    for move, count in counts:
+        nodes += count
+        print(f"{move_encoding.name(move)}: {count}")
+
+    print("")
+    print(report(f"total (depth {depth})", nodes, time.perf_counter() - start))
+
+
+def main() -> int:
+    """
+    Entry point of the perft command
+    """
+
+    parser = argparse.ArgumentParser(description="Verify and time the Icarus move generator")
+    parser.add_argument("--fen", help="position to count instead of the reference suite")
+    parser.add_argument("--depth", type=int, default=4, help="depth for --fen (default 4)")
+    parser.add_argument("--divide", action="store_true", help="print node counts per root move")
+    parser.add_argument("--position", action="append", default=[],
+                        help="only run this reference position (can be repeated)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes (default 1, 0 for one per core)")
+    parser.add_argument("--split-depth", type=int, default=1,
+                        help="plies below the root that are handed to the workers (default 1)")
+    parser.add_argument("--compare", action="store_true",
+                        help="also run serially and report the speedup")
+    args = parser.parse_args()
+
+    if args.workers == 0:
+        args.workers = os.cpu_count() or 1
+
+    if args.fen is None:
+        return 0 if run_suite(args.position, args) else 1
+
+    my_board = board.Board()
+    my_board.load_fen(args.fen)
+
+    if args.divide:
+        run_divide(my_board, args.depth, args)
+    else:
+        nodes, seconds = run_perft(my_board, args.depth, args)
+        print(report(f"perft (depth {args.depth})", nodes, seconds))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
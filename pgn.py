@@ -0,0 +1,372 @@
+"""
+Streaming PGN reader and replayer
+
+Usage:
+    python pgn.py games.pgn               replay every game and print a summary
+    python pgn.py games.pgn --verbose     also print every game as a JSON line
+    cat games.pgn | python pgn.py -
+
+Files are read in fixed size chunks and games are handed out one at a time,
+so memory stays constant no matter how large the file is.
+Games with malformed or illegal moves are reported and skipped, they never stop the run
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+import typing
+
+import bitboard
+import board
+import fen
+import move_encoding
+import position
+
+CHUNK_SIZE = 1 << 20
+
+# Longest line in bytes read_lines accepts, bounds the memory of input without newlines
+MAX_LINE = 1 << 24
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+# Indexed by SAN piece letter, the piece.Type value
+PIECE_LETTERS = {
+    "N": bitboard.KNIGHT,
+    "B": bitboard.BISHOP,
+    "R": bitboard.ROOK,
+    "Q": bitboard.QUEEN,
+    "K": bitboard.KING,
+}
+
+FILE_A = 0x0101010101010101
+
+# Indexed by piece.Type value, the SAN piece letter
+LETTERS = ["", "", "K", "Q", "R", "B", "N"]
+
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+
+# Comments, NAGs, variation brackets, move numbers, moves with an "e.p." suffix
+# (alone or attached) and everything else
+_TOKEN = re.compile(
+    r"\{[^}]*\}?|;[^\n]*|\$\d+|[()]|\d+\.+|[^\s(){};$.]+(?:\.p\.[+#!?]*)?"
+)
+
+# The optional suffix of en passant captures, e.g. "exd6 e.p."
+_EN_PASSANT = re.compile(r"\s*e\.p\.")
+
+_SAN = re.compile(r"([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?")
+
+
+class GameResult(typing.NamedTuple):
+    """
+    Outcome of replaying one game
+    """
+
+    # Position of the game in the input, starting at 1
+    number: int
+    tags: dict[str, str]
+    plies: int
+    fen: str
+    result: str
+
+    # Why the game could not be replayed to its end, None if it could
+    error: str | None
+
+
+def read_lines(stream: typing.BinaryIO,
+               chunk_size: int = CHUNK_SIZE,
+               max_line: int = MAX_LINE) -> typing.Iterator[str]:
+    """
+    Yields the lines of stream, reading chunk_size bytes at a time
+    Raises ValueError once a line grows longer than max_line bytes
+    """
+
+    pending = b""
+
+    while chunk := stream.read(chunk_size):
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+
+        if len(pending) > max_line:
+            raise ValueError(f"Line longer than {max_line} bytes, the input is not PGN")
+
+        for line in lines:
+            yield line.decode("utf-8", "replace")
+
+    if pending:
+        yield pending.decode("utf-8", "replace")
+
+
+def read_games(lines: typing.Iterable[str]) -> typing.Iterator[tuple[dict[str, str], str]]:
+    """
+    Yields the tag pairs and the movetext of every game in lines
+    """
+
+    tags: dict[str, str] = {}
+    movetext: list[str] = []
+    in_comment = False
+
+    for line in lines:
+        stripped = line.strip()
+
+        if not stripped or stripped.startswith("%"):
+            continue
+
+        tag = None if in_comment else _TAG.match(stripped)
+
+        if tag is not None:
+            # Tags after movetext, or a tag seen twice, start the next game
+            if movetext or tag[1] in tags:
+                yield tags, " ".join(movetext)
+                tags, movetext = {}, []
+
+            tags[tag[1]] = tag[2]
+            continue
+
+        movetext.append(stripped)
+
+        # A comment in braces can span several lines
+        if "{" in stripped or "}" in stripped:
+            in_comment = stripped.rfind("{") > stripped.rfind("}")
+
+    if tags or movetext:
+        yield tags, " ".join(movetext)
+
+
+def tokens(movetext: str) -> typing.Iterator[str]:
+    """
+    Yields the moves and the result of movetext,
+    skipping comments, NAGs, move numbers and variations
+    """
+
+    depth = 0
+
+    for token in _TOKEN.findall(movetext):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth = max(0, depth - 1)
+        elif depth == 0 and token[0] not in "{;$":
+            # "exd6e.p." is "exd6", a separate "e.p." is left out
+            if ".p." in token:
+                token = _EN_PASSANT.sub("", token)
+
+                if not token.strip("+#!?"):
+                    continue
+
+            if not token.endswith("."):
+                yield token
+
+
+def _castle(my_board: board.Board, san: str) -> move_encoding.Move:
+    """
+    Returns the castling move written as san ("O-O" or "O-O-O") of the active color
+    """
+
+    color = my_board.active_color.value
+    kings = my_board.type_bb[bitboard.KING] & my_board.color_bb[color]
+    wanted = move_encoding.KING_CASTLE if san.count("-") == 1 else move_encoding.QUEEN_CASTLE
+
+    for move in bitboard.generate_moves(my_board, color, True, kings):
+        if move >> 12 == wanted:
+            return move
+
+    raise ValueError(f"Illegal move {san!r}")
+
+
+def _origins(my_board: board.Board, kind: int, target: int, hint: tuple[str, str]) -> int:
+    """
+    Returns a bitboard of the pieces of the active color that may make a move of kind to target
+    hint holds the file and rank of the origin given in the move, empty if not given
+    """
+
+    color = my_board.active_color.value
+    us = my_board.color_bb[color]
+    file, rank = hint
+
+    if kind != bitboard.PAWN:
+        occupied = us | my_board.color_bb[3 - color]
+        result = bitboard.attackers_to(target, color, us, my_board.type_bb, occupied)
+    elif file:
+        result = bitboard.FULL
+    else:
+        # A pawn that does not capture stays on its file
+        result = FILE_A << (target & 7)
+
+    if file:
+        result &= FILE_A << "abcdefgh".index(file)
+    if rank:
+        result &= 0xFF << ((int(rank) - 1) * 8)
+
+    return result & my_board.type_bb[kind] & us
+
+
+def san_to_move(my_board: board.Board, san: str) -> move_encoding.Move:
+    """
+    Returns the legal move written in standard algebraic notation, e.g. "Nbd7" or "exd8=Q+",
+    an "e.p." suffix of en passant captures is allowed
+    Raises ValueError if san is malformed, illegal or ambiguous
+    """
+
+    text = _EN_PASSANT.sub("", san).rstrip("+#!?")
+    color = my_board.active_color.value
+
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        return _castle(my_board, san)
+
+    match = _SAN.fullmatch(text)
+    if match is None:
+        raise ValueError(f"Invalid move {san!r}")
+
+    letter, file, rank, target_name, promotion_letter = match.groups()
+    kind = PIECE_LETTERS[letter] if letter else bitboard.PAWN
+    target = ((int(target_name[1]) - 1) * 8) + "abcdefgh".index(target_name[0])
+    promotion = PIECE_LETTERS[promotion_letter] if promotion_letter else 0
+
+    # Only the pieces that fit the move are generated
+    origins = _origins(my_board, kind, target, (file or "", rank or ""))
+
+    candidates = [
+        move for move in bitboard.generate_moves(my_board, color, True, origins)
+        if (move >> 6) & 63 == target and move_encoding.promotion(move) == promotion
+    ]
+
+    if not candidates:
+        raise ValueError(f"Illegal move {san!r}")
+    if len(candidates) > 1:
+        raise ValueError(f"Ambiguous move {san!r}")
+
+    return candidates[0]
+
+
+def move_to_san(my_board: board.Board, move: move_encoding.Move) -> str:
+    """
+    Returns the legal move in standard algebraic notation, with "+" or "#" for checks
+    """
+
+    start = move & 63
+    target = (move >> 6) & 63
+    kind = my_board.board[start]
+    target_name = position.to_name([target >> 3, target & 7])
+    capture = "x" if move_encoding.is_capture(move) else ""
+
+    if move >> 12 in (move_encoding.KING_CASTLE, move_encoding.QUEEN_CASTLE):
+        text = "O-O" if move >> 12 == move_encoding.KING_CASTLE else "O-O-O"
+    elif kind == bitboard.PAWN:
+        text = ("abcdefgh"[start & 7] + capture if capture else "") + target_name
+        if move_encoding.promotion(move):
+            text += "=" + LETTERS[move_encoding.promotion(move)]
+    else:
+        rivals = [
+            other & 63 for other in my_board.legal_moves(my_board.active_color)
+            if other != move and (other >> 6) & 63 == target and my_board.board[other & 63] == kind
+        ]
+        origin = position.to_name([start >> 3, start & 7])
+
+        if not rivals:
+            origin = ""
+        elif all(rival & 7 != start & 7 for rival in rivals):
+            origin = origin[0]
+        elif all(rival >> 3 != start >> 3 for rival in rivals):
+            origin = origin[1]
+
+        text = LETTERS[kind] + origin + capture + target_name
+
+    undo = my_board.make_move(move)
+
+    if bitboard.in_check(my_board, my_board.active_color.value):
+        text += "+" if my_board.legal_moves(my_board.active_color) else "#"
+
+    my_board.unmake_move(undo)
+
+    return text
+
+
+def replay_game(my_board: board.Board,
+                number: int,
+                tags: dict[str, str],
+                movetext: str) -> GameResult:
+    """
+    Plays the moves of one game on my_board, starting from the FEN tag if there is one
+    Stops at the first malformed or illegal move and reports it as error
+    """
+
+    plies = 0
+    result = tags.get("Result", "*")
+    error = None
+
+    try:
+        my_board.load_fen(tags.get("FEN", fen.START_FEN))
+
+        for token in tokens(movetext):
+            if token in RESULTS:
+                result = token
+                break
+
+            my_board.make_move(san_to_move(my_board, token))
+            plies += 1
+    except (ValueError, IndexError, KeyError) as exception:
+        error = f"ply {plies + 1}: {exception}"
+
+    return GameResult(number, tags, plies, my_board.board_to_fen(), result, error)
+
+
+def replay(games: typing.Iterable[tuple[dict[str, str], str]],
+           my_board: board.Board | None = None) -> typing.Iterator[GameResult]:
+    """
+    Replays every game from read_games on one reused board
+    """
+
+    my_board = my_board if my_board is not None else board.Board()
+
+    for number, (tags, movetext) in enumerate(games, start=1):
+        yield replay_game(my_board, number, tags, movetext)
+
+
+def main() -> int:
+    """
+    Entry point of the PGN replayer
+    """
+
+    parser = argparse.ArgumentParser(description="Replay and validate the games of a PGN file")
+    parser.add_argument("file", help="PGN file, - for stdin")
+    parser.add_argument("--verbose", action="store_true", help="print every game as a JSON line")
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many games")
+    args = parser.parse_args()
+
+    # pylint: disable-next=consider-using-with
+    stream = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+    start = time.perf_counter()
+    games = errors = plies = 0
+
+    with stream:
+        try:
+            for game in replay(read_games(read_lines(stream))):
+                games += 1
+                plies += game.plies
+
+                if game.error is not None:
+                    errors += 1
+                    print(f"game {game.number}: {game.error}", file=sys.stderr)
+
+                if args.verbose:
+                    print(json.dumps(game._asdict()))
+
+                if games == args.limit:
+                    break
+        except ValueError as error:
+            errors += 1
+            print(f"error: {error}", file=sys.stderr)
+
+    seconds = time.perf_counter() - start
+    print(f"games {games}  errors {errors}  plies {plies}  time {seconds:.3f}s  "
+          f"{games / seconds if seconds > 0 else 0.0:.0f} games/s  "
+          f"{plies / seconds if seconds > 0 else 0.0:.0f} plies/s", file=sys.stderr)
+
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,8 +5,10 @@ Holds the classes Color and Type
 from enum import Enum
 import typing
 
-import board as b
+import fen
+import move_encoding
 import position
+import instrumentation
 
 
 class Color(Enum):
@@ -33,6 +35,14 @@ class Type(Enum):
     KNIGHT = 6
 
 
+# Indexed by FEN character, the piece type and color
+_PIECES = {char: (Type(kind), Color(color)) for char, (kind, color) in fen.PIECES.items()}
+
+# Indexed by piece type and color, the FEN character
+_CHARS = {value: char for char, value in _PIECES.items()}
+
+
+@instrumentation.hook
 def get_valid_moves(row: int, file: int, simulate: bool, board: typing.Any) -> list[list[int]]:
     """
     Returns all valid positions for piece at row and file
@@ -78,23 +88,17 @@ def get_valid_moves(row: int, file: int, simulate: bool, board: typing.Any) -> l
         valid_moves.extend(get_knight_moves(row, file, board))
 
     # Check if the move would place the king in check
+    # (the move is played on board itself and taken back afterwards)
     if simulate:
+        other_color = Color.WHITE if color == Color.BLACK else Color.BLACK
         i = 0
         while i < len(valid_moves):
             valid_move = valid_moves[i]
-            copied_board = b.Board()
-            copied_board.board, copied_board.color = board.copy()
-            color = copied_board.get_color(row, file)
-            other_color = Color.WHITE if color == Color.BLACK else Color.BLACK
 
-            copied_board.teleport_piece(
-                row,
-                file,
-                valid_move[0],
-                valid_move[1]
-            )
-
-            _, result = get_all_moves(other_color, copied_board, False)
+            undo = board.make_move(move_encoding.from_positions(board, [row, file], valid_move))
+            king = board.king_square[color.value]
+            result = king != -1 and board.is_square_attacked(king >> 3, king & 7, other_color)
+            board.unmake_move(undo)
 
             if result:
                 valid_moves.pop(i)
@@ -105,6 +109,7 @@ def get_valid_moves(row: int, file: int, simulate: bool, board: typing.Any) -> l
     return valid_moves
 
 
+@instrumentation.hook
 def get_knight_moves(row: int, file: int, board: typing.Any) -> list[list[int]]:
     """
     Returns all valid positions for a knight at row and file
@@ -139,6 +144,7 @@ def get_knight_moves(row: int, file: int, board: typing.Any) -> list[list[int]]:
     return valid_moves
 
 
+@instrumentation.hook
 def get_king_moves(row: int,
                    file: int,
                    board: typing.Any,
@@ -170,25 +176,21 @@ def get_king_moves(row: int,
             if board.get_color(current_row, current_file) != color:
                 valid_moves.append([current_row, current_file])
 
-    # NOTE - it does not matter here that we use board instead of b
-    #        since we dont castle in simulation (we cant take the king through castles)
     # Check for castling
     if not castle_info[0] and can_castle:
-        enemy_moves, in_check = get_all_moves(enemy_color, board, False)
-
-        if in_check:
+        if board.is_square_attacked(row, file, enemy_color):
             return valid_moves
 
         if (not castle_info[1]
-                and [row, file - 1] not in enemy_moves
-                and [row, file - 2] not in enemy_moves
+                and not board.is_square_attacked(row, file - 1, enemy_color)
+                and not board.is_square_attacked(row, file - 2, enemy_color)
                 and board.get_piece(row, file - 1) == Type.NONE
                 and board.get_piece(row, file - 2) == Type.NONE):
             valid_moves.append([row, file - 2])
 
         if (not castle_info[2]
-                and [row, file + 1] not in enemy_moves
-                and [row, file + 2] not in enemy_moves
+                and not board.is_square_attacked(row, file + 1, enemy_color)
+                and not board.is_square_attacked(row, file + 2, enemy_color)
                 and board.get_piece(row, file + 1) == Type.NONE
                 and board.get_piece(row, file + 2) == Type.NONE):
             valid_moves.append([row, file + 2])
@@ -196,6 +198,7 @@ def get_king_moves(row: int,
     return valid_moves
 
 
+@instrumentation.hook
 def get_pawn_moves(row: int, file: int, board: typing.Any) -> list[list[int]]:
     """
     Returns all valid positions for a pawn at row and file
@@ -259,6 +262,7 @@ def get_pawn_moves(row: int, file: int, board: typing.Any) -> list[list[int]]:
     return valid_moves
 
 
+@instrumentation.hook
 def get_line_move(row: int, file: int, direction: list[int], board: typing.Any) -> list[list[int]]:
     """
     Returns all valid positions for piece at row and file in
@@ -291,6 +295,7 @@ def get_line_move(row: int, file: int, direction: list[int], board: typing.Any)
     return valid_moves
 
 
+@instrumentation.hook
 def get_all_moves(color: Color, board: typing.Any, simulate: bool) -> tuple[list[list[int]], bool]:
     """
     Returns all valid moves for all pieces of a certain color
@@ -324,25 +329,10 @@ def get_all_moves(color: Color, board: typing.Any, simulate: bool) -> tuple[list
 
 def piece_to_char(piece_type: Type, piece_color: Color) -> str:
     """
-    Converts a piece to its corresponding character abreviation
+    Converts a piece to its corresponding character abreviation, "?" if there is none
     """
 
-    result = "?"
-
-    if piece_type == Type.PAWN:
-        result = "P" if piece_color == Color.WHITE else "p"
-    if piece_type == Type.KING:
-        result = "K" if piece_color == Color.WHITE else "k"
-    if piece_type == Type.QUEEN:
-        result = "Q" if piece_color == Color.WHITE else "q"
-    if piece_type == Type.ROOK:
-        result = "R" if piece_color == Color.WHITE else "r"
-    if piece_type == Type.KNIGHT:
-        result = "N" if piece_color == Color.WHITE else "n"
-    if piece_type == Type.BISHOP:
-        result = "B" if piece_color == Color.WHITE else "b"
-
-    return result
+    return _CHARS.get((piece_type, piece_color), "?")
 
 
 def char_to_piece(char: str) -> tuple[Type, Color]:
@@ -350,29 +340,4 @@ def char_to_piece(char: str) -> tuple[Type, Color]:
     Converts a character to its corresponding piece type and color
     """
 
-    piece_type = Type.NONE
-    piece_color = Color.BLACK
-
-    char = list(char)[0]
-
-    if char.isupper():
-        piece_color = Color.WHITE
-        char = char.lower()
-
-    if char == "p":
-        piece_type = Type.PAWN
-    if char == "q":
-        piece_type = Type.QUEEN
-    if char == "k":
-        piece_type = Type.KING
-    if char == "r":
-        piece_type = Type.ROOK
-    if char == "n":
-        piece_type = Type.KNIGHT
-    if char == "b":
-        piece_type = Type.BISHOP
-
-    if piece_type == Type.NONE:
-        piece_color = Color.NONE
-
-    return piece_type, piece_color
+    return _PIECES.get(char[:1], (Type.NONE, Color.NONE))
@@ -17,3 +17,19 @@ def is_in_bounds(a: list[int]) -> bool:
     """
 
     return not (a[0] > 7 or a[0] < 0 or a[1] > 7 or a[1] < 0)
+
+
+def to_name(a: list[int]) -> str:
+    """
+    Returns the name of the square at a[0] (row) and a[1] (file), e.g. "e4"
+    """
+
+    return "abcdefgh"[a[1]] + str(a[0] + 1)
+
+
+def from_name(name: str) -> list[int]:
+    """
+    Returns [row, file] of a square name like "e4"
+    """
+
+    return [int(name[1]) - 1, "abcdefgh".index(name[0])]
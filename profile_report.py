@@ -0,0 +1,169 @@
+"""
+Prints a profile written by instrumentation or compares two
+
+Usage:
+    python profile_report.py run.json                     the hooked functions of one run
+    python profile_report.py base.json new.json           per function changes from base to new
+    python profile_report.py base.json new.json --sort calls --limit 10
+
+Times are in milliseconds, allocations in KiB (only if the runs recorded them).
+A change is new / base - 1, so -25% means new took a quarter less
+"""
+
+import argparse
+import json
+import sys
+import typing
+
+# Indexed by --sort choice, the key of the function totals it sorts by
+SORT_KEYS = {
+    "time": "seconds",
+    "self": "self_seconds",
+    "calls": "calls",
+    "allocated": "allocated_bytes",
+}
+
+# The totals compare prints: key, factor to the printed unit and decimals
+COLUMNS = [
+    ("calls", 1, 0),
+    ("seconds", 1000, 1),
+    ("self_seconds", 1000, 1),
+    ("allocated_bytes", 1 / 1024, 1),
+]
+
+Profile = dict[str, typing.Any]
+
+
+def load(path: str) -> Profile:
+    """
+    Returns the profile in the JSON file at path
+    Raises OSError if it cannot be read and ValueError if it is not a profile
+    """
+
+    with open(path, encoding="utf-8") as stream:
+        profile = json.load(stream)
+
+    if not isinstance(profile, dict) or not isinstance(profile.get("functions"), dict):
+        raise ValueError(f"{path} is not a profile")
+
+    return profile
+
+
+def change(base: float, new: float) -> str:
+    """
+    Returns the relative change from base to new as text
+    """
+
+    if base == new:
+        return "="
+    if not base:
+        return "new"
+
+    return f"{((new / base) - 1) * 100:+.1f}%"
+
+
+def row(name: str, totals: dict[str, typing.Any], allocations: bool) -> str:
+    """
+    Returns the line of one function of one run
+    """
+
+    line = (f"{totals['calls']:>12} {totals['seconds'] * 1000:>12.1f} "
+            f"{totals['self_seconds'] * 1000:>12.1f}")
+
+    if allocations:
+        line += f" {totals['allocated_bytes'] / 1024:>12.1f}"
+
+    return f"{line}  {name}"
+
+
+def report(profile: Profile, sort: str, limit: int) -> None:
+    """
+    Prints the functions and counters of one run
+    """
+
+    allocations = bool(profile.get("allocations"))
+    functions = profile["functions"]
+    names = sorted(functions, key=lambda name: functions[name][SORT_KEYS[sort]], reverse=True)
+
+    header = f"{'calls':>12} {'total ms':>12} {'self ms':>12}"
+    print(f"{header} {'KiB':>12}  function" if allocations else f"{header}  function")
+
+    for name in names[:limit]:
+        print(row(name, functions[name], allocations))
+
+    for counter, value in profile.get("counters", {}).items():
+        print(f"{counter}: {value}")
+
+
+def compare(base: Profile, new: Profile, sort: str, limit: int) -> None:
+    """
+    Prints the functions and counters of two runs side by side with their changes
+    """
+
+    key = SORT_KEYS[sort]
+    empty = {"calls": 0, "seconds": 0.0, "self_seconds": 0.0, "allocated_bytes": 0}
+    names = sorted(
+        set(base["functions"]) | set(new["functions"]),
+        key=lambda name: new["functions"].get(name, base["functions"].get(name, empty))[key],
+        reverse=True
+    )
+
+    allocations = bool(base.get("allocations")) and bool(new.get("allocations"))
+    header = (f"{'calls':>12} {'change':>8} {'total ms':>12} {'change':>8} "
+              f"{'self ms':>12} {'change':>8}")
+    print(f"{header} {'KiB':>12} {'change':>8}  function" if allocations else f"{header}  function")
+
+    for name in names[:limit]:
+        old = base["functions"].get(name, empty)
+        current = new["functions"].get(name, empty)
+        line = " ".join(
+            f"{current[total] * scale:>12.{digits}f} {change(old[total], current[total]):>8}"
+            for total, scale, digits in COLUMNS[:4 if allocations else 3]
+        )
+        print(f"{line}  {name}")
+
+    compare_counters(base.get("counters", {}), new.get("counters", {}))
+
+
+def compare_counters(base: dict[str, int], new: dict[str, int]) -> None:
+    """
+    Prints the counters of two runs with their changes
+    """
+
+    for counter in {**base, **new}:
+        old_value, value = base.get(counter, 0), new.get(counter, 0)
+        print(f"{counter}: {old_value} -> {value} ({change(old_value, value)})")
+
+
+def main() -> int:
+    """
+    Entry point of the profile report
+    """
+
+    parser = argparse.ArgumentParser(description="Print a profile or compare two")
+    parser.add_argument("profiles", nargs="+", help="one profile, or a base and a new one")
+    parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="time",
+                        help="order of the functions (default time)")
+    parser.add_argument("--limit", type=int, default=30,
+                        help="functions to print (default 30)")
+    args = parser.parse_args()
+
+    if len(args.profiles) > 2:
+        parser.error("expected one or two profiles")
+
+    try:
+        profiles = [load(path) for path in args.profiles]
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    if len(profiles) == 1:
+        report(profiles[0], args.sort, args.limit)
+    else:
+        compare(profiles[0], profiles[1], args.sort, args.limit)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ echo Installing dependencies...
 pip install tk
 pip install Pillow
 pip install typing
+pip install numpy
 apt install mkdocs
 pip install mkdocs-material
 echo Done!
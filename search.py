@@ -0,0 +1,467 @@
+"""
+Alpha-beta search to pick a move for the side to move
+
+Iterative deepening negamax with a transposition table,
+move ordering (hash move, MVV-LVA captures, killer moves, history)
+and a capture-only quiescence search
+"""
+
+import time
+import typing
+
+import bitboard
+import evaluation
+import move_encoding
+
+INFINITY = 1_000_000
+MATE = 100_000
+
+# Scores closer to MATE than this are mates, their distance to the root
+# is stored relative to the node in the transposition table
+MATE_BOUND = MATE - 1000
+
+# Transposition table entry flags
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Indexed by piece.Type value, the values captures are ordered by
+PIECE_VALUES = evaluation.MIDDLEGAME_VALUES
+
+# Move ordering scores, captures add their MVV-LVA score on top
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28
+KILLER_SCORES = [1 << 27, 1 << 26]
+
+MAX_PLY = 128
+
+
+class SearchStopped(Exception):
+    """
+    Thrown inside the search once a node or time limit is reached
+    """
+
+
+class TranspositionTable():
+    """
+    Fixed size table of search results keyed by Board.hash
+
+    An entry is replaced if it belongs to an older search
+    or if the new result was searched at least as deep
+    """
+
+    def __init__(self, size: int = 1 << 18) -> None:
+        # Round down to a power of two so the index is a simple mask
+        self.size = 1 << (max(1, size).bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries: list[typing.Any] = [None] * self.size
+        self.generation = 0
+
+    def clear(self) -> None:
+        """
+        Removes all entries
+        """
+
+        self.entries = [None] * self.size
+
+    def probe(self, key: int) -> tuple[int, int, int, int, move_encoding.Move | None] | None:
+        """
+        Returns key, depth, flag, score and best move stored for key, None if there is none
+        """
+
+        entry = self.entries[key & self.mask]
+
+        if entry is None or entry[0] != key:
+            return None
+
+        return typing.cast(tuple[int, int, int, int, move_encoding.Move | None], entry[:5])
+
+    def store(self,
+              key: int,
+              depth: int,
+              flag: int,
+              score: int,
+              move: move_encoding.Move | None) -> None:
+        """
+        Stores a search result, following the replacement policy
+        """
+
+        index = key & self.mask
+        entry = self.entries[index]
+
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self.entries[index] = (key, depth, flag, score, move, self.generation)
+
+    def hashfull(self) -> int:
+        """
+        Returns how many of the first 1000 entries are used by the current search, in permille
+        """
+
+        sample = self.entries[:1000]
+
+        return sum(
+            1 for entry in sample
+            if entry is not None and entry[5] == self.generation
+        ) * 1000 // len(sample)
+
+
+class Search():
+    """
+    Finds the best move for the side to move on a board.Board
+    """
+
+    def __init__(self, tt_size: int = 1 << 18) -> None:
+        self.table = TranspositionTable(tt_size)
+        self.killers: list[list[move_encoding.Move | None]] = [[None, None] for _ in range(MAX_PLY)]
+        self.history: list[list[list[int]]] = [[[0] * 64 for _ in range(64)] for _ in range(3)]
+
+        self.stats = {"nodes": 0, "tt_probes": 0, "tt_hits": 0, "cutoffs": 0, "first_cutoffs": 0}
+        self.seconds = 0.0
+
+        # Node limit and deadline (from time.perf_counter), 0 for none
+        self.limits = (0, 0.0)
+        self.stopped = False
+
+    def search(self,
+               board: typing.Any,
+               max_depth: int = 64,
+               max_nodes: int = 0,
+               max_time: float = 0.0) -> tuple[move_encoding.Move | None, int]:
+        """
+        Searches the position on board with iterative deepening
+        until max_depth is done or max_nodes / max_time (in seconds, 0 for no limit) run out
+        Returns the best move (None if there is no legal move) and its score in centipawns
+
+        The board is left in the position it was given in
+        """
+
+        self.table.generation += 1
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.stats = dict.fromkeys(self.stats, 0)
+        start_time = time.perf_counter()
+        self.limits = (max_nodes, start_time + max_time if max_time else 0.0)
+        self.stopped = False
+
+        best_move = None
+        best_score = 0
+
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self.negamax(board, depth, -INFINITY, INFINITY, 0)
+            except SearchStopped:
+                break
+
+            entry = self.table.probe(board.hash)
+            best_move = entry[4] if entry else None
+            best_score = score
+
+            self.seconds = time.perf_counter() - start_time
+            self.on_iteration(board, depth, best_score, best_move)
+
+            if best_move is None or abs(score) > MATE_BOUND:
+                break
+
+        self.seconds = time.perf_counter() - start_time
+
+        if best_move is None:
+            moves = bitboard.generate_moves(board, board.active_color.value, True)
+            best_move = moves[0] if moves else None
+
+        return best_move, best_score
+
+    def on_iteration(self,
+                     board: typing.Any,
+                     depth: int,
+                     score: int,
+                     move: move_encoding.Move | None) -> None:
+        """
+        Called by search after every finished depth with the best move and score so far,
+        stats and seconds are up to date at that point
+        Does nothing, subclasses override it to report progress
+        """
+
+    def principal_variation(self, board: typing.Any, length: int) -> list[move_encoding.Move]:
+        """
+        Returns the expected line of play from the position on board,
+        following the best moves in the transposition table for up to length moves
+        """
+
+        line: list[move_encoding.Move] = []
+        undos = []
+
+        while len(line) < length:
+            entry = self.table.probe(board.hash)
+
+            if entry is None or entry[4] is None:
+                break
+            if entry[4] not in bitboard.generate_moves(board, board.active_color.value, True):
+                break
+
+            line.append(entry[4])
+            undos.append(board.make_move(entry[4]))
+
+        for undo in reversed(undos):
+            board.unmake_move(undo)
+
+        return line
+
+    def stop(self) -> None:
+        """
+        Makes a running search return as soon as possible
+        """
+
+        self.stopped = True
+
+    def _check_limits(self) -> None:
+        """
+        Throws SearchStopped once a limit is reached or stop was called
+        """
+
+        max_nodes, deadline = self.limits
+
+        if max_nodes and self.stats["nodes"] >= max_nodes:
+            self.stopped = True
+        if deadline and self.stats["nodes"] & 1023 == 0 and time.perf_counter() >= deadline:
+            self.stopped = True
+
+        if self.stopped:
+            raise SearchStopped()
+
+    def negamax(self, board: typing.Any, depth: int, alpha: int, beta: int, ply: int) -> int:
+        """
+        Returns the score of the position on board searched depth plies deep
+        from the point of view of the side to move
+        """
+
+        self.stats["nodes"] += 1
+        self._check_limits()
+
+        if depth <= 0:
+            return self.quiescence(board, alpha, beta, ply)
+
+        tt_move, tt_score = self._probe(board.hash, depth, alpha, beta, ply)
+        if tt_score is not None and ply > 0:
+            return tt_score
+
+        color = board.active_color.value
+        moves = bitboard.generate_moves(board, color, True)
+
+        if not moves:
+            return -MATE + ply if bitboard.in_check(board, color) else 0
+
+        ordered = self.order_moves(board, moves, tt_move, ply)
+        best_score, best_move = self._search_moves(board, ordered, depth, (alpha, beta), ply)
+
+        if best_score <= alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+
+        self.table.store(board.hash, depth, flag, _to_table(best_score, ply), best_move)
+
+        return best_score
+
+    def _search_moves(self,
+                      board: typing.Any,
+                      moves: list[move_encoding.Move],
+                      depth: int,
+                      window: tuple[int, int],
+                      ply: int) -> tuple[int, move_encoding.Move]:
+        """
+        Subroutine of negamax
+        Searches moves in order until one fails high
+        Returns the best score and the move that reached it
+        """
+
+        alpha, beta = window
+        best_score = -INFINITY
+        best_move = moves[0]
+
+        for index, move in enumerate(moves):
+            undo = board.make_move(move)
+            try:
+                score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.unmake_move(undo)
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                alpha = max(alpha, score)
+
+            if alpha >= beta:
+                self._record_cutoff(board, move, depth, ply, index == 0)
+                break
+
+        return best_score, best_move
+
+    def quiescence(self, board: typing.Any, alpha: int, beta: int, ply: int) -> int:
+        """
+        Searches captures and promotions only, until the position is quiet
+        """
+
+        self.stats["nodes"] += 1
+        self._check_limits()
+
+        stand_pat = evaluation.evaluate(board)
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        moves = [
+            move for move in bitboard.generate_moves(board, board.active_color.value, True)
+            if _is_noisy(move)
+        ]
+        for move in self.order_moves(board, moves, None, ply):
+            undo = board.make_move(move)
+            try:
+                score = -self.quiescence(board, -beta, -alpha, ply + 1)
+            finally:
+                board.unmake_move(undo)
+
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+
+        return alpha
+
+    def _probe(self,
+               key: int,
+               depth: int,
+               alpha: int,
+               beta: int,
+               ply: int) -> tuple[move_encoding.Move | None, int | None]:
+        """
+        Looks up key in the transposition table
+        Returns the stored best move and, if the entry is deep enough
+        to decide this node, its score
+        """
+
+        self.stats["tt_probes"] += 1
+        entry = self.table.probe(key)
+
+        if entry is None:
+            return None, None
+
+        self.stats["tt_hits"] += 1
+        _, entry_depth, flag, score, move = entry
+        score = _from_table(score, ply)
+
+        if entry_depth < depth:
+            return move, None
+
+        if flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha):
+            return move, score
+
+        return move, None
+
+    def _record_cutoff(self,
+                       board: typing.Any,
+                       move: move_encoding.Move,
+                       depth: int,
+                       ply: int,
+                       first: bool) -> None:
+        """
+        Updates cutoff statistics, killer moves and history after move failed high
+        """
+
+        self.stats["cutoffs"] += 1
+        self.stats["first_cutoffs"] += int(first)
+
+        # Captures and promotions are ordered well enough already
+        if _is_noisy(move):
+            return
+
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+        self.history[board.active_color.value][move & 63][(move >> 6) & 63] += depth * depth
+
+    def order_moves(self,
+                    board: typing.Any,
+                    moves: typing.Iterable[move_encoding.Move],
+                    tt_move: move_encoding.Move | None,
+                    ply: int) -> list[move_encoding.Move]:
+        """
+        Returns moves sorted so the most promising ones are searched first:
+        the hash move, captures by MVV-LVA, killer moves and then by history
+        """
+
+        killers = self.killers[ply]
+        history: list[list[int]] = self.history[board.active_color.value]
+        kinds: list[int] = board.board
+
+        def score(move: move_encoding.Move) -> int:
+            start = move & 63
+            target = (move >> 6) & 63
+
+            if move == tt_move:
+                return HASH_MOVE_SCORE
+            if _is_noisy(move):
+                promotion = move_encoding.promotion(move)
+                return (CAPTURE_SCORE + (PIECE_VALUES[kinds[target]] + PIECE_VALUES[promotion]) * 16
+                        - PIECE_VALUES[kinds[start]] // 16)
+            if move == killers[0]:
+                return KILLER_SCORES[0]
+            if move == killers[1]:
+                return KILLER_SCORES[1]
+
+            return history[start][target]
+
+        return sorted(moves, key=score, reverse=True)
+
+    def report(self) -> str:
+        """
+        Returns the statistics of the last search as one line
+        """
+
+        nodes = self.stats["nodes"]
+        nps = nodes / self.seconds if self.seconds > 0 else 0.0
+        hit_rate = self.stats["tt_hits"] / max(1, self.stats["tt_probes"])
+        cutoff_rate = self.stats["cutoffs"] / max(1, nodes)
+        first_rate = self.stats["first_cutoffs"] / max(1, self.stats["cutoffs"])
+
+        return (
+            f"nodes {nodes}  time {self.seconds:.3f}s  nps {nps:.0f}  "
+            f"tt hits {hit_rate:.1%}  cutoffs {cutoff_rate:.1%}  "
+            f"first move cutoffs {first_rate:.1%}  hashfull {self.table.hashfull()}"
+        )
+
+
+def _is_noisy(move: move_encoding.Move) -> bool:
+    """
+    Returns true if move is a capture (en passant included) or a promotion
+    """
+
+    # Both have one of the two highest flag bits set
+    return move >= 0x4000
+
+
+def _to_table(score: int, ply: int) -> int:
+    """
+    Converts a mate score from distance to the root into distance to this node
+    """
+
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+
+    return score
+
+
+def _from_table(score: int, ply: int) -> int:
+    """
+    Converts a mate score from distance to the stored node into distance to the root
+    """
+
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+
+    return score
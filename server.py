@@ -0,0 +1,388 @@
+"""
+Game session server hosting many independent games in one process
+
+Usage:
+    python server.py                      listen on 127.0.0.1:8765
+    python server.py --port 0             listen on a free port
+    python server.py --stdio              read requests from stdin, answer on stdout
+
+Requests and responses are JSON objects, one per line.
+Every request has a "cmd", an "id" is copied into the response:
+
+    {"cmd": "new"}                               -> {"game": 1, "fen": ..., ...}
+    {"cmd": "new", "fen": FEN}                   start from a position
+    {"cmd": "moves", "game": 1}                  -> {"moves": ["a2a3", ...]}
+    {"cmd": "move", "game": 1, "move": "e2e4"}   -> {"ok": true, "result": "*", ...}
+    {"cmd": "state", "game": 1}                  -> {"fen": ..., "active_color": ..., ...}
+    {"cmd": "close", "game": 1}                  -> {"ok": true}
+    {"cmd": "stats"}                             -> games, latency and memory per game
+
+Failed requests, including fields of the wrong type, are answered with {"error": message}
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import enum
+import json
+import sys
+import time
+import typing
+
+import board
+import move_encoding
+import piece
+
+# Number of recent move latencies kept for the percentiles
+LATENCY_SAMPLES = 100_000
+
+# Number of games whose memory is measured for the stats
+MEMORY_SAMPLE = 64
+
+# Longest request line in bytes a socket connection accepts
+LINE_LIMIT = 1 << 20
+
+# Indexed by request field, the type its value must have
+FIELD_TYPES: dict[str, type] = {"cmd": str, "fen": str, "move": str, "game": int}
+
+Request = dict[str, typing.Any]
+Response = dict[str, typing.Any]
+
+
+def result(game: board.Board) -> str:
+    """
+    Returns the result of game in PGN notation: "1-0", "0-1", "1/2-1/2" or "*" if it is not over
+    """
+
+    if not game.game_over:
+        return "*"
+
+    if game.color_checkmated == piece.Color.BLACK:
+        return "1-0"
+    if game.color_checkmated == piece.Color.WHITE:
+        return "0-1"
+
+    return "1/2-1/2"
+
+
+def percentile(values: typing.Sequence[float], fraction: float) -> float:
+    """
+    Returns the value below which fraction of values lie, 0 if there are none
+    """
+
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def memory_size(game: board.Board) -> int:
+    """
+    Returns the number of bytes used by game and everything it owns
+    Objects shared by all games (enum members, interned small ints) are not counted
+    """
+
+    seen: set[int] = set()
+    pending: list[typing.Any] = [game, vars(game)]
+    size = 0
+
+    while pending:
+        item = pending.pop()
+
+        if id(item) in seen or isinstance(item, enum.Enum):
+            continue
+        if isinstance(item, int) and -5 <= item <= 256:
+            continue
+
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            pending.extend(item)
+
+    return size
+
+
+def check_fields(request: Request) -> None:
+    """
+    Raises ValueError if a field of request has a value of the wrong type
+    """
+
+    for name, kind in FIELD_TYPES.items():
+        if name not in request:
+            continue
+
+        # bool is a subclass of int but never a game id
+        value = request[name]
+        if not isinstance(value, kind) or isinstance(value, bool):
+            raise ValueError(f"Field {name!r} has to be of type {kind.__name__}, got {value!r}")
+
+
+class SessionManager():
+    """
+    Holds all games of the server and answers requests about them
+    """
+
+    def __init__(self, max_games: int = 100_000) -> None:
+        self.games: dict[int, board.Board] = {}
+        self.next_game = 1
+        self.max_games = max_games
+
+        # Seconds spent on the most recent move requests
+        self.latencies: collections.deque[float] = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.counts = {"requests": 0, "moves": 0, "errors": 0}
+
+        self.commands: dict[str, typing.Callable[[Request], Response]] = {
+            "new": self._new,
+            "moves": self._moves,
+            "move": self._move,
+            "state": self._state,
+            "close": self._close,
+            "stats": self._stats,
+        }
+
+    def handle(self, request: Request) -> Response:
+        """
+        Answers a single request
+        """
+
+        start = time.perf_counter()
+        self.counts["requests"] += 1
+
+        try:
+            check_fields(request)
+            command = self.commands.get(request.get("cmd", ""))
+            if command is None:
+                raise ValueError(f"Unknown command {request.get('cmd')!r}")
+            response = command(request)
+        except (KeyError, TypeError, ValueError) as error:
+            self.counts["errors"] += 1
+            response = {"error": str(error)}
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            # One broken request must not take down the server and every other game
+            self.counts["errors"] += 1
+            response = {"error": f"Internal error: {type(error).__name__}: {error}"}
+
+        if request.get("cmd") == "move":
+            self.latencies.append(time.perf_counter() - start)
+
+        if "id" in request:
+            response["id"] = request["id"]
+
+        return response
+
+    def handle_line(self, line: bytes) -> bytes:
+        """
+        Answers one line of the protocol with one line
+        """
+
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = None
+
+        if isinstance(request, dict):
+            response = self.handle(request)
+        else:
+            response = {"error": "Requests have to be JSON objects"}
+
+        return json.dumps(response).encode() + b"\n"
+
+    def _game(self, request: Request) -> board.Board:
+        """
+        Returns the game a request refers to
+        """
+
+        game = self.games.get(request["game"])
+
+        if game is None:
+            raise ValueError(f"Unknown game {request['game']!r}")
+
+        return game
+
+    def _new(self, request: Request) -> Response:
+        """
+        Starts a new game, from the standard position or request["fen"]
+        """
+
+        if len(self.games) >= self.max_games:
+            raise ValueError(f"Too many games, the limit is {self.max_games}")
+
+        game = board.Board()
+
+        if "fen" in request:
+            game.load_fen(request["fen"])
+        else:
+            game.setup()
+
+        game_id = self.next_game
+        self.next_game += 1
+        self.games[game_id] = game
+
+        return {"game": game_id} | self._state(request | {"game": game_id})
+
+    def _moves(self, request: Request) -> Response:
+        """
+        Lists the legal moves of the active color in coordinate notation
+        """
+
+        game = self._game(request)
+
+        return {"moves": [move_encoding.name(move) for move in game.legal_moves(game.active_color)]}
+
+    def _move(self, request: Request) -> Response:
+        """
+        Plays a move given in coordinate notation
+        """
+
+        game = self._game(request)
+
+        if game.game_over:
+            raise ValueError("The game is over")
+
+        if not game.play_move(move_encoding.from_name(game, request["move"])):
+            raise ValueError(f"Illegal move {request['move']!r}")
+
+        self.counts["moves"] += 1
+
+        return {"ok": True, "result": result(game), "active_color": game.active_color.name.lower()}
+
+    def _state(self, request: Request) -> Response:
+        """
+        Describes the position and result of a game
+        """
+
+        game = self._game(request)
+
+        return {
+            "fen": game.board_to_fen(),
+            "active_color": game.active_color.name.lower(),
+            "turn": game.active_turn,
+            "result": result(game),
+        }
+
+    def _close(self, request: Request) -> Response:
+        """
+        Removes a game
+        """
+
+        self._game(request)
+        del self.games[request["game"]]
+
+        return {"ok": True}
+
+    def _stats(self, _: Request) -> Response:
+        """
+        Reports the number of games, move latency and memory per game
+        """
+
+        latencies = list(self.latencies)
+        sample = list(self.games.values())[:MEMORY_SAMPLE]
+
+        return {
+            "games": len(self.games),
+            "requests": self.counts["requests"],
+            "moves": self.counts["moves"],
+            "errors": self.counts["errors"],
+            "move_p50_ms": percentile(latencies, 0.5) * 1000,
+            "move_p99_ms": percentile(latencies, 0.99) * 1000,
+            "memory_per_game": sum(memory_size(game) for game in sample) // max(1, len(sample)),
+        }
+
+
+async def serve_client(manager: SessionManager,
+                       reader: asyncio.StreamReader,
+                       writer: asyncio.StreamWriter) -> None:
+    """
+    Answers the requests of one connection until it is closed
+    A line longer than LINE_LIMIT is answered with an error and closes the connection,
+    the requests after it cannot be told apart any more
+    """
+
+    try:
+        while line := await reader.readline():
+            writer.write(manager.handle_line(line))
+            await writer.drain()
+    except ValueError:
+        manager.counts["errors"] += 1
+        response = {"error": f"Requests have to be shorter than {LINE_LIMIT} bytes"}
+        writer.write(json.dumps(response).encode() + b"\n")
+        with contextlib.suppress(ConnectionError):
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+        with contextlib.suppress(ConnectionError):
+            await writer.wait_closed()
+
+
+async def serve_socket(manager: SessionManager, host: str, port: int) -> None:
+    """
+    Serves manager on a local socket until the process is stopped
+    Prints "listening HOST PORT" once connections are accepted
+    """
+
+    server = await asyncio.start_server(
+        lambda reader, writer: serve_client(manager, reader, writer),
+        host,
+        port,
+        limit=LINE_LIMIT
+    )
+
+    address = server.sockets[0].getsockname()
+    print(f"listening {address[0]} {address[1]}", flush=True)
+
+    async with server:
+        await server.serve_forever()
+
+
+async def serve_stdio(manager: SessionManager) -> None:
+    """
+    Serves manager on stdin and stdout until stdin is closed
+    """
+
+    loop = asyncio.get_running_loop()
+
+    while line := await loop.run_in_executor(None, sys.stdin.buffer.readline):
+        sys.stdout.buffer.write(manager.handle_line(line))
+        sys.stdout.buffer.flush()
+
+
+def main() -> int:
+    """
+    Entry point of the session server
+    """
+
+    parser = argparse.ArgumentParser(description="Host many Icarus games in one process")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765,
+                        help="port to listen on, 0 for any free port (default 8765)")
+    parser.add_argument("--stdio", action="store_true",
+                        help="use stdin and stdout instead of a socket")
+    parser.add_argument("--max-games", type=int, default=100_000,
+                        help="maximum number of open games (default 100000)")
+    args = parser.parse_args()
+
+    manager = SessionManager(args.max_games)
+
+    try:
+        if args.stdio:
+            asyncio.run(serve_stdio(manager))
+        else:
+            asyncio.run(serve_socket(manager, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Measures how long the GUI takes to load its piece sprites, with and without the disk cache
+
+Usage:
+    python sprite_benchmark.py                check the default square size
+    python sprite_benchmark.py --size 120     use another square size in pixels
+    python sprite_benchmark.py --runs 10      load in 10 fresh interpreters per mode
+
+Every run imports the sprite cache and loads all 12 sprites in a new interpreter,
+like a freshly started GUI does: without the disk cache every PNG is decoded and resampled,
+with it the resized pixels are read back from a temporary cache directory filled beforehand.
+Does not need a display, the sprites stay PIL images instead of becoming Tk images
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Runs in the fresh interpreter, prints the seconds it took to load every sprite
+_MEASURE = """
+import sys
+import time
+start = time.perf_counter()
+import sprites
+cache = sprites.SpriteCache(cache_dir=sys.argv[2] or None)
+for color in (1, 2):
+    for kind in range(1, 7):
+        cache.get(kind, color, int(sys.argv[1]), int(sys.argv[1]))
+print(time.perf_counter() - start)
+"""
+
+
+def measure(size: int, cache_dir: str) -> float:
+    """
+    Loads all sprites at size in a new interpreter, with the disk cache in cache_dir
+    (no disk cache if it is empty)
+    Returns the time it took in seconds
+    """
+
+    output = subprocess.run(
+        [sys.executable, "-c", _MEASURE, str(size), cache_dir],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        check=True,
+        text=True
+    ).stdout
+
+    return float(output)
+
+
+def main() -> int:
+    """
+    Entry point of the sprite benchmark
+    """
+
+    parser = argparse.ArgumentParser(description="Measure loading the piece sprites at startup")
+    parser.add_argument("--size", type=int, default=80,
+                        help="square size in pixels (default 80)")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="number of fresh interpreters per mode (default 5)")
+    args = parser.parse_args()
+
+    runs = max(1, args.runs)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # The first run fills the disk cache
+        measure(args.size, cache_dir)
+
+        cold = [measure(args.size, "") for _ in range(runs)]
+        warm = [measure(args.size, cache_dir) for _ in range(runs)]
+
+    for name, times in [("without cache", cold), ("with cache", warm)]:
+        print(f"{name:<14} median {statistics.median(times) * 1000:7.1f}ms  "
+              f"min {min(times) * 1000:7.1f}ms  max {max(times) * 1000:7.1f}ms")
+
+    print(f"speedup {statistics.median(cold) / statistics.median(warm):.1f}x")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
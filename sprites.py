@@ -0,0 +1,163 @@
+"""
+Cache of the piece sprites shown on the board
+
+Sprites are keyed by piece type, piece color and size and only made when first asked for,
+the least recently used ones are dropped once the cache is full.
+The resized RGBA pixels are also kept on disk, so later starts (and sizes seen before)
+skip decoding and resampling the PNGs in resources/pieces/.
+Only needs PIL, the UI turns the images into Tk images through the convert argument
+"""
+
+import collections
+import contextlib
+import os
+import tempfile
+import typing
+
+from PIL import Image
+
+PIECE_DIR = "./resources/pieces"
+
+# Directory of the resized sprites, shared by all checkouts of the same user
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "icarus",
+    "sprites"
+)
+
+# Sprites kept in memory, enough for every piece at four sizes
+DEFAULT_LIMIT = 48
+
+# Piece type value, piece color value, width and height
+Key = tuple[int, int, int, int]
+
+
+def sprite_name(kind: int, color: int) -> str:
+    """
+    Returns the name of the image of a piece.Type value and piece.Color value, e.g. "w_p"
+    """
+
+    return f"{'-wb'[color]}_{'-pkqrbn'[kind]}"
+
+
+class SpriteCache():
+    """
+    Least recently used cache of piece sprites, backed by a cache of resized pixels on disk
+    """
+
+    def __init__(self,
+                 convert: typing.Callable[[Image.Image], typing.Any] = lambda image: image,
+                 cache_dir: str | None = CACHE_DIR,
+                 limit: int = DEFAULT_LIMIT,
+                 piece_dir: str = PIECE_DIR) -> None:
+        """
+        convert turns the RGBA image of a sprite into what get returns,
+        no disk cache is used if cache_dir is None
+        """
+
+        self.convert = convert
+        self.cache_dir = cache_dir
+        self.limit = max(1, limit)
+        self.piece_dir = piece_dir
+
+        self.sprites: collections.OrderedDict[Key, typing.Any] = collections.OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0, "decoded": 0}
+
+    def get(self, kind: int, color: int, width: int, height: int) -> typing.Any:
+        """
+        Returns the sprite of a piece.Type value and piece.Color value at width x height pixels
+        """
+
+        key = (kind, color, width, height)
+        sprite = self.sprites.get(key)
+
+        if sprite is not None:
+            self.stats["hits"] += 1
+            self.sprites.move_to_end(key)
+            return sprite
+
+        self.stats["misses"] += 1
+        sprite = self.convert(self.load(key))
+        self.sprites[key] = sprite
+
+        if len(self.sprites) > self.limit:
+            self.sprites.popitem(last=False)
+
+        return sprite
+
+    def load(self, key: Key) -> Image.Image:
+        """
+        Returns the RGBA image of a sprite, from the disk cache if it is there and up to date
+        """
+
+        kind, color, width, height = key
+        source = os.path.join(self.piece_dir, f"{sprite_name(kind, color)}.png")
+        cached = self.cache_path(key)
+
+        if cached is not None:
+            try:
+                if os.path.getmtime(cached) >= os.path.getmtime(source):
+                    with open(cached, "rb") as stream:
+                        pixels = stream.read()
+
+                    if len(pixels) == width * height * 4:
+                        self.stats["disk_hits"] += 1
+                        return Image.frombytes("RGBA", (width, height), pixels)
+            except OSError:
+                pass
+
+        self.stats["decoded"] += 1
+
+        with Image.open(source) as image:
+            sprite = image.resize((width, height)).convert("RGBA")
+
+        if cached is not None:
+            self.store(cached, sprite)
+
+        return sprite
+
+    def cache_path(self, key: Key) -> str | None:
+        """
+        Returns the path of a sprite in the disk cache, None if there is no disk cache
+        """
+
+        if self.cache_dir is None:
+            return None
+
+        kind, color, width, height = key
+
+        return os.path.join(self.cache_dir, f"{sprite_name(kind, color)}_{width}x{height}.rgba")
+
+    def store(self, path: str, sprite: Image.Image) -> None:
+        """
+        Writes the pixels of sprite to the disk cache,
+        through a temporary file so other instances never read half a sprite
+        A cache that cannot be written is skipped
+        """
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        except OSError:
+            return
+
+        try:
+            with os.fdopen(descriptor, "wb") as stream:
+                stream.write(sprite.tobytes())
+
+            os.replace(temporary, path)
+        except OSError:
+            # A failed write leaves no temporary file behind in the cache directory
+            with contextlib.suppress(OSError):
+                os.unlink(temporary)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(temporary)
+            raise
+
+    def clear(self) -> None:
+        """
+        Drops all sprites kept in memory, the disk cache stays
+        """
+
+        self.sprites.clear()
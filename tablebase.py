@@ -0,0 +1,327 @@
+"""
+Endgame tablebases: exact results of positions with a king and up to two more pieces
+against a lone king, read from a file written by build_tablebase.py
+
+A table holds one byte per position for each side to move, 0 for a draw and 1 + the plies
+to mate with best play otherwise. Only the side with the pieces can mate, so whether the byte
+means a win or a loss follows from the side to move. The fifty-move rule is not taken into account.
+
+Tables are stored for white holding the pieces, positions where black holds them are looked up
+with the colors swapped and the board mirrored. Positions that are mirror images or rotations
+of each other share one entry: the king of the side with the pieces is moved into the
+a1-d1-d4 triangle (the a-d files if there are pawns) first.
+
+File layout, little endian:
+    HEADER: MAGIC and the number of tables
+    ENTRY per table: material name (e.g. b"KBNK"), offset of its bytes, positions per side to move
+    per table: the bytes of all positions with white to move, then with black to move
+"""
+
+import collections
+import mmap
+import os
+import struct
+import typing
+
+import move_encoding
+import zobrist
+
+MAGIC = b"ICTB0001"
+HEADER = struct.Struct("<8sI")
+ENTRY = struct.Struct("<8sQQ")
+
+# piece.Color and piece.Type values, written out because board imports this module
+WHITE = 1
+BLACK = 2
+PAWN = 1
+KING = 2
+
+# Piece letters by piece.Type value and the order the pieces next to the king are listed in
+LETTERS = "-PKQRBN"
+ORDER = "QRBNP"
+
+# Pieces next to the king of the side with the pieces
+MAX_EXTRA_PIECES = 2
+
+# Probe results kept in memory by default
+DEFAULT_CACHE_SIZE = 1 << 16
+
+
+def _transform(transform: int, square: int) -> int:
+    """
+    Returns square after transform: bit 0 mirrors the files, bit 1 the rows,
+    bit 2 swaps files and rows before that
+    """
+
+    row, file = square >> 3, square & 7
+
+    if transform & 4:
+        row, file = file, row
+    if transform & 2:
+        row = 7 - row
+    if transform & 1:
+        file = 7 - file
+
+    return (row * 8) + file
+
+
+# Indexed by transform and square, the square it is moved to, transform 0 keeps it in place
+SYMMETRIES = [[_transform(transform, square) for square in range(64)] for transform in range(8)]
+
+# Squares the king of the side with the pieces is moved to in tables without pawns
+TRIANGLE = [square for square in range(64) if (square >> 3) <= (square & 7) <= 3]
+
+# Indexed by square, the transforms that move a king there into the triangle (two on its diagonal)
+# and, with pawns, onto the a-d files (only mirroring the files keeps pawns moving up the board)
+PAWNLESS_TRANSFORMS = [
+    [transform for transform in range(8) if SYMMETRIES[transform][square] in TRIANGLE]
+    for square in range(64)
+]
+PAWN_TRANSFORMS = [[0] if (square & 7) <= 3 else [1] for square in range(64)]
+
+# Indexed by square, the slot of the king of the side with the pieces, -1 if it cannot be there
+PAWNLESS_SLOTS = [TRIANGLE.index(square) if square in TRIANGLE else -1 for square in range(64)]
+PAWN_SLOTS = [
+    ((square >> 3) * 4) + (square & 7) if (square & 7) <= 3 else -1 for square in range(64)
+]
+
+
+class Probe(typing.NamedTuple):
+    """
+    Result of a position for the side to move
+    """
+
+    # 1 for a win, 0 for a draw, -1 for a loss
+    result: int
+
+    # Plies to mate with best play, 0 for a draw
+    plies: int
+
+
+def sort_key(kind: int) -> int:
+    """
+    Returns the position of pieces of kind (a piece.Type value) in the order tables list them
+    """
+
+    return ORDER.index(LETTERS[kind])
+
+
+def material_name(kinds: typing.Iterable[int]) -> str:
+    """
+    Returns the name of the table for a king and the pieces of kinds (piece.Type values)
+    against a lone king, e.g. "KBNK"
+    """
+
+    return "K" + "".join(LETTERS[kind] for kind in sorted(kinds, key=sort_key)) + "K"
+
+
+def parse_material(name: str) -> list[int]:
+    """
+    Returns the piece.Type values of the pieces next to the king in a table name,
+    in the order the table lists them
+    Raises ValueError if name is not a king and at most MAX_EXTRA_PIECES pieces against a lone king
+    """
+
+    letters = name.upper()
+
+    if (len(letters) < 2 or letters[0] != "K" or letters[-1] != "K"
+            or len(letters) - 2 > MAX_EXTRA_PIECES
+            or any(letter not in ORDER for letter in letters[1:-1])):
+        raise ValueError(f"Unsupported material {name!r}, expected e.g. KQK or KBNK")
+
+    return [LETTERS.index(letter) for letter in sorted(letters[1:-1], key=ORDER.index)]
+
+
+def table_size(kinds: list[int]) -> int:
+    """
+    Returns the number of positions per side to move of the table for kinds
+    """
+
+    size: int = (32 if PAWN in kinds else len(TRIANGLE)) * (64 ** (len(kinds) + 1))
+
+    return size
+
+
+def index(kinds: list[int], squares: list[int]) -> int:
+    """
+    Returns the index of a position in the table for kinds, the same for all positions
+    that are mirror images or rotations of each other
+    squares are those of the king with the pieces, the lone king and the pieces of kinds
+    """
+
+    transforms, slots = (
+        (PAWN_TRANSFORMS, PAWN_SLOTS) if PAWN in kinds else (PAWNLESS_TRANSFORMS, PAWNLESS_SLOTS)
+    )
+    best: int = -1
+
+    for transform in transforms[squares[0]]:
+        image = [SYMMETRIES[transform][square] for square in squares]
+
+        # Two pieces of the same kind are interchangeable, the lower square comes first
+        if len(kinds) == 2 and kinds[0] == kinds[1] and image[2] > image[3]:
+            image[2], image[3] = image[3], image[2]
+
+        value: int = slots[image[0]]
+        for square in image[1:]:
+            value = (value * 64) + square
+
+        if best < 0 or value < best:
+            best = value
+
+    return best
+
+
+class Tablebase():
+    """
+    A tablebase file, memory mapped until close is called,
+    with the results of recent probes kept in memory
+    """
+
+    def __init__(self, path: str, cache_size: int = DEFAULT_CACHE_SIZE) -> None:
+        """
+        Maps the tablebase at path
+        Raises OSError if it cannot be read and ValueError if it is not a tablebase
+        """
+
+        with open(path, "rb") as stream:
+            if os.fstat(stream.fileno()).st_size < HEADER.size:
+                raise ValueError(f"{path} is not a tablebase")
+
+            # The mapping stays valid after the file is closed
+            self.data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count = HEADER.unpack_from(self.data)
+
+        if magic != MAGIC or len(self.data) < HEADER.size + (count * ENTRY.size):
+            self.data.close()
+            raise ValueError(f"{path} is not a tablebase")
+
+        # Indexed by material name, the offset and positions per side to move of the table
+        self.tables: dict[str, tuple[int, int]] = {}
+
+        for number in range(count):
+            name, offset, size = ENTRY.unpack_from(self.data, HEADER.size + (number * ENTRY.size))
+
+            if offset + (2 * size) > len(self.data):
+                self.data.close()
+                raise ValueError(f"{path} is cut off")
+
+            self.tables[name.rstrip(b"\0").decode("ascii")] = (offset, size)
+
+        self.cache: collections.OrderedDict[int, Probe | None] = collections.OrderedDict()
+        self.cache_size = cache_size
+        self.stats = {"hits": 0, "misses": 0}
+
+    def __enter__(self) -> "Tablebase":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Unmaps the tablebase, it cannot be used afterwards
+        """
+
+        self.data.close()
+
+    def probe(self, board: typing.Any) -> Probe | None:
+        """
+        Returns the result of the position on board for the side to move,
+        None if the tablebase has no table for it
+
+        board has to be of type board.Board
+        """
+
+        cached = self.cache.get(board.hash, False)
+
+        if cached is not False:
+            self.stats["hits"] += 1
+            self.cache.move_to_end(board.hash)
+            return typing.cast(Probe | None, cached)
+
+        self.stats["misses"] += 1
+        result = self._lookup(board)
+        self.cache[board.hash] = result
+
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return result
+
+    def _lookup(self, board: typing.Any) -> Probe | None:
+        """
+        Subroutine of probe, reads the result of the position on board from the file
+        """
+
+        pieces = [
+            board.color_bb[color] & ~board.type_bb[KING] for color in range(3)
+        ]
+
+        if (pieces[WHITE] and pieces[BLACK]) or zobrist.castle_rights(
+                board.white_castle_info, board.black_castle_info):
+            return None
+
+        strong = WHITE if pieces[WHITE] or not pieces[BLACK] else BLACK
+        squares = [board.king_square[strong], board.king_square[3 - strong]]
+        extras = []
+
+        occupied = pieces[strong]
+        while occupied:
+            square = (occupied & -occupied).bit_length() - 1
+            extras.append((sort_key(board.board[square]), board.board[square], square))
+            occupied &= occupied - 1
+
+        if len(extras) > MAX_EXTRA_PIECES:
+            return None
+
+        extras.sort()
+        kinds = [kind for _, kind, _ in extras]
+        squares += [square for _, _, square in extras]
+        table = self.tables.get(material_name(kinds))
+
+        if table is None:
+            return None
+
+        # Black holding the pieces is white holding them on a board turned upside down
+        if strong == BLACK:
+            squares = [square ^ 56 for square in squares]
+
+        offset, size = table
+        to_move = board.active_color.value == strong
+        value = self.data[offset + (0 if to_move else size) + index(kinds, squares)]
+
+        if not value:
+            return Probe(0, 0)
+
+        return Probe(1 if to_move else -1, value - 1)
+
+    def best_move(self, board: typing.Any) -> move_encoding.Move | None:
+        """
+        Returns the move that wins fastest, keeps the draw or loses slowest
+        in the position on board, None if the tablebase has no table for it
+
+        board has to be of type board.Board
+        """
+
+        if self.probe(board) is None:
+            return None
+
+        best = None
+        best_key = (-2, 0)
+
+        for move in list(board.legal_moves(board.active_color)):
+            undo = board.make_move(move)
+            reply = self.probe(board)
+            board.unmake_move(undo)
+
+            if reply is None:
+                continue
+
+            # Wins sorted by fewer plies, losses by more plies
+            key = (-reply.result, -reply.plies if reply.result < 0 else reply.plies)
+
+            if key > best_key:
+                best, best_key = move, key
+
+        return best
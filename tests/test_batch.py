@@ -0,0 +1,41 @@
+"""
+Tests of the batch analysis
+"""
+
+import pytest
+
+import batch
+
+GOOD = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+OTHER = "4k3/8/8/8/8/8/8/R3K3 w Q - 0 1"
+BAD = "4k3/8/8/8/8/8/8/P3K3 w - - 0 1"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_bad_row_between_good_rows(workers: int) -> None:
+    """
+    A position that cannot be analysed gives an error row, the rows around it still come out
+    """
+
+    results = list(batch.analyze_stream([GOOD, BAD, OTHER], workers, perft_depth=1))
+
+    assert [result["line"] for result in results] == [1, 2, 3]
+    assert results[0]["perft"] == 20 and "error" not in results[0]
+    assert "error" in results[1]
+    assert results[2]["legal_moves"] == 16 and "error" not in results[2]
+
+
+def test_failing_analysis_becomes_error_row(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Any exception raised while analysing a position is turned into an error row
+    """
+
+    def fail(_: int) -> int:
+        raise RuntimeError("broken")
+
+    monkeypatch.setattr(batch._board, "perft", fail)  # pylint: disable=protected-access
+
+    results = list(batch.analyze_stream([GOOD, OTHER], perft_depth=1))
+
+    assert [result["error"] for result in results] == ["analysis failed: RuntimeError: broken"] * 2
+    assert "legal_moves" not in results[0]
@@ -0,0 +1,127 @@
+"""
+Tests of Board hashing and draw adjudication
+"""
+
+import board
+import fen
+import move_encoding
+import piece
+
+
+def play(my_board: board.Board, moves: str) -> None:
+    """
+    Plays moves in coordinate notation separated by spaces
+    """
+
+    for name in moves.split():
+        assert my_board.play_move(move_encoding.from_name(my_board, name))
+
+
+def test_threefold_repetition_after_double_push() -> None:
+    """
+    An en passant target no pawn can take does not make a position differ from its repetitions
+    """
+
+    my_board = board.Board()
+    my_board.load_fen(fen.START_FEN)
+    play(my_board, "e2e4 g8f6 g1f3 f6g8 f3g1 g8f6 g1f3 f6g8 f3g1")
+
+    assert my_board.repetition_count() == 3
+    assert my_board.draw == board.Draw.REPETITION
+
+
+def test_threefold_repetition_without_double_push() -> None:
+    """
+    The same knight shuffle from the starting position repeats three times too
+    """
+
+    my_board = board.Board()
+    my_board.load_fen(fen.START_FEN)
+    play(my_board, "g1f3 g8f6 f3g1 f6g8 g1f3 g8f6 f3g1 f6g8")
+
+    assert my_board.repetition_count() == 3
+
+
+def test_en_passant_file_only_hashed_when_capturable() -> None:
+    """
+    The hash counts the en passant file only if the capture is legal
+    """
+
+    my_board = board.Board()
+
+    my_board.load_fen("4k3/8/8/8/4P3/8/8/4K3 b - e3 0 1")
+    unreachable = my_board.hash
+    my_board.load_fen("4k3/8/8/8/4P3/8/8/4K3 b - - 0 1")
+    assert my_board.hash == unreachable
+
+    my_board.load_fen("4k3/8/8/8/3pP3/8/8/4K3 b - e3 0 1")
+    capturable = my_board.hash
+    my_board.load_fen("4k3/8/8/8/3pP3/8/8/4K3 b - - 0 1")
+    assert my_board.hash != capturable
+
+    # The capture would leave the black king on the fourth rank in check from the rook
+    my_board.load_fen("8/8/8/8/k2pP2R/8/8/4K3 b - e3 0 1")
+    pinned = my_board.hash
+    my_board.load_fen("8/8/8/8/k2pP2R/8/8/4K3 b - - 0 1")
+    assert my_board.hash == pinned
+
+
+def test_incremental_hash_matches_loaded_position() -> None:
+    """
+    The hash after a double push equals the hash of the same position loaded from FEN
+    """
+
+    my_board = board.Board()
+    my_board.load_fen("4k3/8/8/3p4/8/8/4P3/4K3 w - - 0 1")
+    play(my_board, "e2e4")
+    other = board.Board()
+    other.load_fen(my_board.board_to_fen())
+
+    assert my_board.hash == other.hash == my_board.compute_hash()
+
+    play(my_board, "d5d4 e1d1 e8d8 d1e1 d8e8")
+    play(my_board, "e4e5")
+    other.load_fen(my_board.board_to_fen())
+    assert my_board.hash == other.hash == my_board.compute_hash()
+
+
+def test_setters_keep_en_passant_hash_in_sync() -> None:
+    """
+    Adding, removing or recoloring a pawn next to the en passant target keeps the hash
+    equal to the hash of the same position loaded from FEN
+    """
+
+    my_board = board.Board()
+    my_board.load_fen("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1")
+    other = board.Board()
+
+    my_board.set_piece(4, 4, piece.Type.NONE, piece.Color.NONE)
+    other.load_fen(my_board.board_to_fen())
+    assert my_board.hash == other.hash == my_board.compute_hash()
+
+    my_board.set_piece(4, 4, piece.Type.PAWN, piece.Color.BLACK)
+    other.load_fen(my_board.board_to_fen())
+    assert my_board.hash == other.hash == my_board.compute_hash()
+
+    my_board.set_color(4, 4, piece.Color.WHITE)
+    other.load_fen(my_board.board_to_fen())
+    assert my_board.hash == other.hash == my_board.compute_hash()
+    my_board.check_hash()
+
+
+def test_pawns_set_on_the_last_row_do_not_push_off_the_board() -> None:
+    """
+    A pawn put on its last row with set_piece has no pushes, every generated move stays on the board
+    """
+
+    my_board = board.Board()
+    my_board.load_fen("4k3/8/8/8/8/8/8/4K3 w - - 0 1")
+    my_board.set_piece(7, 0, piece.Type.PAWN, piece.Color.WHITE)
+    my_board.set_piece(0, 7, piece.Type.PAWN, piece.Color.BLACK)
+
+    for color in (piece.Color.WHITE, piece.Color.BLACK):
+        moves = my_board.legal_moves(color)
+
+        assert moves
+        assert all(move & 63 not in (56, 7) for move in moves)
+        assert my_board.legal_targets(color)[56 if color == piece.Color.WHITE else 7] == 0
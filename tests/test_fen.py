@@ -0,0 +1,74 @@
+"""
+Tests of reading positions in FEN
+"""
+
+import pytest
+
+import board
+import fen
+
+
+@pytest.mark.parametrize("text", [
+    "4k3/8/8/8/8/8/8/P3K3 w - - 0 1",
+    "p3k3/8/8/8/8/8/8/4K3 w - - 0 1",
+    "P3k3/8/8/8/8/8/8/4K3 w - - 0 1",
+    "4k3/8/8/8/8/8/8/p3K3 b - - 0 1",
+])
+def test_pawn_on_back_rank_is_rejected(text: str) -> None:
+    """
+    Pawns of both colors on the first or last row make a FEN invalid
+    """
+
+    with pytest.raises(ValueError):
+        board.Board().load_fen(text)
+
+
+def test_placement_with_back_rank_pawn_is_rejected() -> None:
+    """
+    decode_placement rejects back rank pawns even once the rank is cached on another row
+    """
+
+    fen.decode_placement("4k3/P7/8/8/8/8/8/4K3")
+
+    with pytest.raises(ValueError):
+        fen.decode_placement("P3k3/8/8/8/8/8/8/4K3")
+
+
+def test_pawns_on_other_ranks_load() -> None:
+    """
+    A position with pawns next to the back ranks still loads and round trips
+    """
+
+    text = "4k3/P7/8/8/8/8/7p/4K3 w - - 0 1"
+    my_board = board.Board()
+    my_board.load_fen(text)
+
+    assert my_board.board_to_fen() == text
+
+
+@pytest.mark.parametrize("text", [
+    "4k3/8/8/8/4p3/8/3P4/4K3 w - e3 0 1",
+    "4k3/3p4/8/4P3/8/8/8/4K3 b - e6 0 1",
+])
+def test_en_passant_target_of_the_side_to_move_is_rejected(text: str) -> None:
+    """
+    The en passant target must lie behind a pawn of the side that just moved,
+    otherwise a pawn could capture backwards
+    """
+
+    with pytest.raises(ValueError):
+        board.Board().load_fen(text)
+
+
+def test_en_passant_target_of_the_opponent_loads() -> None:
+    """
+    A target on the sixth row with white to move and on the third row with black to move loads
+    """
+
+    my_board = board.Board()
+
+    my_board.load_fen("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1")
+    assert my_board.perft(1) == 7
+
+    my_board.load_fen("4k3/8/8/8/3pP3/8/8/4K3 b - e3 0 1")
+    assert my_board.perft(1) == 7
@@ -0,0 +1,68 @@
+"""
+Tests of reading PGN movetext
+"""
+
+import io
+
+import pytest
+
+import board
+import fen
+import pgn
+
+
+@pytest.mark.parametrize("movetext", [
+    "1. e4 Nf6 2. e5 d5 3. exd6 e.p. cxd6 1-0",
+    "1. e4 Nf6 2. e5 d5 3. exd6e.p. cxd6 1-0",
+    "1. e4 Nf6 2. e5 d5 3. exd6 e.p.! {capture} cxd6 1-0",
+])
+def test_en_passant_suffix(movetext: str) -> None:
+    """
+    Games writing en passant captures with an "e.p." suffix replay completely
+    """
+
+    result = pgn.replay_game(board.Board(), 1, {}, movetext)
+
+    assert result.error is None
+    assert result.plies == 6 and result.result == "1-0"
+    assert result.fen.startswith("rnbqkb1r/pp2pppp/3p1n2/8/8/8/PPPP1PPP/RNBQKBNR w")
+
+
+def test_san_to_move_strips_en_passant_suffix() -> None:
+    """
+    san_to_move accepts the suffix like check and annotation marks
+    """
+
+    my_board = board.Board()
+    my_board.load_fen("rnbqkb1r/ppp1pppp/5n2/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3")
+
+    for san in ("exd6 e.p.", "exd6e.p.", "exd6 e.p.!?"):
+        assert pgn.move_to_san(my_board, pgn.san_to_move(my_board, san)) == "exd6"
+
+    my_board.load_fen(fen.START_FEN)
+    with pytest.raises(ValueError):
+        pgn.san_to_move(my_board, "e.p.")
+
+
+def test_read_lines_rejects_overlong_line() -> None:
+    """
+    Input without newlines stops with an error instead of growing the pending line without bound
+    """
+
+    lines = pgn.read_lines(io.BytesIO(b"1. e4 e5\n" + b"x" * 100), chunk_size=16, max_line=64)
+
+    assert next(lines) == "1. e4 e5"
+    with pytest.raises(ValueError):
+        next(lines)
+
+
+def test_read_lines_splits_across_chunks() -> None:
+    """
+    Lines up to the limit are joined across chunks, a last line without newline is kept
+    """
+
+    stream = io.BytesIO(b"[Event \"a\"]\n1. e4 e5 2. Nf3 1-0\nlast")
+
+    assert list(pgn.read_lines(stream, chunk_size=4, max_line=32)) == [
+        "[Event \"a\"]", "1. e4 e5 2. Nf3 1-0", "last"
+    ]
@@ -0,0 +1,89 @@
+"""
+Tests of the game server sessions
+"""
+
+import asyncio
+import json
+
+import pytest
+
+import server
+
+
+@pytest.mark.parametrize("request_", [
+    {"cmd": "new", "fen": 5},
+    {"cmd": "new", "fen": None},
+    {"cmd": "new", "fen": ["8/8/8/8/8/8/8/8 w - - 0 1"]},
+    {"cmd": "state", "game": "1"},
+    {"cmd": "state", "game": True},
+    {"cmd": "move", "game": 1, "move": 1234},
+    {"cmd": ["new"]},
+])
+def test_malformed_types_get_an_error(request_: server.Request) -> None:
+    """
+    Fields of the wrong type are answered with an error, the server keeps serving other games
+    """
+
+    manager = server.SessionManager()
+    game = manager.handle({"cmd": "new"})["game"]
+
+    response = manager.handle(request_ | {"id": 7})
+
+    assert "error" in response and response["id"] == 7
+    assert manager.handle({"cmd": "move", "game": game, "move": "e2e4"})["ok"]
+
+
+def test_unexpected_exception_becomes_error(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    An exception no command expects is turned into an error reply
+    """
+
+    manager = server.SessionManager()
+
+    def fail(_: server.Request) -> server.Response:
+        raise AttributeError("broken")
+
+    monkeypatch.setitem(manager.commands, "stats", fail)
+
+    response = json.loads(manager.handle_line(b'{"cmd": "stats"}'))
+
+    assert response == {"error": "Internal error: AttributeError: broken"}
+    assert manager.counts["errors"] == 1
+
+
+def test_overlong_line_gets_an_error() -> None:
+    """
+    A request line over the limit is answered with an error before the connection is closed
+    """
+
+    async def exchange() -> tuple[bytes, bytes, bytes]:
+        manager = server.SessionManager()
+        listener = await asyncio.start_server(
+            lambda reader, writer: server.serve_client(manager, reader, writer),
+            "127.0.0.1",
+            0,
+            limit=server.LINE_LIMIT
+        )
+
+        async with listener:
+            port = listener.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b'{"cmd": "stats"}\n' + b" " * (server.LINE_LIMIT + 1) + b"\n")
+            await writer.drain()
+
+            first = await reader.readline()
+            second = await reader.readline()
+            rest = await reader.read()
+
+            writer.close()
+            await writer.wait_closed()
+
+        return first, second, rest
+
+    answered, refused, rest = asyncio.run(exchange())
+
+    assert "games" in json.loads(answered)
+    assert json.loads(refused) == {
+        "error": f"Requests have to be shorter than {server.LINE_LIMIT} bytes"
+    }
+    assert rest == b""
@@ -0,0 +1,43 @@
+"""
+Tests of the sprite disk cache
+"""
+
+import os
+import pathlib
+
+import pytest
+from PIL import Image
+
+import sprites
+
+
+def test_failed_store_leaves_no_temporary_file(tmp_path: pathlib.Path,
+                                               monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    A sprite that cannot be moved into place is skipped without leaving files behind
+    """
+
+    def fail(*_: object) -> None:
+        raise OSError("disk full")
+
+    cache = sprites.SpriteCache(cache_dir=str(tmp_path))
+    monkeypatch.setattr(os, "replace", fail)
+
+    cache.store(os.path.join(tmp_path, "sprite.rgba"), Image.new("RGBA", (2, 2)))
+
+    assert not os.listdir(tmp_path)
+
+
+def test_store_writes_the_pixels(tmp_path: pathlib.Path) -> None:
+    """
+    A stored sprite holds the raw RGBA pixels
+    """
+
+    cache = sprites.SpriteCache(cache_dir=str(tmp_path))
+    path = os.path.join(tmp_path, "sprite.rgba")
+
+    cache.store(path, Image.new("RGBA", (2, 2), (1, 2, 3, 4)))
+
+    assert os.listdir(tmp_path) == ["sprite.rgba"]
+    with open(path, "rb") as stream:
+        assert stream.read() == bytes([1, 2, 3, 4]) * 4
@@ -0,0 +1,39 @@
+"""
+Tests of the UCI front end
+"""
+
+import time
+
+import pytest
+
+import uci
+
+
+def test_stop_ends_perft_promptly(capsys: pytest.CaptureFixture[str]) -> None:
+    """
+    stop returns right away during a perft that would take far longer to finish
+    """
+
+    engine = uci.Engine()
+    engine.go(["perft", "8"])
+    time.sleep(0.2)
+
+    start = time.perf_counter()
+    engine.stop()
+
+    assert time.perf_counter() - start < 2
+    assert "perft stopped" in capsys.readouterr().out
+
+
+def test_perft_runs_to_completion(capsys: pytest.CaptureFixture[str]) -> None:
+    """
+    A perft that is not stopped reports the full node count
+    """
+
+    engine = uci.Engine()
+    engine.go(["perft", "3"])
+    while engine.worker is not None and engine.worker.is_alive():
+        engine.worker.join(0.01)
+
+    out = capsys.readouterr().out
+    assert "Nodes searched: 8902" in out and "stopped" not in out
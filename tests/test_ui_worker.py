@@ -0,0 +1,38 @@
+"""
+Tests of the background worker of the UI
+"""
+
+import typing
+
+import pytest
+
+import board
+import fen
+import piece
+import ui_worker
+
+
+def test_cancelled_reply_is_not_played(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    A search cancelled by a newer job leaves the worker board at the position the UI sent
+    """
+
+    worker = ui_worker.Worker()
+    my_board = board.Board()
+    my_board.load_fen(fen.START_FEN)
+    position = my_board.to_bytes()
+    reply = my_board.legal_moves(my_board.active_color)[0]
+
+    def cancelled_search(*_: typing.Any, **__: typing.Any) -> tuple[int, int]:
+        worker.cancel()
+        return reply, 0
+
+    monkeypatch.setattr(worker.search, "search", cancelled_search)
+
+    try:
+        worker.work(worker.generation, position, None, piece.Color.WHITE)
+
+        assert worker.board.to_bytes() == position
+        assert not worker.poll()
+    finally:
+        worker.close()
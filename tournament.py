@@ -0,0 +1,389 @@
+"""
+Headless self-play tournament between two search budgets, for regression testing the engine
+
+Usage:
+    python tournament.py --games 200          engine A against itself, 1000 nodes per move
+    python tournament.py --games 200 --nodes 2000 --nodes-b 1000
+    python tournament.py --book openings.epd --movetime 0.1 --workers 4
+    python tournament.py --games 1000 --checkpoint run.jsonl    resumes run.jsonl if it exists
+
+Games start from the positions of an opening book (one FEN or EPD per line),
+every opening is played twice with the colors swapped. Games run in a pool of worker processes
+and the results are summed up as they finish: wins, draws and losses of engine A,
+its Elo difference with a 95% error margin, nodes per second and game length.
+With --checkpoint every finished game is appended to a JSON lines file,
+running the same command again skips the games already in there
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import functools
+import json
+import math
+import os
+import signal
+import sys
+import time
+import typing
+
+import board
+import fen
+import piece
+import search
+
+# Plies after which a game that is still running is counted as a draw
+DEFAULT_MAX_PLIES = 300
+
+# Games in flight per worker, bounds the results waiting to be summed up
+GAMES_PER_WORKER = 2
+
+# Print the summary after every this many games
+REPORT_EVERY = 10
+
+# Termination of a game by Board.draw
+DRAW_REASONS = {
+    board.Draw.STALEMATE: "stalemate",
+    board.Draw.REPETITION: "repetition",
+    board.Draw.FIFTY_MOVES: "fifty moves",
+    board.Draw.INSUFFICIENT_MATERIAL: "insufficient material",
+}
+
+# Result of a game in PGN notation by the score of white
+RESULTS = {1.0: "1-0", 0.5: "1/2-1/2", 0.0: "0-1"}
+
+GameResult = dict[str, typing.Any]
+
+
+class Budget(typing.NamedTuple):
+    """
+    Limits of one engine for every move, 0 for no limit
+    """
+
+    max_nodes: int
+    max_time: float
+    max_depth: int
+
+
+def _init_worker() -> None:
+    """
+    Runs first in every worker process, leaves Ctrl+C to the main process,
+    which stops the run and keeps the checkpoint consistent
+    """
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+@functools.cache
+def _worker_searches() -> tuple[search.Search, search.Search]:
+    """
+    Returns the searches of engine A and B in this process, created on first use
+    """
+
+    return search.Search(), search.Search()
+
+
+def play_game(index: int,
+              opening: str,
+              budgets: tuple[Budget, Budget],
+              max_plies: int) -> GameResult:
+    """
+    Runs in a worker process, plays game number index from the opening position
+    Engine A (budgets[0]) plays white in even games and black in odd games
+    Returns the game number, opening, result, score of engine A, plies, termination
+    and the nodes and seconds both engines searched
+    """
+
+    my_board = board.Board()
+    my_board.load_fen(opening)
+    searches = _worker_searches()
+    # Engine A moves first in even games
+    engine_a_color = my_board.active_color
+    if index % 2:
+        engine_a_color = board.COLORS[3 - engine_a_color.value]
+
+    nodes = [0, 0]
+    seconds = [0.0, 0.0]
+    plies = 0
+
+    # Games must not depend on which games the worker played before
+    for engine_search in searches:
+        engine_search.table.clear()
+
+    while not my_board.game_over and plies < max_plies:
+        engine = 0 if my_board.active_color == engine_a_color else 1
+        move, _ = searches[engine].search(my_board, budgets[engine].max_depth,
+                                          budgets[engine].max_nodes, budgets[engine].max_time)
+        nodes[engine] += searches[engine].stats["nodes"]
+        seconds[engine] += searches[engine].seconds
+
+        if move is None or not my_board.play_move(move):
+            break
+
+        plies += 1
+
+    score, termination = _outcome(my_board, engine_a_color)
+
+    return {
+        "game": index,
+        "opening": opening,
+        "result": RESULTS[score if engine_a_color == piece.Color.WHITE else 1.0 - score],
+        "score": score,
+        "plies": plies,
+        "termination": termination,
+        "nodes": nodes,
+        "seconds": seconds,
+    }
+
+
+def _outcome(my_board: board.Board, engine_a_color: piece.Color) -> tuple[float, str]:
+    """
+    Subroutine of play_game
+    Returns the score of engine A in the finished game on my_board and how the game ended
+    """
+
+    if my_board.color_checkmated != piece.Color.NONE:
+        return (0.0 if my_board.color_checkmated == engine_a_color else 1.0), "checkmate"
+
+    return 0.5, DRAW_REASONS.get(my_board.draw, "ply limit")
+
+
+def load_book(path: str | None) -> list[str]:
+    """
+    Returns the positions of an opening book file, one FEN or EPD per line,
+    the starting position if path is None
+    Empty lines and lines starting with # are skipped, lines Board.load_fen rejects are reported
+    Raises ValueError if the book holds no valid position
+    """
+
+    if path is None:
+        return [fen.START_FEN]
+
+    my_board = board.Board()
+    book = []
+
+    with open(path, encoding="utf-8") as stream:
+        for number, line in enumerate(stream, 1):
+            if not line.strip() or line.startswith("#"):
+                continue
+
+            try:
+                my_board.load_fen(line)
+            except ValueError as error:
+                print(f"{path}:{number}: skipped, {error}", file=sys.stderr)
+                continue
+
+            book.append(my_board.board_to_fen())
+
+    if not book:
+        raise ValueError(f"No valid position in {path}")
+
+    return book
+
+
+def elo(score: float) -> float:
+    """
+    Returns the Elo difference that gives the expected score (0 to 1)
+    """
+
+    score = min(max(score, 1e-6), 1 - 1e-6)
+
+    return 400 * math.log10(score / (1 - score))
+
+
+def summary(results: list[GameResult]) -> str:
+    """
+    Returns wins, draws and losses of engine A, its Elo difference with a 95% error margin,
+    the nodes per second of both engines and the average game length
+    """
+
+    count = len(results)
+    if not count:
+        return "no games"
+
+    scores = [result["score"] for result in results]
+    mean = sum(scores) / count
+    deviation = math.sqrt(sum((score - mean) ** 2 for score in scores) / count)
+    margin = 1.96 * deviation / math.sqrt(count)
+    difference = elo(mean)
+    nodes = sum(sum(result["nodes"]) for result in results)
+    seconds = sum(sum(result["seconds"]) for result in results)
+    terminations = collections.Counter(result["termination"] for result in results)
+
+    return (
+        f"games {count}  +{scores.count(1.0)} ={scores.count(0.5)} -{scores.count(0.0)}  "
+        f"score {mean * 100:.1f}%  elo {difference:+.1f} "
+        f"[{elo(mean - margin) - difference:+.1f}, {elo(mean + margin) - difference:+.1f}]  "
+        f"{nodes / seconds if seconds > 0 else 0.0:.0f} nps  "
+        f"{sum(result['plies'] for result in results) / count:.1f} plies/game  "
+        + ", ".join(f"{name} {number}" for name, number in terminations.most_common())
+    )
+
+
+def load_checkpoint(path: str, config: dict[str, typing.Any]) -> list[GameResult]:
+    """
+    Returns the finished games of a checkpoint file, creating it with config if it does not exist
+    A line cut off by an interrupted run is skipped
+    Raises ValueError if the checkpoint was written with another config
+    The number of games is not part of config, so a finished run can be extended by more games
+    """
+
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as stream:
+            stream.write(json.dumps({"config": config}) + "\n")
+        return []
+
+    results = []
+
+    with open(path, encoding="utf-8") as stream:
+        header = json.loads(stream.readline() or "{}")
+
+        if header.get("config") != config:
+            raise ValueError(f"{path} was written with another book, budgets or ply limit")
+
+        for line in stream:
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+
+    return results
+
+
+def run(config: dict[str, typing.Any],
+        games: int,
+        workers: int,
+        checkpoint: str | None) -> typing.Iterator[GameResult]:
+    """
+    Plays the first games games of config that are not in checkpoint yet in a pool of workers
+    Yields the results in the order the games finish, after appending them to checkpoint
+    """
+
+    done = set()
+    if checkpoint is not None:
+        done = {result["game"] for result in load_checkpoint(checkpoint, config)}
+
+    book = config["book"]
+    budgets = (Budget(*config["budget_a"]), Budget(*config["budget_b"]))
+    todo = (
+        (index, book[(index // 2) % len(book)])
+        for index in range(games)
+        if index not in done
+    )
+
+    # pylint: disable-next=consider-using-with
+    output = open(checkpoint, "a", encoding="utf-8") if checkpoint is not None else None
+    pending: set[concurrent.futures.Future[GameResult]] = set()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                initializer=_init_worker) as executor:
+        try:
+            for index, opening in todo:
+                if len(pending) >= workers * GAMES_PER_WORKER:
+                    finished, pending = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    yield from _record(finished, output)
+
+                pending.add(
+                    executor.submit(play_game, index, opening, budgets, config["max_plies"])
+                )
+
+            yield from _record(concurrent.futures.as_completed(pending), output)
+        finally:
+            for future in pending:
+                future.cancel()
+            if output is not None:
+                output.close()
+
+
+def _record(finished: typing.Iterable[concurrent.futures.Future[GameResult]],
+            output: typing.TextIO | None) -> typing.Iterator[GameResult]:
+    """
+    Subroutine of run
+    Appends the results of finished games to the checkpoint and yields them
+    """
+
+    for future in finished:
+        result = future.result()
+
+        if output is not None:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+        yield result
+
+
+def main() -> int:
+    """
+    Entry point of the tournament runner
+    """
+
+    parser = argparse.ArgumentParser(description="Play the engine against itself")
+    parser.add_argument("--games", type=int, default=100, help="number of games (default 100)")
+    parser.add_argument("--book", help="FEN / EPD file with the opening positions "
+                                       "(default the starting position)")
+    parser.add_argument("--nodes", type=int, default=1000,
+                        help="nodes per move of engine A, 0 for no limit (default 1000)")
+    parser.add_argument("--movetime", type=float, default=0.0,
+                        help="seconds per move of engine A, 0 for no limit (default 0)")
+    parser.add_argument("--depth", type=int, default=search.MAX_PLY - 1,
+                        help="maximum depth per move of engine A")
+    parser.add_argument("--nodes-b", type=int, help="nodes per move of engine B (default --nodes)")
+    parser.add_argument("--movetime-b", type=float,
+                        help="seconds per move of engine B (default --movetime)")
+    parser.add_argument("--depth-b", type=int, help="maximum depth of engine B (default --depth)")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES,
+                        help=f"plies after which a game is a draw (default {DEFAULT_MAX_PLIES})")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="number of worker processes (default 0, one per core)")
+    parser.add_argument("--checkpoint", help="JSON lines file to record finished games in "
+                                             "and to resume from")
+    args = parser.parse_args()
+
+    if not (args.nodes or args.movetime or args.depth < search.MAX_PLY - 1):
+        parser.error("engine A needs a node, time or depth limit")
+
+    budget_a = Budget(args.nodes, args.movetime, args.depth)
+    budget_b = Budget(
+        args.nodes if args.nodes_b is None else args.nodes_b,
+        args.movetime if args.movetime_b is None else args.movetime_b,
+        args.depth if args.depth_b is None else args.depth_b,
+    )
+
+    try:
+        config = {
+            "book": load_book(args.book),
+            "budget_a": list(budget_a),
+            "budget_b": list(budget_b),
+            "max_plies": args.max_plies,
+        }
+        results = load_checkpoint(args.checkpoint, config) if args.checkpoint else []
+        results = [result for result in results if result["game"] < args.games]
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    workers = args.workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    if results:
+        print(f"resuming, {len(results)} games already played")
+
+    try:
+        for result in run(config, args.games, workers, args.checkpoint):
+            results.append(result)
+
+            if len(results) % REPORT_EVERY == 0:
+                print(summary(results), flush=True)
+    except KeyboardInterrupt:
+        print("interrupted" + (", run the same command to resume" if args.checkpoint else ""))
+
+    print(summary(results))
+    print(f"workers {workers}  time {time.perf_counter() - start:.1f}s")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+"""
+UCI front end, lets chess GUIs, tournament managers and test harnesses drive Icarus
+
+Usage:
+    python uci.py
+
+Supported commands:
+    uci, isready, ucinewgame, setoption name Hash value MB, setoption name BookFile value PATH,
+    setoption name TablebaseFile value PATH, position startpos|fen FEN [moves ...],
+    go [depth N] [nodes N] [movetime MS] [wtime MS btime MS winc MS binc MS movestogo N] [infinite],
+    go perft N, stop, quit
+
+Searches run on a worker thread, so isready and stop are answered while a search is running.
+With a BookFile set, go plays a move from the opening book without searching while it has one,
+with a TablebaseFile set it plays the tablebase move in positions the tablebase knows
+"""
+
+import sys
+import threading
+import time
+import typing
+
+import board
+import book
+import move_encoding
+import fen
+import piece
+import search
+import tablebase
+
+# Rough size of a transposition table entry, used to turn the Hash option into entries
+ENTRY_BYTES = 128
+
+DEFAULT_HASH_MB = 32
+
+# Time kept back for the GUI and the way back from the search, in seconds
+MOVE_OVERHEAD = 0.05
+
+# Moves the remaining time is split over if the GUI does not send movestogo
+DEFAULT_MOVES_TO_GO = 30
+
+_output_lock = threading.Lock()
+
+
+def send(line: str) -> None:
+    """
+    Writes one line to the GUI, safe to call from the worker thread
+    """
+
+    with _output_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def format_score(score: int) -> str:
+    """
+    Returns score as "cp N" or, for mate scores, as "mate N" with N in moves
+    """
+
+    if score > search.MATE_BOUND:
+        return f"mate {(search.MATE - score + 1) // 2}"
+    if score < -search.MATE_BOUND:
+        return f"mate -{(search.MATE + score + 1) // 2}"
+
+    return f"cp {score}"
+
+
+def parse_go(tokens: list[str], active_color: piece.Color) -> dict[str, typing.Any]:
+    """
+    Returns the search limits of a go command:
+    max_depth, max_nodes, max_time (seconds), infinite and perft (depth, 0 for none)
+    """
+
+    values: dict[str, int] = {}
+    flags = set()
+
+    for index, token in enumerate(tokens):
+        if token in ("infinite", "ponder"):
+            flags.add(token)
+        elif index + 1 < len(tokens) and tokens[index + 1].lstrip("-").isdigit():
+            values[token] = int(tokens[index + 1])
+
+    limits = {
+        "max_depth": values.get("depth", search.MAX_PLY - 1),
+        "max_nodes": values.get("nodes", 0),
+        "max_time": values.get("movetime", 0) / 1000,
+        "infinite": "infinite" in flags,
+        "perft": values.get("perft", 0),
+    }
+
+    clock, increment = ("wtime", "winc") if active_color == piece.Color.WHITE else ("btime", "binc")
+
+    if clock in values and not limits["max_time"]:
+        remaining = values[clock] / 1000
+        moves_to_go = values.get("movestogo", DEFAULT_MOVES_TO_GO)
+        budget = remaining / max(1, moves_to_go) + values.get(increment, 0) / 2000
+        limits["max_time"] = max(0.01, min(budget, remaining / 2) - MOVE_OVERHEAD)
+
+    if not ("depth" in values or "nodes" in values or limits["max_time"]):
+        limits["infinite"] = True
+
+    return limits
+
+
+class UCISearch(search.Search):
+    """
+    Search that prints an info line after every finished depth
+    """
+
+    def on_iteration(self,
+                     board: typing.Any,  # pylint: disable=redefined-outer-name
+                     depth: int,
+                     score: int,
+                     move: move_encoding.Move | None) -> None:
+        nodes = self.stats["nodes"]
+        nps = int(nodes / self.seconds) if self.seconds > 0 else 0
+        line = " ".join(move_encoding.name(pv_move)
+                        for pv_move in self.principal_variation(board, depth))
+
+        send(f"info depth {depth} score {format_score(score)} nodes {nodes} nps {nps} "
+             f"hashfull {self.table.hashfull()} time {int(self.seconds * 1000)} pv {line}")
+
+
+class Engine():
+    """
+    Keeps the position and runs searches for the UCI commands
+    """
+
+    def __init__(self) -> None:
+        self.board = board.Board()
+        self.board.load_fen(fen.START_FEN)
+
+        self.search = UCISearch(DEFAULT_HASH_MB * 1024 * 1024 // ENTRY_BYTES)
+        self.book: book.Book | None = None
+        self.tablebase: tablebase.Tablebase | None = None
+        self.worker: threading.Thread | None = None
+
+        # Set by stop, an infinite search waits for it before sending bestmove
+        self.stopped = threading.Event()
+
+        self.commands: dict[str, typing.Callable[[list[str]], None]] = {
+            "uci": self.uci,
+            "isready": lambda _: send("readyok"),
+            "ucinewgame": self.new_game,
+            "setoption": self.set_option,
+            "position": self.position,
+            "go": self.go,
+            "stop": lambda _: self.stop(),
+        }
+
+    def run(self) -> None:
+        """
+        Answers commands from stdin until quit is sent or stdin is closed
+        """
+
+        for line in sys.stdin:
+            tokens = line.split()
+
+            if not tokens:
+                continue
+            if tokens[0] == "quit":
+                break
+
+            command = self.commands.get(tokens[0])
+            if command is not None:
+                command(tokens[1:])
+
+        self.stop()
+
+    def uci(self, _: list[str]) -> None:
+        """
+        Identifies the engine and lists its options
+        """
+
+        send("id name Icarus")
+        send("id author the Icarus developers")
+        send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max 4096")
+        send("option name BookFile type string default <empty>")
+        send("option name TablebaseFile type string default <empty>")
+        send("uciok")
+
+    def new_game(self, _: list[str]) -> None:
+        """
+        Forgets everything learned in the previous game
+        """
+
+        self.stop()
+        self.search = UCISearch(self.search.table.size)
+
+    def set_option(self, tokens: list[str]) -> None:
+        """
+        Handles "setoption name Hash value MB", "setoption name BookFile value PATH"
+        and "setoption name TablebaseFile value PATH", other options are ignored
+        """
+
+        self.stop()
+
+        split = tokens.index("value") if "value" in tokens else len(tokens)
+        name = " ".join(tokens[1:split]).lower()
+        value = " ".join(tokens[split + 1:])
+
+        if name == "hash" and value.isdigit():
+            self.search = UCISearch(max(1, int(value)) * 1024 * 1024 // ENTRY_BYTES)
+        elif name == "bookfile":
+            self.open_book(value)
+        elif name == "tablebasefile":
+            self.open_tablebase(value)
+
+    def open_book(self, path: str) -> None:
+        """
+        Uses the opening book at path, no book if path is empty or "<empty>"
+        """
+
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+
+        if path in ("", "<empty>"):
+            return
+
+        try:
+            self.book = book.Book(path)
+        except (OSError, ValueError) as error:
+            send(f"info string not using the opening book: {error}")
+
+    def open_tablebase(self, path: str) -> None:
+        """
+        Uses the endgame tablebase at path, no tablebase if path is empty or "<empty>"
+        """
+
+        if self.tablebase is not None:
+            self.tablebase.close()
+            self.tablebase = None
+
+        if path in ("", "<empty>"):
+            return
+
+        try:
+            self.tablebase = tablebase.Tablebase(path)
+        except (OSError, ValueError) as error:
+            send(f"info string not using the tablebase: {error}")
+
+    def position(self, tokens: list[str]) -> None:
+        """
+        Sets up "startpos" or "fen FEN" and plays the moves after "moves"
+        """
+
+        self.stop()
+
+        moves = tokens.index("moves") if "moves" in tokens else len(tokens)
+
+        try:
+            if tokens[:1] == ["fen"]:
+                self.board.load_fen(" ".join(tokens[1:moves]))
+            else:
+                self.board.load_fen(fen.START_FEN)
+        except ValueError as error:
+            send(f"info string ignoring invalid position: {error}")
+            return
+
+        for name in tokens[moves + 1:]:
+            try:
+                legal = self.board.play_move(move_encoding.from_name(self.board, name))
+            except ValueError:
+                legal = False
+
+            if not legal:
+                send(f"info string ignoring illegal move {name} and the moves after it")
+                break
+
+    def go(self, tokens: list[str]) -> None:
+        """
+        Starts a search or perft on the worker thread
+        """
+
+        self.stop()
+        self.stopped.clear()
+
+        limits = parse_go(tokens, self.board.active_color)
+        perft_depth = limits.pop("perft")
+
+        if perft_depth:
+            self.worker = threading.Thread(target=self._perft, args=(perft_depth,), daemon=True)
+        else:
+            self.worker = threading.Thread(target=self._search, kwargs=limits, daemon=True)
+
+        self.worker.start()
+
+    def stop(self) -> None:
+        """
+        Stops a running search and waits until it sent its bestmove
+        """
+
+        self.stopped.set()
+
+        while self.worker is not None and self.worker.is_alive():
+            # Repeated in case the search had not started when stop was first called
+            self.search.stop()
+            self.worker.join(0.01)
+
+        self.worker = None
+
+    def _search(self, max_depth: int, max_nodes: int, max_time: float, infinite: bool) -> None:
+        """
+        Runs on the worker thread, searches the position and sends the best move,
+        a move from the opening book or the tablebase if they know the position
+        """
+
+        move = None if infinite else self._known_move()
+
+        if move is None:
+            move, _ = self.search.search(self.board, max_depth, max_nodes, max_time)
+
+        # The GUI expects no bestmove before stop while searching infinitely
+        if infinite:
+            self.stopped.wait()
+
+        send(f"bestmove {move_encoding.name(move) if move is not None else '0000'}")
+
+    def _known_move(self) -> move_encoding.Move | None:
+        """
+        Subroutine of _search, returns the move of the opening book or the tablebase,
+        None if neither knows the position
+        """
+
+        if self.book is not None:
+            move = self.board.book_move(self.book)
+
+            if move is not None:
+                send(f"info string book move {move_encoding.name(move)}")
+                return move
+
+        if self.tablebase is not None:
+            probe = self.board.probe_tablebase(self.tablebase)
+            move = self.board.tablebase_move(self.tablebase)
+
+            if probe is not None and move is not None:
+                send(f"info string tablebase move {move_encoding.name(move)} "
+                     f"result {probe.result} plies {probe.plies}")
+                return move
+
+        return None
+
+    def _perft(self, depth: int) -> None:
+        """
+        Runs on the worker thread, prints the node count after every move and the total
+        stop ends it early, the counts are partial then
+        """
+
+        start = time.perf_counter()
+        counts = self.board.divide(depth, self.stopped)
+
+        if self.stopped.is_set():
+            send("info string perft stopped, the node counts are incomplete")
+
+        for move, count in counts:
+            send(f"{move_encoding.name(move)}: {count}")
+
+        seconds = time.perf_counter() - start
+        nodes = sum(count for _, count in counts)
+        nps = int(nodes / seconds) if seconds > 0 else 0
+
+        send(f"info nodes {nodes} nps {nps} time {int(seconds * 1000)}")
+        send(f"Nodes searched: {nodes}")
+
+
+def main() -> int:
+    """
+    Entry point of the UCI engine
+    """
+
+    Engine().run()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
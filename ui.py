@@ -2,17 +2,47 @@
 Holds the UI class
 """
 
+import collections
+import statistics
+import time
 import typing
 import tkinter as tk
-from PIL import Image, ImageTk
+from PIL import ImageTk
 
+import move_encoding
 import piece
+import sprites
 import ui_config
-import board_config
+import ui_worker
 from exceptions import InconsistentState
 
+# Indexed by flipped and screen square (screen row * 8 + screen file, top left first),
+# the board square shown there
+SCREEN_SQUARES = (
+    [((7 - (slot >> 3)) * 8) + (slot & 7) for slot in range(64)],
+    [((slot >> 3) * 8) + (7 - (slot & 7)) for slot in range(64)],
+)
 
-class UI():
+# Number of recent clicks the paint latency is reported over
+LATENCY_SAMPLES = 100
+
+# Square sizes are rounded down to a multiple of this many pixels when the window is resized,
+# so sizing the window back and forth mostly hits sprites that are already cached
+SQUARE_STEP = 8
+MIN_SQUARE_SIZE = 24
+
+# Milliseconds between two looks at the results of the worker while it is busy
+POLL_INTERVAL = 15
+
+# Indexed by the choices of the engine dropdown, the color the engine plays
+ENGINE_CHOICES = {
+    "NO ENGINE": "NONE",
+    "ENGINE PLAYS WHITE": "WHITE",
+    "ENGINE PLAYS BLACK": "BLACK",
+}
+
+
+class UI():  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     """
     Icarus user interface
     """
@@ -24,7 +54,38 @@ class UI():
     selected_piece: list[int] = [-1, -1]
     selected_moves: list[list[int]] = []
 
-    piece_images: list[ImageTk.PhotoImage] = []
+    # Piece sprites as Tk images, made when a piece is first shown at a size
+    sprite_cache: sprites.SpriteCache
+
+    # Canvas items of the background square and the piece, indexed by screen square
+    # They are created once and changed in place by update
+    square_items: list[int]
+    piece_items: list[int]
+
+    # What every screen square currently shows: fill color and piece image
+    # ((type - 1) + ((color - 1) * 6)), -1 for an empty square
+    drawn: list[tuple[str, int]]
+
+    # True while a redraw is scheduled, updates before it are drawn together
+    redraw_pending: bool
+
+    # Time of the click that still waits to be painted (time.perf_counter), 0 if none
+    click_time: float
+
+    # Seconds from click to painted board of the recent clicks
+    paint_latencies: collections.deque[float]
+
+    # Plays the moves and the engine's replies off the Tk thread
+    worker: ui_worker.Worker
+
+    # Legal target bitboards of the side to move, indexed by square, as sent by the worker
+    targets: list[int]
+
+    # True while the worker is busy with a move or an engine reply ("thinking")
+    pending: bool
+
+    # The root.after job that polls the worker, None if none is scheduled
+    poll_job: str | None
 
     def init(self, board: typing.Any) -> None:
         """
@@ -46,7 +107,10 @@ class UI():
         self.root.bind("<Button 1>", self.click_square)
 
         # Create the UI
-        self.canvas.grid(row=0, rowspan=2, column=0)
+        self.canvas.grid(row=0, rowspan=2, column=0, sticky="nsew")
+        self.root.grid_columnconfigure(0, weight=1)
+        self.root.grid_rowconfigure(1, weight=1)
+        self.canvas.bind("<Configure>", self.handle_resize)
 
         # Load the first frame to the right of the board
         self.load_settings_choose_frame()
@@ -56,9 +120,22 @@ class UI():
         self.load_setup_board_frame()
         ui_config.board_setup_frame.destroy()
 
-        # Start loading the board and pieces themself
-        self.load_piece_images()
-        self.update()
+        # Start loading the board, piece sprites are loaded once they are shown
+        self.sprite_cache = sprites.SpriteCache(ImageTk.PhotoImage)
+        self.create_board_items()
+
+        self.redraw_pending = False
+        self.click_time = 0.0
+        self.paint_latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+        self.worker = ui_worker.Worker(
+            ui_config.engine_time, ui_worker.open_book(ui_config.book_path)
+        )
+        self.targets = [0] * 64
+        self.pending = False
+        self.poll_job = None
+
+        self.submit(None)
 
     def load_settings_choose_frame(self) -> None:
         """
@@ -163,6 +240,7 @@ class UI():
         ui_config.move_count_text = tk.Label(ui_config.game_info_frame, text="Turn 0")
         ui_config.whos_turn_text = tk.Label(ui_config.game_info_frame, text="WHITE has the turn")
         ui_config.state_text = tk.Label(ui_config.game_info_frame, text="Game still running")
+        ui_config.latency_text = tk.Label(ui_config.game_info_frame, text="")
 
         ui_config.move_count_text.config(
             bg="#262626",
@@ -185,6 +263,13 @@ class UI():
             highlightthickness=0,
             font=("Monospace Regular", 12)
         )
+        ui_config.latency_text.config(
+            bg="#262627",
+            fg="#ebdbb2",
+            borderwidth=0,
+            highlightthickness=0,
+            font=("Monospace Regular", 10)
+        )
 
         clicked = tk.StringVar()
         clicked.set("QUEEN")
@@ -216,116 +301,236 @@ class UI():
             font=("Monospace Regular", 12)
         )
 
+        engine = tk.StringVar()
+        engine.set(next(choice for choice, color in ENGINE_CHOICES.items()
+                        if color == ui_config.engine_color))
+        engine_dropdown = tk.OptionMenu(
+            ui_config.game_info_frame,
+            engine,
+            *ENGINE_CHOICES,
+            command=self.handle_engine_dropdown
+        )
+        engine_dropdown.config(
+            bg="#4e4e4e",
+            fg="#ebdbb2",
+            borderwidth=0,
+            width=20,
+            highlightthickness=0,
+            activebackground="#ebdbb2",
+            activeforeground="#4e4e4e",
+            font=("Monospace Regular", 12)
+        )
+        engine_dropdown["menu"].config(
+            bg="#4e4e4e",
+            fg="#ebdbb2",
+            borderwidth=0,
+            activebackground="#ebdbb2",
+            activeforeground="#4e4e4e",
+            font=("Monospace Regular", 12)
+        )
+
         ui_config.game_info_frame.grid(row=1, column=1, sticky="new")
         ui_config.whos_turn_text.pack(anchor="n", fill="x")
         ui_config.move_count_text.pack(anchor="n", fill="x")
         ui_config.state_text.pack(anchor="n", fill="x")
         promotion_piece_dropdown.pack()
+        engine_dropdown.pack()
+        ui_config.latency_text.pack(anchor="n", fill="x")
+
+    def create_board_items(self) -> None:
+        """
+        Creates the background square and piece item of every screen square,
+        tagged "square<n>" and "piece<n>" with n the screen square
+        """
+
+        self.square_items = []
+        self.piece_items = []
+        self.drawn = []
+
+        for slot in range(64):
+            x = (slot & 7) * ui_config.square_width
+            y = (slot >> 3) * ui_config.square_height
+
+            self.square_items.append(self.canvas.create_rectangle(
+                (x, y),
+                (x + ui_config.square_width, y + ui_config.square_height),
+                fill="",
+                tags=("square", f"square{slot}")
+            ))
+            self.piece_items.append(self.canvas.create_image(
+                x,
+                y,
+                anchor=tk.NW,
+                state=tk.HIDDEN,
+                tags=("piece", f"piece{slot}")
+            ))
+
+            # Nothing is drawn yet, so the first redraw sets every square
+            self.drawn.append(("", -1))
 
     def update(self) -> None:
         """
-        Draws all pieces to the current UI
+        Schedules a redraw of the board and the game info,
+        several updates before the next redraw are drawn at once
+        """
+
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            self.root.after_idle(self.redraw)
+
+    def redraw(self) -> None:
+        """
+        Draws the current board, changing only the canvas items of squares that look different
         """
 
-        self.canvas.delete("all")
+        self.redraw_pending = False
+
         ui_config.fen_text.set(self.board.board_to_fen())
 
         if ui_config.game_info_frame.winfo_exists() == 1:
-            ui_config.whos_turn_text.config(text=f"{board_config.active_color.name} has the turn")
-            ui_config.move_count_text.config(text=f"Turn {int(board_config.active_turn/2)}")
+            ui_config.whos_turn_text.config(text=f"{self.board.active_color.name} has the turn")
+            ui_config.move_count_text.config(text=f"Turn {int(self.board.active_turn/2)}")
+
+            ui_config.state_text.config(text=self.state_message())
 
-            if board_config.game_over:
-                if board_config.color_checkmated != piece.Color.NONE:
-                    ui_config.state_text.config(text=f"{board_config.color_checkmated.name} lost!")
-                else:
-                    ui_config.state_text.config(text="Its a draw!")
+        self.canvas.config(cursor="watch" if self.pending else "")
 
-        for row in range(0, 8):
-            for file in range(0, 8):
+        selected = {(row * 8) + file for row, file in self.selected_moves}
+        screen_squares = SCREEN_SQUARES[ui_config.flipped]
 
-                color = ui_config.white_color if (row + file) % 2 == 0 else ui_config.black_color
+        for slot in range(64):
+            square = screen_squares[slot]
+            kind = self.board.board[square]
+            color = self.board.color[square]
 
-                # Take the flipped board into account
-                display_row = 7 - row if not ui_config.flipped else row
-                display_file = file if not ui_config.flipped else 7 - file
+            if (kind == 0) != (color == 0):
+                raise InconsistentState(f"Piece {kind} has color {color} on square {square}")
 
-                # Check if square is movable
-                for selected_move in self.selected_moves:
-                    if selected_move[0] == display_row and selected_move[1] == display_file:
+            if square in selected:
+                fill = ui_config.select_color
+            elif ((slot >> 3) + slot) % 2 == 0:
+                fill = ui_config.white_color
+            else:
+                fill = ui_config.black_color
 
-                        color = ui_config.select_color
+            image = (kind - 1) + ((color - 1) * 6) if color else -1
 
-                x = file * ui_config.square_width
-                y = row * ui_config.square_height
+            if self.drawn[slot] != (fill, image):
+                self.draw_square(slot, fill, image)
 
-                # Create the background square
-                self.canvas.create_rectangle(
-                    (x, y),
-                    (x + ui_config.square_height, y + ui_config.square_width),
-                    fill=color
-                )
+        # Tk paints the canvas when idle, a callback scheduled now runs right after that
+        if self.click_time:
+            self.root.after_idle(self.record_latency)
 
-                # Draw the piece
-                if self.board.get_color(display_row, display_file) != piece.Color.NONE:
-                    current_piece = self.board.get_piece(display_row, display_file)
-                    current_color = self.board.get_color(display_row, display_file)
+    def state_message(self) -> str:
+        """
+        Returns the state of the game shown in the game info
+        """
 
-                    if current_piece.value == 0 and current_color.value != 0:
-                        raise InconsistentState("Piece is NONE but color is set")
-                    if current_piece.value != 0 and current_color.value == 0:
-                        raise InconsistentState("Color is NONE but piece is set")
+        if self.pending:
+            return "Thinking ..."
 
-                    self.canvas.create_image(
-                        x,
-                        y,
-                        anchor=tk.NW,
-                        image=self.get_piece_image(current_piece, current_color)
-                    )
+        if not self.board.game_over:
+            return "Game still running"
 
-    def get_piece_image(self,
-                        current_piece: piece.Type,
-                        current_color: piece.Color) -> ImageTk.PhotoImage | None:
+        if self.board.color_checkmated != piece.Color.NONE:
+            return f"{self.board.color_checkmated.name} lost!"
+
+        return f"Its a draw by {self.board.draw.name.lower().replace('_', ' ')}!"
+
+    def draw_square(self, slot: int, fill: str, image: int) -> None:
         """
-        Gets the corresponding image to a piece of color
+        Changes the canvas items of a screen square to show fill and the piece image,
+        no piece if image is -1
         """
 
-        if current_color == piece.Color.WHITE:
-            return self.piece_images[current_piece.value - 1]
-
-        if current_color == piece.Color.BLACK:
-            return self.piece_images[(current_piece.value - 1) + 6]
+        drawn_fill, drawn_image = self.drawn[slot]
+
+        if fill != drawn_fill:
+            self.canvas.itemconfigure(self.square_items[slot], fill=fill)
+
+        if image != drawn_image and image == -1:
+            self.canvas.itemconfigure(self.piece_items[slot], state=tk.HIDDEN)
+        elif image != drawn_image:
+            self.canvas.itemconfigure(
+                self.piece_items[slot],
+                image=self.sprite_cache.get(
+                    (image % 6) + 1,
+                    (image // 6) + 1,
+                    ui_config.square_width,
+                    ui_config.square_height
+                ),
+                state=tk.NORMAL
+            )
 
-        return None
+        self.drawn[slot] = (fill, image)
 
-    def load_piece_images(self) -> None:
+    def record_latency(self) -> None:
         """
-        Pre-loads alls piece images into memory
+        Records the time from the last click to the painted board and shows it in the game info
         """
 
-        self.piece_images.append(self.load_piece_image("w_p"))
-        self.piece_images.append(self.load_piece_image("w_k"))
-        self.piece_images.append(self.load_piece_image("w_q"))
-        self.piece_images.append(self.load_piece_image("w_r"))
-        self.piece_images.append(self.load_piece_image("w_b"))
-        self.piece_images.append(self.load_piece_image("w_n"))
-        self.piece_images.append(self.load_piece_image("b_p"))
-        self.piece_images.append(self.load_piece_image("b_k"))
-        self.piece_images.append(self.load_piece_image("b_q"))
-        self.piece_images.append(self.load_piece_image("b_r"))
-        self.piece_images.append(self.load_piece_image("b_b"))
-        self.piece_images.append(self.load_piece_image("b_n"))
+        self.paint_latencies.append(time.perf_counter() - self.click_time)
+        self.click_time = 0.0
+
+        if ui_config.game_info_frame.winfo_exists() == 1:
+            ui_config.latency_text.config(text=self.latency_report())
 
-    def load_piece_image(self, name: str) -> ImageTk.PhotoImage:
+    def latency_report(self) -> str:
         """
-        Loads a single piece image from resources/pieces/ into memory
+        Returns the click to paint latency of the last click and the median and maximum
+        of the recent clicks
         """
 
-        return ImageTk.PhotoImage(
-            Image.open(f"./resources/pieces/{name}.png").resize(
-                (ui_config.square_width, ui_config.square_height)
-            ).convert("RGBA")
+        if not self.paint_latencies:
+            return ""
+
+        return (
+            f"Click to paint {self.paint_latencies[-1] * 1000:.1f} ms, "
+            f"median {statistics.median(self.paint_latencies) * 1000:.1f} ms, "
+            f"max {max(self.paint_latencies) * 1000:.1f} ms"
         )
 
+    def handle_resize(self, event: typing.Any) -> None:
+        """
+        Called when the canvas changed its size, fits the board into it
+        """
+
+        size = min(event.width, event.height) // 8
+        size = max(MIN_SQUARE_SIZE, size - (size % SQUARE_STEP))
+
+        if size == ui_config.square_width == ui_config.square_height:
+            return
+
+        ui_config.square_width = size
+        ui_config.square_height = size
+        self.layout_board()
+        self.update()
+
+    def layout_board(self) -> None:
+        """
+        Moves the canvas items to the current square size,
+        the next redraw gives every piece a sprite of that size
+        """
+
+        for slot in range(64):
+            x = (slot & 7) * ui_config.square_width
+            y = (slot >> 3) * ui_config.square_height
+
+            self.canvas.coords(
+                self.square_items[slot],
+                x,
+                y,
+                x + ui_config.square_width,
+                y + ui_config.square_height
+            )
+            self.canvas.coords(self.piece_items[slot], x, y)
+
+            # -2 is no piece image, so a square showing a piece gets the sprite of the new size
+            fill, image = self.drawn[slot]
+            if image != -1:
+                self.drawn[slot] = (fill, -2)
+
     def click_square(self, event_origin: typing.Any) -> None:
         """
         Handles mous click event
@@ -338,35 +543,109 @@ class UI():
         # the event still needs to pass it)
         _ = event_origin
 
+        start = time.perf_counter()
+
         row, file = self.get_square()
 
+        # Clicks next to the board
+        if not (0 <= row < 8 and 0 <= file < 8):
+            return
+
         # Take flipped board into consideration
         row = row if not ui_config.flipped else 7 - row
         file = file if not ui_config.flipped else 7 - file
 
         current_piece = self.board.get_piece(row, file)
 
+        # A click while the worker is busy cancels its work, the board stays as it is shown
+        if self.pending:
+            self.cancel_work()
+
         if self.selected_piece[0] != -1:
-            result = self.board.move_piece(
-                self.selected_piece[0],
-                self.selected_piece[1],
-                row,
-                file
-            )
+            selected = self.selected_piece
+            legal = self.targets[(selected[0] * 8) + selected[1]] >> ((row * 8) + file) & 1
+
             self.selected_piece = [-1, -1]
             self.selected_moves = []
+            self.click_time = start
+
+            # The move is painted once the worker has played it
+            if legal:
+                self.submit(move_encoding.from_positions(
+                    self.board,
+                    selected,
+                    [row, file],
+                    self.board.promotion_target.value
+                ))
+                return
 
             self.update()
 
-            if result:
-                return
-
         if current_piece != piece.Type.NONE:
             self.selected_piece = [row, file]
-            self.selected_moves = piece.get_valid_moves(row, file, True, self.board)
+            self.selected_moves = self.get_valid_moves(row, file)
+
+            self.click_time = start
+            self.update()
+
+    def get_valid_moves(self, row: int, file: int) -> list[list[int]]:
+        """
+        Returns the legal target squares of the piece at row and file as [ [row,file], ... ],
+        taken from the last result of the worker
+        """
+
+        targets = self.targets[(row * 8) + file]
+
+        return [[square >> 3, square & 7] for square in range(64) if targets >> square & 1]
+
+    def submit(self, move: move_encoding.Move | None) -> None:
+        """
+        Hands the board and move (None to only look at the position) to the worker,
+        cancelling the work in flight, and polls for the results
+        """
+
+        self.worker.submit(self.board.to_bytes(), move, piece.Color[ui_config.engine_color])
+        self.pending = True
+
+        if self.poll_job is None:
+            self.poll_job = self.root.after(POLL_INTERVAL, self.poll_worker)
+
+        self.update()
+
+    def cancel_work(self) -> None:
+        """
+        Cancels the work in flight and stops polling the worker
+        """
+
+        self.worker.cancel()
+        self.pending = False
 
+        if self.poll_job is not None:
+            self.root.after_cancel(self.poll_job)
+            self.poll_job = None
+
+        self.update()
+
+    def poll_worker(self) -> None:
+        """
+        Shows the results the worker sent since the last poll,
+        polls again while the worker is busy
+        """
+
+        self.poll_job = None
+
+        for result in self.worker.poll():
+            self.board.load_bytes(result.position)
+            self.board.game_over = result.game_over
+            self.board.color_checkmated = result.color_checkmated
+            self.board.draw = result.draw
+            self.targets = result.targets
+            self.pending = result.thinking
             self.update()
 
+        if self.pending:
+            self.poll_job = self.root.after(POLL_INTERVAL, self.poll_worker)
+
     def get_square(self) -> tuple[int, int]:
         """
         Turns x and y of mouse click into row and file
@@ -392,8 +671,15 @@ class UI():
         Called when the "Load FEN" button is pressed
         """
 
-        self.board.load_fen(ui_config.fen_text.get())
-        self.update()
+        try:
+            self.board.load_fen(ui_config.fen_text.get())
+        except ValueError:
+            ui_config.state_text.config(text="Invalid FEN")
+            return
+
+        # No moves until the worker has looked at the new position
+        self.targets = [0] * 64
+        self.submit(None)
 
     def handle_flip_board_button(self) -> None:
         """
@@ -424,3 +710,12 @@ class UI():
         """
 
         self.board.promotion_target = piece.Type[event]
+
+    def handle_engine_dropdown(self, event: typing.Any) -> None:
+        """
+        Called when something was selected from the engine dropdown,
+        the engine starts thinking right away if its color is to move
+        """
+
+        ui_config.engine_color = ENGINE_CHOICES[event]
+        self.submit(None)
@@ -14,6 +14,13 @@ flipped: bool = False
 square_width: int = 80
 square_height: int = 80
 
+# Color the engine plays (a piece.Color name) and its time per move in seconds
+engine_color: str = "NONE"
+engine_time: float = 1.0
+
+# Opening book file the engine plays from (see build_book.py), empty for none
+book_path: str = ""
+
 # --- REFERENCES ---
 
 board_setup_frame: tk.Frame
@@ -22,4 +29,5 @@ fen_text: tk.StringVar
 move_count_text: tk.Label
 whos_turn_text: tk.Label
 state_text: tk.Label
+latency_text: tk.Label
 promotion_piece_text: tk.StringVar
@@ -0,0 +1,234 @@
+"""
+Background worker of the UI
+
+Plays the moves made on the board, finds the legal moves and the result of the new position
+and lets the engine reply, all on a thread of its own, so the Tk event loop never waits for them.
+The UI hands positions over as Board.to_bytes and polls the results with root.after.
+Does not import Tkinter, so it can be driven without a display
+"""
+
+import queue
+import sys
+import threading
+import typing
+
+import board
+import book
+import move_encoding
+import piece
+import search
+
+# Seconds the engine thinks about a reply if the UI does not say otherwise
+DEFAULT_THINK_TIME = 1.0
+
+# A job: generation, position (Board.to_bytes), move to play on it (None to only look at it)
+# and the color the engine plays (piece.Color.NONE if it does not play)
+Job = tuple[int, bytes, move_encoding.Move | None, piece.Color]
+
+
+def open_book(path: str) -> book.Book | None:
+    """
+    Returns the opening book at path, None if path is empty or not a readable book
+    """
+
+    if not path:
+        return None
+
+    try:
+        return book.Book(path)
+    except (OSError, ValueError) as error:
+        print(f"Not using the opening book: {error}", file=sys.stderr)
+        return None
+
+
+class Result(typing.NamedTuple):
+    """
+    A position worked out by the worker
+    """
+
+    # Generation of the job, results of cancelled jobs are never sent
+    generation: int
+
+    # Position after the move (Board.to_bytes), unchanged if the move was illegal
+    position: bytes
+
+    # Legal target bitboards of the side to move, see Board.legal_targets
+    targets: list[int]
+
+    game_over: bool
+    color_checkmated: piece.Color
+    draw: board.Draw
+
+    # False if the move of the job was illegal
+    legal: bool
+
+    # True if the engine is thinking about a reply, another result follows
+    thinking: bool
+
+
+class WorkerSearch(search.Search):
+    """
+    Search that stops as soon as the worker it belongs to cancels its job
+    """
+
+    def __init__(self, worker: "Worker") -> None:
+        super().__init__()
+
+        self.worker = worker
+
+        # Generation of the job being searched
+        self.generation = 0
+
+    def _check_limits(self) -> None:
+        if self.generation != self.worker.generation:
+            self.stopped = True
+
+        super()._check_limits()
+
+
+class Worker():  # pylint: disable=too-many-instance-attributes
+    """
+    Works through the jobs of the UI on a daemon thread, one at a time and newest first:
+    submitting a job or calling cancel drops all work still in flight
+    """
+
+    def __init__(self,
+                 think_time: float = DEFAULT_THINK_TIME,
+                 opening_book: book.Book | None = None) -> None:
+        self.jobs: queue.Queue[Job | None] = queue.Queue()
+        self.results: queue.Queue[Result] = queue.Queue()
+        self.think_time = think_time
+
+        # The engine replies from the book without searching while the book knows the position
+        self.book = opening_book
+
+        # Only touched by the worker thread, kept from job to job while the UI continues
+        # the same game, so the board knows the positions before it for repetitions
+        self.board = board.Board()
+        self.search = WorkerSearch(self)
+
+        # Raised by every submit and cancel, jobs and results of older generations are dropped
+        self.generation = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self,
+               position: bytes,
+               move: move_encoding.Move | None,
+               engine_color: piece.Color) -> int:
+        """
+        Cancels the work in flight and queues a job: play move on position (Board.to_bytes),
+        then let the engine reply if engine_color is to move
+        Returns the generation of the job, the generation of its results
+        """
+
+        self.cancel()
+        self.jobs.put((self.generation, position, move, engine_color))
+
+        return self.generation
+
+    def cancel(self) -> None:
+        """
+        Drops all queued jobs and results still to come, a running search stops at its next node
+        """
+
+        self.generation += 1
+
+    def close(self) -> None:
+        """
+        Cancels the work in flight and ends the worker thread
+        """
+
+        self.cancel()
+        self.jobs.put(None)
+        self.thread.join()
+
+    def poll(self) -> list[Result]:
+        """
+        Returns the results of the current generation that arrived since the last poll,
+        never blocks
+        """
+
+        results: list[Result] = []
+
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                return results
+
+            if result.generation == self.generation:
+                results.append(result)
+
+    def run(self) -> None:
+        """
+        Main loop of the worker thread
+        """
+
+        while (job := self.jobs.get()) is not None:
+            if job[0] == self.generation:
+                self.work(*job)
+
+    def work(self,
+             generation: int,
+             position: bytes,
+             move: move_encoding.Move | None,
+             engine_color: piece.Color) -> None:
+        """
+        Plays move on position, sends the result and,
+        if engine_color is to move afterwards, sends the position after the engine's reply
+        """
+
+        if position == self.board.to_bytes():
+            self.board.game_over = False
+            self.board.color_checkmated = piece.Color.NONE
+            self.board.draw = board.Draw.NONE
+        else:
+            self.board.load_bytes(position)
+
+        legal = True
+        if move is not None:
+            legal = self.board.play_move(move)
+        if move is None or not legal:
+            # The game result was cleared above, play_move finds it after a legal move
+            self.board.check_for_mate(piece.Color(3 - self.board.active_color.value))
+            self.board.check_for_draw()
+
+        thinking = self.board.active_color == engine_color and not self.board.game_over
+        self.send(generation, legal, thinking)
+
+        if not thinking:
+            return
+
+        reply = self.board.book_move(self.book) if self.book is not None else None
+
+        if reply is None:
+            self.search.generation = generation
+            reply, _ = self.search.search(self.board, max_time=self.think_time)
+
+        # A cancelled search returns early, its reply is not played so the board stays
+        # at the position the UI knows and the next job can continue from it
+        if reply is not None and generation == self.generation:
+            self.board.play_move(reply)
+
+        self.send(generation, True, False)
+
+    def send(self, generation: int, legal: bool, thinking: bool) -> None:
+        """
+        Sends the position on the worker's board, unless the job was cancelled meanwhile
+        """
+
+        if generation != self.generation:
+            return
+
+        self.results.put(Result(
+            generation,
+            self.board.to_bytes(),
+            list(self.board.legal_targets(self.board.active_color)),
+            self.board.game_over,
+            self.board.color_checkmated,
+            self.board.draw,
+            legal,
+            thinking
+        ))
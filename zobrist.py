@@ -0,0 +1,66 @@
+"""
+Random keys for Zobrist hashing of board positions
+
+A position hash is the xor of the keys of all pieces on their squares,
+the side to move, the castling rights and the en passant file
+"""
+
+import random
+
+# Fixed seed, so hashes are the same in every process and every run
+_random = random.Random(0x1CA205)
+
+# Indexed by color value, type value and square
+# Keys of empty squares (color or type 0) are 0, so they do not change the hash
+PIECE_KEYS = [
+    [
+        [
+            _random.getrandbits(64) if color and kind else 0
+            for _ in range(64)
+        ]
+        for kind in range(7)
+    ]
+    for color in range(3)
+]
+
+# Indexed by color value, only black to move changes the hash
+SIDE_KEYS = [0, 0, _random.getrandbits(64)]
+
+# Indexed by the castling rights as 4 bits: white short, white long, black short, black long
+CASTLE_KEYS = [_random.getrandbits(64) if rights else 0 for rights in range(16)]
+
+# Indexed by the file of the en passant target square
+EN_PASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]
+
+
+def castle_rights(white_castle_info: list[int], black_castle_info: list[int]) -> int:
+    """
+    Returns the castling rights described by both castle_info lists as 4 bits:
+    white short, white long, black short, black long
+    """
+
+    return (
+        int(not white_castle_info[0] and not white_castle_info[2])
+        | int(not white_castle_info[0] and not white_castle_info[1]) << 1
+        | int(not black_castle_info[0] and not black_castle_info[2]) << 2
+        | int(not black_castle_info[0] and not black_castle_info[1]) << 3
+    )
+
+
+def castle_key(white_castle_info: list[int], black_castle_info: list[int]) -> int:
+    """
+    Returns the key of the castling rights described by both castle_info lists
+    """
+
+    return CASTLE_KEYS[castle_rights(white_castle_info, black_castle_info)]
+
+
+def en_passant_key(en_passant_target: list[int]) -> int:
+    """
+    Returns the key of the en passant target square, 0 if there is none
+    """
+
+    if en_passant_target[0] == -1:
+        return 0
+
+    return EN_PASSANT_KEYS[en_passant_target[1]]